@@ -0,0 +1,387 @@
+"""
+benchmarks.run
+
+Measure service operations against synthetic service directories and a fake launchctl.
+
+The benchmarks run on any POSIX system; launchctl is replaced with a shell script that sleeps for a configurable latency
+and fails for every service whose name contains "-fail". Results are written as JSON and can be compared with the
+results of an earlier run to find regressions:
+
+    python benchmarks/run.py --size 100 --size 10000 --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+import contextlib
+import functools
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+from unittest import mock
+
+import click
+
+# run against the working tree rather than an installed version
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+
+# pylint: disable=wrong-import-position
+from service import batch, launchctl, metadata, selector, service
+from service.executor import Executor, SessionExecutor, SubprocessExecutor
+from service.index import ServiceIndex
+
+
+RESULTS_VERSION = 1
+
+PLIST_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+  <key>Label</key>
+  <string>{label}</string>
+  <key>ProgramArguments</key>
+  <array>
+    <string>/usr/local/bin/{name}</string>
+  </array>
+  <key>RunAtLoad</key>
+  <true/>
+</dict>
+</plist>
+"""
+
+LAUNCHCTL_SCRIPT = """#!/bin/sh
+[ "${BENCH_LATENCY:-0}" = "0" ] || sleep "$BENCH_LATENCY"
+case "$*" in
+  *-fail*) echo "failed" >&2; exit "${BENCH_FAILURE_CODE:-5}" ;;
+esac
+echo "$@"
+"""
+
+
+class Tree(t.NamedTuple):
+    """A synthetic service tree.
+
+    :param home: The home directory containing the service directories.
+    :param directories: The service directories.
+    :param domains: The reverse domains used by the services.
+    :param names: The short names of the services.
+    """
+
+    home: Path
+    directories: list[Path]
+    domains: list[str]
+    names: list[str]
+
+
+def generate_tree(root: Path, size: int, domains: int, fail_every: int) -> Tree:
+    """Generate service files split across `Library/LaunchAgents` and `Library/LaunchDaemons`.
+
+    :param root: The directory to create the tree in.
+    :param size: The number of service files.
+    :param domains: The number of reverse domains.
+    :param fail_every: Mark every nth service to fail in the fake launchctl (0 to never fail).
+    """
+    home = root / "home"
+    directories = [home / "Library" / "LaunchAgents", home / "Library" / "LaunchDaemons"]
+    reverse_domains = [f"com.bench{i}" for i in range(domains)]
+    names = []
+
+    for directory in directories:
+        directory.mkdir(parents=True)
+
+    for i in range(size):
+        name = f"svc{i}-fail" if fail_every and i % fail_every == 0 else f"svc{i}"
+        label = f"{reverse_domains[i % domains]}.{name}"
+        directories[i % 2].joinpath(f"{label}.plist").write_text(
+            PLIST_TEMPLATE.format(label=label, name=name), encoding="utf8"
+        )
+        names.append(name)
+
+    return Tree(home, directories, reverse_domains, names)
+
+
+def install_launchctl(root: Path) -> Path:
+    """Install the fake launchctl program.
+
+    :param root: The directory to install the program in.
+    """
+    file = root / "launchctl"
+    file.write_text(LAUNCHCTL_SCRIPT, encoding="utf8")
+    file.chmod(0o755)
+    return file
+
+
+@contextlib.contextmanager
+def environment(**variables: t.Optional[str]) -> t.Iterator[None]:
+    """Temporarily set (or unset, with `None`) environment variables.
+
+    :param variables: The variables to change.
+    """
+    previous = {name: os.environ.get(name) for name in variables}
+
+    def apply(values: dict[str, t.Optional[str]]) -> None:
+        for name, value in values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    apply(variables)
+
+    try:
+        yield
+    finally:
+        apply(previous)
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int, number: int = 1) -> dict[str, float]:
+    """Time a function.
+
+    `func` is called `repeat` times and is expected to perform `number` operations per call; timings are reported per
+    operation.
+
+    :param func: The function to time.
+    :param repeat: The number of times to call the function.
+    :param number: The number of operations performed by each call.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) / number)
+
+    median = statistics.median(timings)
+
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min": min(timings),
+        "median": median,
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+        "ops_per_sec": 1 / median if median else 0.0,
+    }
+
+
+def bench_lookup(tree: Tree, root: Path, repeat: int, sample: int) -> dict[str, dict[str, float]]:
+    """Benchmark finding and validating services.
+
+    :param tree: The service tree.
+    :param root: A scratch directory.
+    :param repeat: The number of times to repeat each measurement.
+    :param sample: The number of services to look up per measurement.
+    """
+    results = {}
+    names = random.Random(0).sample(tree.names, min(sample, len(tree.names)))
+
+    with environment(HOME=str(tree.home), SUDO_USER=None):
+        results["get_paths"] = measure(service.get_paths, repeat)
+
+    with (
+        environment(SUDO_USER="bench"),
+        mock.patch.object(service, "get_paths", return_value=tree.directories),
+        mock.patch.object(selector, "get_paths", return_value=tree.directories),
+    ):
+        index = ServiceIndex(root / "index.json")
+        results["index.rebuild"] = measure(lambda: index.rebuild(tree.directories), repeat)
+        results["discover"] = measure(service.discover, repeat)
+        results["locate"] = measure(lambda: [service.locate(n, tree.domains) for n in names], repeat, len(names))
+        results["locate.index"] = measure(
+            lambda: [service.locate(n, tree.domains, index) for n in names], repeat, len(names)
+        )
+
+        matcher = selector.Selector(["svc1*"], reverse_domains=tree.domains)
+        results["select"] = measure(lambda: selector.select(matcher), repeat)
+        results["select.index"] = measure(lambda: selector.select(matcher, index), repeat)
+
+        services = [service.locate(name, tree.domains, index) for name in names]
+        results["validate"] = measure(lambda: [s.validate() for s in services], repeat, len(services))
+        results["service.fields"] = measure(
+            lambda: [(s.domain, s.file, s.id, s.name) for s in services], repeat, len(services)
+        )
+
+        def read_metadata() -> None:
+            for item in services:
+                metadata.read(item.path)
+
+        metadata._read.cache_clear()  # pylint: disable=protected-access
+        results["metadata.read.cold"] = measure(read_metadata, 1, len(services))
+        results["metadata.read"] = measure(read_metadata, repeat, len(services))
+
+    return results
+
+
+def bench_boot(tree: Tree, program: Path, repeat: int, count: int, jobs: int) -> dict[str, dict[str, float]]:
+    """Benchmark starting and restarting services with the fake launchctl.
+
+    :param tree: The service tree.
+    :param program: The fake launchctl program.
+    :param repeat: The number of times to repeat each measurement.
+    :param count: The number of services to change in bulk measurements.
+    :param jobs: The number of services to change at the same time in bulk measurements.
+    """
+    results = {}
+    targets = [
+        service.Service(tree.directories[i % 2] / f"{tree.domains[i % len(tree.domains)]}.{name}.plist")
+        for i, name in enumerate(tree.names[:count])
+    ]
+    single = next((target for target in targets if "-fail" not in target.name), targets[0])
+    executors: list[tuple[str, t.Callable[[], Executor]]] = [
+        ("subprocess", lambda: SubprocessExecutor(str(program))),
+        ("session", lambda: SessionExecutor(str(program), size=jobs)),
+    ]
+    failures: list[int] = []
+
+    def bulk(operation: t.Callable[[service.Service], t.Any]) -> t.Callable[[], None]:
+        return lambda: failures.append(sum(not result.ok for result in batch.run(targets, operation, jobs)))
+
+    with environment(SUDO_USER="bench"):
+        for name, factory in executors:
+            with factory() as executor, launchctl.use_executor(executor):
+                results[f"boot.{name}"] = measure(lambda: launchctl.boot(single, run=True), repeat)
+                results[f"boot.bulk.{name}"] = measure(bulk(lambda s: launchctl.boot(s, run=True)), repeat, count)
+                results[f"boot.bulk.{name}"]["failures"] = failures[-1]
+
+                for strategy in ["kickstart", "reload"]:
+                    results[f"restart.{strategy}.bulk.{name}"] = measure(
+                        bulk(functools.partial(launchctl.restart, strategy=strategy)), repeat, count
+                    )
+
+    return results
+
+
+def git_commit() -> t.Optional[str]:
+    """Get the commit of the working tree, if it is a git repository."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, cwd=Path(__file__).parent, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.strip()
+
+
+def compare(previous: dict[str, t.Any], current: dict[str, t.Any], threshold: float) -> bool:
+    """Print the change of each median timing between two runs.
+
+    :param previous: The results of the earlier run.
+    :param current: The results of this run.
+    :param threshold: The ratio above which a slowdown is reported as a regression.
+
+    :return: Whether any benchmark regressed.
+    """
+    regressed = False
+
+    for size, benchmarks in current["results"].items():
+        for name, stats in benchmarks.items():
+            before = previous.get("results", {}).get(size, {}).get(name)
+
+            if not before or not before["median"]:
+                continue
+
+            ratio = stats["median"] / before["median"]
+            flag = "REGRESSION" if ratio > threshold else ""
+            regressed = regressed or bool(flag)
+            click.echo(f"{size:>8} {name:<24} {before['median']:>12.6f} {stats['median']:>12.6f} {ratio:>6.2f}x {flag}")
+
+    return regressed
+
+
+@click.command()
+@click.option("--size", "sizes", type=click.IntRange(min=1), multiple=True, default=[100, 10_000], show_default=True)
+@click.option("--domains", type=click.IntRange(min=1), default=50, show_default=True, help="Reverse domains.")
+@click.option("--latency", type=click.FloatRange(min=0), default=0.0, show_default=True, help="launchctl latency (s).")
+@click.option("--failure-code", type=click.IntRange(min=1, max=255), default=5, show_default=True)
+@click.option("--fail-every", type=click.IntRange(min=0), default=10, show_default=True, help="Fail every nth service.")
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True)
+@click.option("--sample", type=click.IntRange(min=1), default=100, show_default=True, help="Services to look up.")
+@click.option("--count", type=click.IntRange(min=1), default=100, show_default=True, help="Services to boot in bulk.")
+@click.option("--jobs", type=click.IntRange(min=1), default=batch.DEFAULT_JOBS, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False, path_type=Path), help="Write results to a JSON file.")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--threshold", type=click.FloatRange(min=1), default=1.1, show_default=True, help="Regression ratio.")
+def main(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    sizes: tuple[int, ...],
+    domains: int,
+    latency: float,
+    failure_code: int,
+    fail_every: int,
+    repeat: int,
+    sample: int,
+    count: int,
+    jobs: int,
+    output: t.Optional[Path],
+    baseline: t.Optional[Path],
+    threshold: float,
+) -> None:
+    """Run the benchmarks."""
+    parameters = {
+        "domains": domains,
+        "latency": latency,
+        "failure_code": failure_code,
+        "fail_every": fail_every,
+        "repeat": repeat,
+        "sample": sample,
+        "count": count,
+        "jobs": jobs,
+    }
+    report: dict[str, t.Any] = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "parameters": parameters,
+        "results": run(sizes, parameters),
+    }
+
+    if output:
+        output.write_text(json.dumps(report, indent=2), encoding="utf8")
+
+    if baseline and compare(json.loads(baseline.read_text(encoding="utf8")), report, threshold):
+        sys.exit(1)
+
+
+def run(sizes: tuple[int, ...], parameters: dict[str, t.Any]) -> dict[str, dict[str, dict[str, float]]]:
+    """Run the benchmarks for each tree size in a temporary directory and print the results.
+
+    :param sizes: The numbers of services in the generated trees.
+    :param parameters: The benchmark parameters.
+
+    :return: The results for each tree size.
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="service-bench-") as tmp:
+        root = Path(tmp)
+        program = install_launchctl(root)
+
+        with environment(
+            XDG_CACHE_HOME=str(root / "cache"),
+            BENCH_LATENCY=str(parameters["latency"]),
+            BENCH_FAILURE_CODE=str(parameters["failure_code"]),
+        ):
+            for size in sizes:
+                click.echo(f"Generating {size} services", err=True)
+                tree = generate_tree(root / str(size), size, parameters["domains"], parameters["fail_every"])
+                results[str(size)] = bench_lookup(tree, root / str(size), parameters["repeat"], parameters["sample"])
+                results[str(size)].update(
+                    bench_boot(tree, program, parameters["repeat"], min(parameters["count"], size), parameters["jobs"])
+                )
+
+                for name, stats in results[str(size)].items():
+                    click.echo(f"{size:>8} {name:<24} {stats['median']:>12.6f} s/op {stats['ops_per_sec']:>12.1f} op/s")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
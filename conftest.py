@@ -1,8 +1,26 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring
 
+import os
 from pathlib import Path
 
 import pytest
+from pytest_mock import MockerFixture
+
+
+@pytest.fixture(name="cache_dir", autouse=True)
+def cache_dir_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep cache files written during tests out of the user's cache directory."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture(name="journal_dir", autouse=True)
+def journal_dir_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep changes recorded during tests out of the journal of the user or the system."""
+    journal_dir = tmp_path / "journal"
+    monkeypatch.setenv("SERVICE_JOURNAL", str(journal_dir))
+    return journal_dir
 
 
 @pytest.fixture(name="config", scope="session")
@@ -14,6 +32,41 @@ def config_fixture(tmp_path_factory: pytest.TempPathFactory) -> Path:
     return file
 
 
+@pytest.fixture(name="launchctl")
+def launchctl_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A stand-in launchctl program that is first on `PATH`.
+
+    The program echoes its arguments to stdout and "error" to stderr. It waits for the number of seconds set in the
+    `LAUNCHCTL_DELAY` environment variable (default: 0) and exits with the return code set in the `LAUNCHCTL_RETURNCODE`
+    environment variable (default: 0).
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    file = bin_dir / "launchctl"
+    file.write_text(
+        '#!/bin/sh\necho "$@"\necho error >&2\nsleep "${LAUNCHCTL_DELAY:-0}"\nexit "${LAUNCHCTL_RETURNCODE:-0}"\n',
+        encoding="utf8",
+    )
+    file.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return file
+
+
+@pytest.fixture(name="service_dir")
+def service_dir_fixture(mocker: MockerFixture, tmp_path: Path) -> Path:
+    """A service directory, searched as the only system domain directory, with the services "com.acme.worker.a",
+    "com.acme.worker.b", and "com.acme.web".
+    """
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    mocker.patch("service.selector.get_paths", return_value=[tmp_path])
+
+    for name in ["worker.a", "worker.b", "web"]:
+        tmp_path.joinpath(f"com.acme.{name}.plist").touch()
+
+    return tmp_path
+
+
 @pytest.fixture(name="plist", scope="session")
 def plist_fixture(tmp_path_factory: pytest.TempPathFactory) -> Path:
     """Creates a (blank) service plist file for tests that require it to exist."""
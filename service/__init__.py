@@ -4,6 +4,28 @@ service
 The service public API
 """
 
-from . import launchctl
-from .service import locate
-from .service import Service
+import importlib
+import typing as t
+
+if t.TYPE_CHECKING:
+    from . import launchctl
+    from .service import locate, Service
+
+
+__all__ = ["launchctl", "locate", "Service"]
+
+
+def __getattr__(name: str) -> t.Any:
+    """Import the public API on first use so the command-line interface starts quickly.
+
+    :param name: The attribute name.
+
+    :raises AttributeError: When the attribute is not part of the public API.
+    """
+    if name == "launchctl":
+        return importlib.import_module(f"{__name__}.launchctl")
+
+    if name in ["locate", "Service"]:
+        return getattr(importlib.import_module(f"{__name__}.service"), name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
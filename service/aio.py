@@ -0,0 +1,256 @@
+"""
+service.aio
+
+An asyncio interface for locating and changing services.
+"""
+
+from __future__ import annotations
+import asyncio
+import contextlib
+import logging
+import subprocess
+import typing as t
+
+from . import launchctl, service as _service, timing
+from .batch import DEFAULT_JOBS
+from .executor import LAUNCHCTL
+from .launchctl import _boot_steps, _change_state_steps, _record_change, _restart_steps
+
+if t.TYPE_CHECKING:
+    from .domain import DomainContext
+    from .index import ServiceIndex
+    from .launchctl import Steps
+    from .service import Service
+
+
+__all__ = ["Runner", "boot", "change_state", "locate", "restart"]
+
+
+T = t.TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class Runner:
+    """Run launchctl commands as asyncio subprocesses.
+
+    At most `limit` commands run at the same time; additional commands wait for a running command to finish. When the
+    task awaiting a command is cancelled the launchctl process is killed.
+
+    :param limit: The maximum number of commands to run at the same time.
+    :param program: The launchctl program to run.
+
+    :raises ValueError: When `limit` is less than 1.
+    """
+
+    def __init__(self, limit: int = DEFAULT_JOBS, program: str = LAUNCHCTL):
+        if limit < 1:
+            raise ValueError("The concurrency limit must be at least 1")
+
+        self._limit = limit
+        self._program = program
+        self._semaphore: t.Optional[asyncio.Semaphore] = None
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def limit(self) -> int:
+        """The maximum number of commands to run at the same time."""
+        return self._limit
+
+    @property
+    def program(self) -> str:
+        """The launchctl program to run."""
+        return self._program
+
+    async def run(self, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+        """Run a launchctl subcommand.
+
+        :param subcommand: The launchctl subcommand to run.
+        :param args: The arguments for the subcommand.
+
+        :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+        """
+        cmd = [self._program, subcommand, *args]
+
+        async with self._get_semaphore():
+            logger.debug('Calling launchctl with command "%s"', " ".join(cmd))
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+
+                await process.wait()
+                raise
+
+        result = subprocess.CompletedProcess(cmd, t.cast(int, process.returncode), stdout=stdout, stderr=stderr)
+        result.check_returncode()
+
+        return result
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore for the running event loop.
+
+        Semaphores cannot be shared between event loops, so a new semaphore is created when the runner is used by a
+        different loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._limit)
+            self._loop = loop
+
+        return self._semaphore
+
+
+_default_runner = Runner()
+
+
+async def locate(
+    name: str,
+    reverse_domains: list[str],
+    index: t.Optional[ServiceIndex] = None,
+    context: t.Optional[DomainContext] = None,
+) -> Service:
+    """Locate a service without blocking the event loop.
+
+    See `service.service.locate`.
+
+    :param name: The service name, with optional absolute/relative path and file extension.
+    :param reverse_domains: A list of reverse domains to prepend to the service name.
+    :param index: An optional index of the service directories.
+    :param context: The domain to search; the active domain if not provided.
+
+    :raises ValueError: When a service is not found or a service name without path and/or domain is provided and there
+    no reverse domains are configured.
+    """
+    return await asyncio.to_thread(_service.locate, name, reverse_domains, index, context)
+
+
+async def boot(service: Service, run: bool = False, runner: t.Optional[Runner] = None) -> None:
+    """Start or stop a service.
+
+    See `service.launchctl.boot`.
+
+    :param service: The service to modify.
+    :param run: Whether to run (start) the service.
+    :param runner: The runner to use; the shared default runner is used if not provided.
+
+    :raises RuntimeError: When the service is already in the target state, runtime state change is prevented by SIP, or
+    changing the runtime state fails.
+    """
+    await _run_steps(runner, service, _boot_steps(service, run))
+
+
+async def change_state(service: Service, enable: bool = False, runner: t.Optional[Runner] = None) -> None:
+    """Change service state (enable/disable).
+
+    See `service.launchctl.change_state`.
+
+    :param service: The service to target.
+    :param enable: Whether the service should be enabled.
+    :param runner: The runner to use; the shared default runner is used if not provided.
+
+    :raises RuntimeError: When the service state cannot be changed or changing the service state fails.
+    """
+    await _run_steps(runner, service, _change_state_steps(service, enable))
+
+
+async def restart(service: Service, strategy: str = "kickstart", runner: t.Optional[Runner] = None) -> str:
+    """Restart a service, falling back to another strategy when the requested one cannot be used.
+
+    See `service.launchctl.restart`.
+
+    :param service: The service to restart.
+    :param strategy: The strategy to try first; one of `service.launchctl.RESTART_STRATEGIES`.
+    :param runner: The runner to use; the shared default runner is used if not provided.
+
+    :returns: The strategy that restarted the service.
+
+    :raises ValueError: When the strategy is unknown.
+    :raises RuntimeError: When restarting the service fails.
+    """
+    return await _run_steps(runner, service, _restart_steps(service, strategy))
+
+
+async def _change(runner: Runner, service: Service, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+    """Run a launchctl command that changes a service once the active limiter lets it start, and record the change in
+    the active journal, if any.
+
+    See `service.launchctl._change`; the limiter is waited on, and failed commands are retried, without blocking the
+    event loop.
+
+    :param runner: The runner.
+    :param service: The service the command changes.
+    :param subcommand: The launchctl subcommand to run.
+    :param args: The arguments for the subcommand.
+
+    :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+    """
+    async with launchctl.get_limiter().acquire_async(service.domain):
+        with _record_change(service, subcommand):
+            return await _execute(runner, subcommand, *args)
+
+
+async def _execute(runner: Runner, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+    """Run a launchctl command, retrying it according to the active retry policy when it fails transiently.
+
+    :param runner: The runner.
+    :param subcommand: The launchctl subcommand to run.
+    :param args: The arguments for the subcommand.
+
+    :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+    """
+    policy = launchctl.get_retry_policy()
+    delays = policy.delays()
+
+    while True:
+        with timing.span("launchctl", subcommand=subcommand) as span:
+            try:
+                result = await runner.run(subcommand, *args)
+            except subprocess.CalledProcessError as exc:
+                span.set(returncode=exc.returncode)
+                delay = next(delays, None) if policy.is_transient(subcommand, exc.returncode) else None
+
+                if delay is None:
+                    raise
+
+                logger.debug(
+                    "launchctl %s failed with return code %s, retrying in %.3fs", subcommand, exc.returncode, delay
+                )
+            else:
+                span.set(returncode=result.returncode)
+                return result
+
+        await asyncio.sleep(delay)
+
+
+async def _run_steps(runner: t.Optional[Runner], service: Service, steps: Steps[T]) -> T:
+    """Run the launchctl commands of an operation on a service, throwing each failed command into the operation.
+
+    See `service.launchctl._run_steps`.
+
+    :param runner: The runner to use; the shared default runner is used if not provided.
+    :param service: The service the commands change.
+    :param steps: The launchctl commands of the operation.
+
+    :returns: The result of the operation.
+    """
+    runner = runner or _default_runner
+    error: t.Optional[subprocess.CalledProcessError] = None
+
+    while True:
+        try:
+            step = next(steps) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            await _change(runner, service, *step)
+            error = None
+        except subprocess.CalledProcessError as exc:
+            error = exc
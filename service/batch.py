@@ -0,0 +1,246 @@
+"""
+service.batch
+
+Run service operations concurrently.
+"""
+
+from __future__ import annotations
+import contextvars
+import graphlib
+import logging
+import time
+import typing as t
+
+if t.TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+    from .service import Service
+
+
+__all__ = ["DEFAULT_JOBS", "Result", "run"]
+
+
+DEFAULT_JOBS = 8
+
+
+logger = logging.getLogger(__name__)
+
+
+class Result(t.NamedTuple):
+    """The outcome of an operation on a single service.
+
+    :param service: The service the operation targeted.
+    :param error: The exception raised by the operation, if it failed.
+    :param value: The value returned by the operation, if it succeeded.
+    :param duration: The number of seconds the operation took.
+    """
+
+    service: Service
+    error: t.Optional[Exception] = None
+    value: t.Any = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Whether the operation succeeded."""
+        return self.error is None
+
+    @property
+    def returncode(self) -> t.Optional[int]:
+        """The launchctl return code: 0 when the operation succeeded, the return code of the launchctl call that made
+        it fail, or `None` when it failed without a launchctl call failing (e.g., a skipped service)."""
+        if self.error is None:
+            return 0
+
+        return getattr(self.error.__cause__, "returncode", None)
+
+    def to_dict(self, operation: str) -> dict[str, t.Any]:
+        """Convert the result to a JSON-serializable dictionary.
+
+        :param operation: The name of the operation.
+        """
+        return {
+            "service": self.service.name,
+            "domain": self.service.domain,
+            "operation": operation,
+            "ok": self.ok,
+            "returncode": self.returncode,
+            "duration": round(self.duration, 6),
+            "error": None if self.error is None else str(self.error),
+        }
+
+
+def run(  # pylint: disable=too-many-arguments
+    services: t.Sequence[Service],
+    operation: t.Callable[[Service], t.Any],
+    jobs: int = DEFAULT_JOBS,
+    dependencies: t.Optional[t.Mapping[Service, t.Iterable[Service]]] = None,
+    *,
+    reverse: bool = False,
+    satisfied: t.Optional[t.Callable[[Result], bool]] = None,
+) -> t.Iterator[Result]:
+    """Run an operation on each service using a bounded pool of worker threads.
+
+    Results are yielded in the order the operations complete, with the time each operation took. An exception raised by
+    the operation is captured in the result for that service and does not affect the other services. Operations run in
+    a copy of the context `run` is called in (e.g., with the executor from `service.launchctl.use_executor`).
+
+    When dependencies are given, the operation on a service starts as soon as the operations on all of its dependencies
+    have succeeded, so independent services still run in parallel. If an operation fails, every service that depends on
+    that service, directly or indirectly, fails immediately without running the operation, unless `satisfied` accepts
+    the failure (e.g., a service that was already started). With `reverse`, services are handled before the services
+    they depend on (e.g., to stop services). Dependencies on services that are not in `services` are ignored.
+
+    :param services: The services to operate on.
+    :param operation: A callable that receives a service and performs the operation.
+    :param jobs: The maximum number of operations to run at the same time.
+    :param dependencies: The services each service depends on.
+    :param reverse: Whether to reverse the dependency order.
+    :param satisfied: A callable that receives a failed result and returns whether the services that wait for the
+    service can still be handled.
+
+    :raises ValueError: When `jobs` is less than 1 or the dependencies contain a cycle.
+    """
+    if jobs < 1:
+        raise ValueError("The number of jobs must be at least 1")
+
+    if not services:
+        return
+
+    scheduler = _Scheduler(_build_graph(services, dependencies or {}, reverse), operation, satisfied)
+
+    # imported here since `concurrent.futures` is slow to import and is not needed to start the program
+    # pylint: disable-next=import-outside-toplevel
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = min(jobs, len(services))
+    logger.debug("Running operation on %s services with %s workers", len(services), workers)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=__name__) as pool:
+        yield from scheduler.run(pool)
+
+
+class _Scheduler:
+    """Start the operation on each service once the services it waits for are handled.
+
+    :param graph: The services that must be handled before each service (see `_build_graph`).
+    :param operation: A callable that receives a service and performs the operation.
+    :param satisfied: A callable that receives a failed result and returns whether the services that wait for the
+    service can still be handled.
+
+    :raises ValueError: When the graph contains a cycle.
+    """
+
+    def __init__(
+        self,
+        graph: dict[Service, set[Service]],
+        operation: t.Callable[[Service], t.Any],
+        satisfied: t.Optional[t.Callable[[Result], bool]] = None,
+    ):
+        self._sorter = graphlib.TopologicalSorter(graph)
+        self._operation = operation
+        self._satisfied = satisfied
+        self._waiting: dict[Service, set[Service]] = {service: set() for service in graph}
+        self._skipped: set[Service] = set()
+
+        try:
+            self._sorter.prepare()
+        except graphlib.CycleError as exc:
+            raise ValueError(f"Dependency cycle: {' -> '.join(service.name for service in exc.args[1])}") from exc
+
+        for service, predecessors in graph.items():
+            for predecessor in predecessors:
+                self._waiting[predecessor].add(service)
+
+    def run(self, pool: Executor) -> t.Iterator[Result]:
+        """Run the operation on every service.
+
+        :param pool: The pool to run the operations in.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        futures: dict[Future[Result], Service] = {}
+
+        while True:
+            for service in self._sorter.get_ready():
+                futures[pool.submit(contextvars.copy_context().run, self.call, service)] = service
+
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+            # operations that complete together are reported in the order they were started
+            for future in [future for future in futures if future in done]:
+                yield from self.complete(futures.pop(future), future.result())
+
+    def call(self, service: Service) -> Result:
+        """Run the operation on a service.
+
+        :param service: The service.
+        """
+        start = time.perf_counter()
+
+        try:
+            return Result(service, value=self._operation(service), duration=time.perf_counter() - start)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            return Result(service, exc, duration=time.perf_counter() - start)
+
+    def complete(self, service: Service, result: Result) -> t.Iterator[Result]:
+        """Report the result of the operation on a service, and release or skip the services that wait for it.
+
+        :param service: The service.
+        :param result: The result of the operation.
+        """
+        yield result
+
+        if result.ok or (self._satisfied is not None and self._satisfied(result)):
+            self._sorter.done(service)
+            return
+
+        for successor in _successors(self._waiting, service):
+            if successor not in self._skipped:
+                self._skipped.add(successor)
+                yield Result(successor, RuntimeError(f"{successor.name} skipped because {service.name} failed"))
+
+
+def _build_graph(
+    services: t.Sequence[Service], dependencies: t.Mapping[Service, t.Iterable[Service]], reverse: bool
+) -> dict[Service, set[Service]]:
+    """Build a graph that maps each service to the services that must be handled before it.
+
+    :param services: The services to operate on.
+    :param dependencies: The services each service depends on.
+    :param reverse: Whether to reverse the dependency order.
+    """
+    graph: dict[Service, set[Service]] = {service: set() for service in services}
+
+    for service in services:
+        for dependency in dependencies.get(service, []):
+            if dependency in graph:
+                if reverse:
+                    graph[dependency].add(service)
+                else:
+                    graph[service].add(dependency)
+
+    return graph
+
+
+def _successors(waiting: dict[Service, set[Service]], service: Service) -> list[Service]:
+    """Get all services that wait for a service, directly or indirectly.
+
+    :param waiting: The services waiting for each service.
+    :param service: The service.
+    """
+    found: list[Service] = []
+    pending = list(waiting[service])
+
+    while pending:
+        successor = pending.pop()
+
+        if successor not in found:
+            found.append(successor)
+            pending.extend(waiting[successor])
+
+    return found
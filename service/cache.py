@@ -0,0 +1,61 @@
+"""
+service.cache
+
+Per-user cache files.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import typing as t
+
+
+__all__ = ["get_cache_dir", "read_cache", "write_cache"]
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_dir() -> Path:
+    """Get the cache directory for the current user."""
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache"), str(__package__))
+
+
+def read_cache(file: Path) -> t.Any:
+    """Read a cache file.
+
+    :param file: The cache file.
+
+    :returns: The cached data or `None` when the cache file does not exist or cannot be read.
+    """
+    try:
+        return json.loads(file.read_text(encoding="utf8"))
+    except (OSError, ValueError):
+        logger.debug('No usable cache file at "%s"', file)
+        return None
+
+
+def write_cache(file: Path, data: t.Any) -> bool:
+    """Write a cache file.
+
+    The file is replaced atomically so concurrent readers never see a partially written file. Failing to write a cache
+    file is not an error; the cached data will be recreated on the next run.
+
+    :param file: The cache file.
+    :param data: The data to cache; must be JSON serializable.
+
+    :returns: Whether the cache file was written.
+    """
+    tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+
+    try:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(json.dumps(data, separators=(",", ":")), encoding="utf8")
+        tmp_file.replace(file)
+    except OSError as exc:
+        logger.debug('Failed to write cache file "%s": %s', file, exc)
+        tmp_file.unlink(missing_ok=True)
+        return False
+
+    return True
@@ -2,133 +2,784 @@
 service.cli
 
 The command-line interface for service
+
+Modules that are not needed to parse arguments are imported when a command runs so the program starts quickly.
 """
 
+# pylint: disable=import-outside-toplevel
+
+from __future__ import annotations
+import functools
+import json
 import logging
 import os
 from pathlib import Path
-import platform
+import time
 import typing as t
 
 import click
 from clickext import ClickextCommand, ClickextGroup, config_option, verbose_option
 
-from . import launchctl
-from .service import locate, Service
+from . import batch, timing
+from .cache import get_cache_dir, read_cache, write_cache
+from .config import Config, load_config
+from .runner import (
+    compile_plan,
+    get_services,
+    load_index,
+    META_DOMAIN_LIMITS,
+    META_FAILURES,
+    META_HOSTS,
+    META_JOBS,
+    META_OUTPUT,
+    META_PROFILE,
+    META_PROFILE_FILE,
+    META_PROFILE_FORMAT,
+    request_daemon,
+    resolve_references,
+    run_batch,
+    run_plan,
+    use_local_launchctl,
+)
+
+if t.TYPE_CHECKING:
+    from .service import Service
+    from .watcher import Watcher
 
 
+HOST_COMMANDS = ("disable", "enable", "restart", "start", "stop")
 MACOS_MIN_VERSION = 12.0
+BOOT_TIME_TOLERANCE = 10.0
+WAIT_TIMEOUT = 30.0
 CONFIG_FILE = Path(f'~{os.getenv("SUDO_USER", "")}/.config/service.toml').expanduser()
+SERVICES_FILE = Path(f'~{os.getenv("SUDO_USER", "")}/.config/services.toml').expanduser()
 
 
 logger = logging.getLogger(__package__)
 
 
-def get_reverse_domains(data: t.Optional[dict[str, list[str]]]) -> list[str]:
-    """Build reverse domains from configuration file data.
+def echo_states(states: list[dict[str, t.Any]], as_json: bool) -> None:
+    """Print the state of services as a table or JSON.
 
-    :param data: The parsed configuration file data.
+    :param states: The service states (see `service.status.ServiceState.to_dict`).
+    :param as_json: Whether to print JSON.
     """
-    if data is None or "reverse-domains" not in data:
-        reverse_domains = []
-    else:
-        reverse_domains = data["reverse-domains"]
+    if as_json:
+        click.echo(json.dumps(states, indent=2))
+        return
+
+    rows = [("NAME", "STATE", "PID", "STATUS")]
+
+    for data in states:
+        rows.append((data["name"], data["state"], _or_dash(data["pid"]), _or_dash(data["last_exit_status"])))
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+
+    for row in rows:
+        click.echo("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def set_domain_limits(
+    ctx: click.Context, param: click.Parameter, value: t.Optional[str]  # pylint: disable=unused-argument
+) -> None:
+    """Store the per-domain limits, from a comma-separated list of "DOMAIN=N", on `ctx.meta`.
 
-        if not isinstance(reverse_domains, list):
-            logger.warning('Invalid configuration file. "reverse-domains" must be a list.')
-            reverse_domains = []
+    :param ctx: The current click execution context.
+    :param param: The parameter that triggered the callback.
+    :param value: The parameter value.
+
+    :raises click.BadParameter: When a limit is invalid.
+    """
+    limits = {}
+
+    for item in [item.strip() for item in (value or "").split(",") if item.strip()]:
+        domain, _, limit = item.partition("=")
 
-    logger.debug("Configured with %s reverse domains", len(reverse_domains))
+        if not domain or not limit.isdigit():
+            raise click.BadParameter(f'"{item}" is not a limit written as DOMAIN=N.', ctx, param)
 
-    return reverse_domains
+        limits[domain] = int(limit)
 
+    ctx.meta[META_DOMAIN_LIMITS] = limits
 
-def get_service(ctx: click.Context, param: click.Parameter, value: str) -> None:  # pylint: disable=unused-argument
-    """Get the target service and store it on `ctx.obj`.
+
+def set_hosts(
+    ctx: click.Context, param: click.Parameter, value: t.Optional[str]  # pylint: disable=unused-argument
+) -> None:
+    """Store the hosts to change services on, from a comma-separated list, on `ctx.meta`.
 
     :param ctx: The current click execution context.
     :param param: The parameter that triggered the callback.
     :param value: The parameter value.
+
+    :raises click.BadParameter: When a host is invalid.
+    """
+    hosts = [host.strip() for host in (value or "").split(",") if host.strip()]
+    ctx.meta[META_HOSTS] = hosts or None
+
+    if not hosts:
+        return
+
+    from .transport import get_transport
+
+    for host in hosts:
+        try:
+            get_transport(host)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), ctx, param) from exc
+
+
+def set_meta(ctx: click.Context, param: click.Parameter, value: t.Any) -> None:
+    """Store an option value on `ctx.meta` so it is available to all subcommands.
+
+    :param ctx: The current click execution context.
+    :param param: The parameter that triggered the callback.
+    :param value: The parameter value.
+    """
+    ctx.meta[f"{__package__}.{param.name}"] = value
+
+
+def start_profile(ctx: click.Context, param: click.Parameter, value: t.Any) -> None:
+    """Store a profiling option value and start recording timing spans if profiling is requested.
+
+    Spans are recorded until the program exits, when they are reported by `report_profile`.
+
+    :param ctx: The current click execution context.
+    :param param: The parameter that triggered the callback.
+    :param value: The parameter value.
+    """
+    set_meta(ctx, param, value)
+
+    if value and timing.get_recorder() is None:
+        ctx.call_on_close(functools.partial(report_profile, ctx, timing.enable(), time.time(), time.perf_counter()))
+
+
+def report_profile(ctx: click.Context, recorder: timing.Recorder, start_time: float, started: float) -> None:
+    """Stop recording timing spans, print a breakdown, and write the spans to the profile file.
+
+    :param ctx: The click execution context of the program.
+    :param recorder: The recorder used for the program.
+    :param start_time: The wall clock time the program started.
+    :param started: The performance counter value when the program started.
+    """
+    timing.disable()
+    command = ctx.invoked_subcommand or ""
+    recorder.record("command", start_time, time.perf_counter() - started, {"command": command})
+
+    if ctx.meta.get(META_PROFILE):
+        rows = [("SPAN", "COUNT", "TOTAL", "MEAN", "MAX")]
+
+        for key, (count, total, maximum) in sorted(recorder.summary().items(), key=lambda item: -item[1][1]):
+            rows.append((key, str(count), _ms(total), _ms(total / count), _ms(maximum)))
+
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+
+        for row in rows:
+            click.echo("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip(), err=True)
+
+    file = ctx.meta.get(META_PROFILE_FILE)
+
+    if file:
+        try:
+            if ctx.meta.get(META_PROFILE_FORMAT) == "prometheus":
+                timing.write_prometheus(recorder, file)
+            else:
+                timing.write_jsonl(recorder, file, pid=os.getpid(), command=command)
+        except OSError as exc:
+            logger.warning('Failed to write profile to "%s": %s', file, exc)
+
+
+def _watch_service_paths(ctx: click.Context) -> Watcher:
+    """Watch the service directories of the active domain until the program exits.
+
+    :param ctx: The current click execution context.
+
+    :raises click.ClickException: When no service paths are found.
     """
-    reverse_domains: list[str] = ctx.obj.copy()
-    ctx.obj = locate(value, reverse_domains)
+    from .service import get_paths
+    from .watcher import get_watcher
 
+    try:
+        watcher = get_watcher(get_paths())
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
 
-@click.group(cls=ClickextGroup, global_opts=["config", "verbose"], shared_params=["name"])
-@click.argument("name", nargs=1, callback=get_service, expose_value=False, type=click.STRING)
+    ctx.call_on_close(watcher.close)
+    logger.debug("Watching service directories with %s", type(watcher).__name__)
+
+    return watcher
+
+
+def _ms(value: float) -> str:
+    """Format a duration in seconds as milliseconds.
+
+    :param value: The duration.
+    """
+    return f"{value * 1000:.1f}ms"
+
+
+def _or_dash(value: t.Optional[int]) -> str:
+    """Format an optional value for display.
+
+    :param value: The value.
+    """
+    return "-" if value is None else str(value)
+
+
+json_option = click.option("--json", "as_json", is_flag=True, default=False, help="Output JSON.")
+strategy_option = click.option(
+    "--strategy",
+    type=click.Choice(["kickstart", "reload", "signal"]),
+    default="kickstart",
+    show_default=True,
+    help=(
+        "Restart services in place with kickstart, unload and load them with reload, or send SIGTERM and let launchd "
+        "restart them with signal. The next strategy is used when one does not apply."
+    ),
+)
+wait_option = click.option(
+    "--wait",
+    type=click.FloatRange(min=0),
+    is_flag=False,
+    flag_value=WAIT_TIMEOUT,
+    default=None,
+    metavar="[TIMEOUT]",
+    help=f"Wait up to TIMEOUT seconds (default: {WAIT_TIMEOUT:g}) until services are running or have exited.",
+)
+
+
+def users_options(func: t.Callable) -> t.Callable:
+    """Add the `--all-users` and `--uid` options to a command, to change services in the gui domains of other users.
+
+    :param func: The command function.
+    """
+    func = click.option(
+        "--uid",
+        "uids",
+        type=click.IntRange(min=0),
+        multiple=True,
+        is_eager=True,
+        expose_value=False,
+        callback=set_meta,
+        help="Change services in the gui domain of the user with this ID (may be repeated).",
+    )(func)
+
+    return click.option(
+        "--all-users",
+        is_flag=True,
+        default=False,
+        is_eager=True,
+        expose_value=False,
+        callback=set_meta,
+        help="Change services in the gui domain of every logged-in user.",
+    )(func)
+
+
+def names_argument(func: t.Callable) -> t.Callable:
+    """Add the service references and `--match` option to a command.
+
+    :param func: The command function.
+    """
+    func = click.argument(
+        "names", nargs=-1, required=False, callback=get_services, expose_value=False, type=click.STRING
+    )(func)
+
+    return click.option(
+        "--match",
+        "-m",
+        metavar="REGEX",
+        multiple=True,
+        is_eager=True,
+        expose_value=False,
+        callback=set_meta,
+        help="Also target services with a name matching a regular expression (may be repeated).",
+    )(func)
+
+
+@click.group(
+    cls=ClickextGroup,
+    global_opts=[
+        "config",
+        "domain_limit",
+        "executor",
+        "hosts",
+        "in_flight",
+        "jobs",
+        "no_cache",
+        "no_daemon",
+        "output",
+        "profile",
+        "profile_file",
+        "profile_format",
+        "rate",
+        "verbose",
+    ],
+)
 @click.version_option(package_name="py_service")
-@config_option(CONFIG_FILE, processor=get_reverse_domains)
+@config_option(CONFIG_FILE, processor=load_config)
+@click.option(
+    "--domain-limit",
+    metavar="DOMAIN=N[,DOMAIN=N...]",
+    expose_value=False,
+    callback=set_domain_limits,
+    help='The maximum number of services to change at the same time in each domain, e.g., "system=2,gui=4". Shared by '
+    "every service process.",
+)
+@click.option(
+    "--executor",
+    type=click.Choice(["subprocess", "session"]),
+    default="subprocess",
+    show_default=True,
+    expose_value=False,
+    callback=set_meta,
+    help="Run each launchctl command in a new process or through long-lived helper processes.",
+)
+@click.option(
+    "--hosts",
+    metavar="HOST[,HOST...]",
+    expose_value=False,
+    callback=set_hosts,
+    help=(
+        "Change services on these hosts over SSH instead of on this machine, up to --jobs services at a time on each "
+        "host (disable, enable, restart, start, and stop in the system domain only)."
+    ),
+)
+@click.option(
+    "--in-flight",
+    type=click.IntRange(min=0),
+    expose_value=False,
+    callback=set_meta,
+    help="The maximum number of services to change at the same time, shared by every service process (0: no limit).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=batch.DEFAULT_JOBS,
+    show_default=True,
+    expose_value=False,
+    callback=set_meta,
+    help="The maximum number of services to change at the same time.",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    expose_value=False,
+    callback=set_meta,
+    help="Search service directories without using the service index.",
+)
+@click.option(
+    "--no-daemon",
+    is_flag=True,
+    default=False,
+    expose_value=False,
+    callback=set_meta,
+    help="Change services in this process even when a daemon is running.",
+)
+@click.option(
+    "--output",
+    type=click.Choice(["text", "jsonl"]),
+    default="text",
+    show_default=True,
+    expose_value=False,
+    callback=set_meta,
+    help="Report the result of each service operation as text or as a JSON line on stdout.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    is_eager=True,
+    expose_value=False,
+    callback=start_profile,
+    help="Print a breakdown of the time spent in each phase.",
+)
+@click.option(
+    "--profile-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    envvar="SERVICE_PROFILE_FILE",
+    show_envvar=True,
+    is_eager=True,
+    expose_value=False,
+    callback=start_profile,
+    help="Write the time spent in each phase to a file.",
+)
+@click.option(
+    "--profile-format",
+    type=click.Choice(["jsonl", "prometheus"]),
+    default="jsonl",
+    show_default=True,
+    expose_value=False,
+    callback=set_meta,
+    help="Append JSON lines to the profile file or update it as a Prometheus textfile.",
+)
+@click.option(
+    "--rate",
+    type=click.FloatRange(min=0),
+    expose_value=False,
+    callback=set_meta,
+    help="The maximum number of service changes to start per second, shared by every service process (0: no limit).",
+)
 @verbose_option(logger)
 def cli() -> None:
     """Extremely basic launchctl wrapper for macOS."""
     logger.debug("%s started", __package__)
     verify_platform()
+    ctx = click.get_current_context()
+
+    if not ctx.meta.get(META_HOSTS):
+        return
+
+    if ctx.invoked_subcommand not in HOST_COMMANDS:
+        raise click.UsageError(f"--hosts cannot be used with {ctx.invoked_subcommand}.", ctx)
+
+    from .domain import get_context
+
+    # services are resolved on this machine; the gui domain, home directory, and LaunchAgents of a user differ by host
+    if not get_context().is_system:
+        raise click.UsageError("--hosts can only change services in the system domain (run with sudo).", ctx)
+
+
+@cli.command(cls=ClickextCommand, name="apply")
+@click.argument(
+    "file", type=click.Path(dir_okay=False, path_type=Path), default=SERVICES_FILE, required=False, metavar="[FILE]"
+)
+@click.option("--dry-run", is_flag=True, default=False, help="Print the launchctl calls without running them.")
+@click.pass_obj
+def apply_state(config: t.Optional[Config], file: Path, dry_run: bool) -> None:
+    """Bring services to the state in a desired state file.
+
+    FILE defaults to ~/.config/services.toml. Only services that differ from their desired state are changed.
+    """
+    from . import desired
+
+    ctx = click.get_current_context()
+    config = config or Config()
+
+    try:
+        states = desired.load(file)
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+
+    index = load_index(ctx)
+    resolved = resolve_references(ctx, config, index, states)
+    targets: dict[str, tuple[Service, desired.DesiredState]] = {}
+
+    for reference, state in states.items():
+        for service in resolved[reference]:
+            previous = targets.get(service.file, (service, desired.DesiredState()))[1]
+            targets[service.file] = (service, previous.update(state))
+
+    compiled = compile_plan(desired.get_steps(targets.values()), "kickstart", changes_only=True)
+    run_plan(ctx, config, index, compiled, dry_run)
 
 
 @cli.command(cls=ClickextCommand)
+@names_argument
 @click.pass_obj
-def disable(service: Service) -> None:
-    """Disable a service (system domain only)."""
-    launchctl.change_state(service, enable=False)
-    logger.info("%s disabled", service.name)
+def disable(services: list[Service]) -> None:
+    """Disable services (system domain only)."""
+    from .operations import Operation
+
+    run_batch(services, Operation("disable"))
+
+
+@cli.command(cls=ClickextCommand)
+@names_argument
+@click.pass_obj
+def enable(services: list[Service]) -> None:
+    """Enable services (system domain only)."""
+    from .operations import Operation
+
+    run_batch(services, Operation("enable"))
+
+
+@cli.command(cls=ClickextCommand)
+@click.argument("name", required=False)
+@click.option(
+    "--since",
+    metavar="TIME",
+    help='Only show changes since a time: a duration ago (e.g., "30m", "2h", "7d") or a date and time (e.g., '
+    '"2026-10-17 09:30").',
+)
+def history(name: t.Optional[str], since: t.Optional[str]) -> None:
+    """Show the changes made to services, oldest first.
+
+    NAME is a service name or label; changes to all services are shown by default.
+    """
+    from datetime import datetime
+
+    from . import journal
+    from .domain import get_context
+
+    ctx = click.get_current_context()
+
+    try:
+        since_time = None if since is None else journal.parse_time(since)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), ctx, param_hint="'--since'") from exc
+
+    for entry in journal.read(journal.get_journal_dir(get_context()), name, since_time):
+        if ctx.meta.get(META_OUTPUT) == "jsonl":
+            click.echo(json.dumps(entry.to_dict()))
+            continue
+
+        click.echo(
+            " ".join(
+                [
+                    datetime.fromtimestamp(entry.time).isoformat(sep=" ", timespec="seconds"),
+                    *([entry.host] if entry.host else []),
+                    entry.user,
+                    entry.operation,
+                    f"{entry.domain}/{entry.service}",
+                    "ok" if entry.ok else f"failed ({_or_dash(entry.returncode)})",
+                    _ms(entry.duration),
+                ]
+            )
+        )
+
+
+@cli.group(cls=ClickextGroup, name="index")
+def index_group() -> None:
+    """Manage the service index."""
+
+
+@index_group.command(cls=ClickextCommand)
+def rebuild() -> None:
+    """Rebuild the service index."""
+    from . import metadata
+    from .index import get_index_file, ServiceIndex
+    from .service import get_paths
+
+    service_index = ServiceIndex(get_index_file())
+    directories = get_paths()
+    count = service_index.rebuild(directories)
+    service_index.save()
+    metadata.save()
+    logger.info("Indexed %s services in %s directories", count, len(directories))
+
+
+@cli.command(cls=ClickextCommand, name="list")
+@click.option("--label", metavar="PATTERN", help="Only list services with a label matching a shell-style pattern.")
+@click.option(
+    "--program", metavar="PATTERN", help="Only list services running a program matching a shell-style pattern."
+)
+@json_option
+def list_services(label: t.Optional[str], program: t.Optional[str], as_json: bool) -> None:
+    """List all services and their state."""
+    from fnmatch import fnmatchcase
+
+    from . import metadata
+    from .service import discover
+    from .status import query
+
+    services = discover()
+
+    if label is not None:
+        services = [service for service in services if fnmatchcase(service.label, label)]
+
+    if program is not None:
+        services = [service for service in services if fnmatchcase(service.metadata.program or "", program)]
+
+    metadata.save()
+    echo_states([state.to_dict() for state in query(services)], as_json)
 
 
 @cli.command(cls=ClickextCommand)
+@names_argument
+@users_options
+@strategy_option
+@wait_option
+@click.pass_obj
+def restart(services: list[Service], strategy: str, wait: t.Optional[float]) -> None:
+    """Restart services."""
+    from .operations import Operation
+
+    run_batch(services, Operation("restart", strategy=strategy, wait=wait))
+
+
+@cli.command(cls=ClickextCommand, name="run")
+@click.argument("step_args", metavar="[COMMAND:NAME]...", nargs=-1, type=click.STRING)
+@click.option(
+    "--file",
+    "-f",
+    "step_file",
+    type=click.File("r"),
+    help="Read steps from a file, one COMMAND NAME per line ('-' for stdin).",
+)
+@click.option("--dry-run", is_flag=True, default=False, help="Print the launchctl calls without running them.")
+@strategy_option
 @click.pass_obj
-def enable(service: Service) -> None:
-    """Enable a service (system domain only)."""
-    launchctl.change_state(service, enable=True)
-    logger.info("%s enabled", service.name)
+def run_steps(
+    config: t.Optional[Config],
+    step_args: tuple[str, ...],
+    step_file: t.Optional[t.TextIO],
+    dry_run: bool,
+    strategy: str,
+) -> None:
+    """Run a sequence of operations on services.
+
+    The steps for each service are combined into the fewest launchctl calls with the same result, and steps that would
+    not change a service are left out.
+    """
+    from . import plan
+
+    ctx = click.get_current_context()
+    config = config or Config()
+    index = load_index(ctx)
+    lines = [*step_args, *(line for line in (step_file or []) if line.strip() and not line.lstrip().startswith("#"))]
+
+    if not lines:
+        raise click.UsageError("Missing argument 'COMMAND:NAME...' or option '--file'.", ctx)
+
+    try:
+        parsed = [plan.parse_step(line) for line in lines]
+    except ValueError as exc:
+        raise click.UsageError(str(exc), ctx) from exc
+
+    resolved = resolve_references(ctx, config, index, [reference for _, reference in parsed])
+    steps = [plan.Step(command, service) for command, reference in parsed for service in resolved[reference]]
+    run_plan(ctx, config, index, compile_plan(steps, strategy), dry_run)
 
 
 @cli.command(cls=ClickextCommand)
+@click.option(
+    "--socket",
+    "socket_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="The socket file to listen on.  [default: a file in the cache directory]",
+)
+@click.option(
+    "--snapshot-ttl",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="The number of seconds a snapshot of the loaded services is reused by status requests.",
+)
+@click.option(
+    "--watch/--no-watch",
+    default=True,
+    show_default=True,
+    help="Update the service index and metadata cache as service files change.",
+)
 @click.pass_obj
-def restart(service: Service) -> None:
-    """Restart a service."""
-    launchctl.boot(service, run=False)
-    launchctl.boot(service, run=True)
-    logger.info("%s restarted", service.name)
+def serve(config: t.Optional[Config], socket_file: t.Optional[Path], snapshot_ttl: float, watch: bool) -> None:
+    """Handle requests from other service commands."""
+    import signal
+    import threading
+
+    from .daemon import get_socket_file, Server
+
+    ctx = click.get_current_context()
+    jobs = use_local_launchctl(ctx, ctx.meta.get(META_JOBS, batch.DEFAULT_JOBS))
+    index = load_index(ctx)
+    server = Server(
+        socket_file or get_socket_file(),
+        config or Config(),
+        index,
+        jobs=jobs,
+        snapshot_ttl=snapshot_ttl,
+        watcher=_watch_service_paths(ctx) if watch else None,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info('Listening on "%s"', server.file)
+
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc)) from exc
 
 
 @cli.command(cls=ClickextCommand)
+@names_argument
+@users_options
 @click.option(
     "--enable",
     "-e",
     "enable_service",
     is_flag=True,
     default=False,
-    help="Enable sevice before starting (system domain only).",
+    help="Enable services before starting (system domain only).",
 )
+@wait_option
 @click.pass_obj
-def start(service: Service, enable_service: bool) -> None:
-    """Start a service."""
-    if enable_service:
-        launchctl.change_state(service, enable=True)
+def start(services: list[Service], enable_service: bool, wait: t.Optional[float]) -> None:
+    """Start services."""
+    from .operations import Operation
 
-    launchctl.boot(service, run=True)
-    logger.info("%s %sstarted", service.name, "enabled and " if enable_service else "")
+    run_batch(services, Operation("start", enable=enable_service, wait=wait))
 
 
 @cli.command(cls=ClickextCommand)
+@names_argument
+@json_option
+@click.pass_obj
+def status(services: list[Service], as_json: bool) -> None:
+    """Show the state of services."""
+    ctx = click.get_current_context()
+    response = request_daemon(ctx, {"command": "status"})
+
+    if response is not None:
+        echo_states(response["states"], as_json)
+    else:
+        from .status import query
+
+        echo_states([state.to_dict() for state in query(services)], as_json)
+
+    if ctx.meta.get(META_FAILURES):
+        ctx.exit(1)
+
+
+@cli.command(cls=ClickextCommand)
+@names_argument
+@users_options
 @click.option(
     "--disable",
     "-d",
     "disable_service",
     is_flag=True,
     default=False,
-    help="Disable service after stopping (system domain only).",
+    help="Disable services after stopping (system domain only).",
 )
+@wait_option
 @click.pass_obj
-def stop(service: Service, disable_service: bool) -> None:
-    """Stop a service."""
-    launchctl.boot(service, run=False)
+def stop(services: list[Service], disable_service: bool, wait: t.Optional[float]) -> None:
+    """Stop services."""
+    from .operations import Operation
+
+    run_batch(services, Operation("stop", disable=disable_service, wait=wait))
 
-    if disable_service:
-        launchctl.change_state(service, enable=False)
 
-    logger.info("%s stopped%s", service.name, " and disabled" if disable_service else "")
+def get_boot_time() -> float:
+    """Get the time the system was booted as a timestamp."""
+    return time.time() - time.clock_gettime(getattr(time, "CLOCK_BOOTTIME", time.CLOCK_MONOTONIC))
 
 
+def get_macos_version() -> str:
+    """Get the macOS version.
+
+    The version cannot change without restarting the system so it is cached until the next boot.
+    """
+    cache_file = get_cache_dir().joinpath("platform.json")
+    boot_time = get_boot_time()
+    cached = read_cache(cache_file)
+
+    if isinstance(cached, dict) and abs(cached.get("boot_time", 0) - boot_time) < BOOT_TIME_TOLERANCE:
+        logger.debug("Using cached macOS version")
+        return cached["macos_version"]
+
+    import platform
+
+    macos_version = platform.mac_ver()[0]
+    write_cache(cache_file, {"boot_time": boot_time, "macos_version": macos_version})
+
+    return macos_version
+
+
+@timing.timed("verify_platform")
 def verify_platform() -> None:
     """Verify the platform is supported.
 
@@ -136,10 +787,10 @@ def verify_platform() -> None:
     """
     logger.debug("Checking platform")
 
-    if platform.system() != "Darwin":
+    if os.uname().sysname != "Darwin":
         raise click.ClickException(f"{__package__} requires macOS")
 
-    macos_version = platform.mac_ver()[0]
+    macos_version = get_macos_version()
     macos_version = float(".".join(macos_version.split(".")[:2]))
 
     if macos_version < MACOS_MIN_VERSION:
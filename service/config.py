@@ -0,0 +1,224 @@
+"""
+service.config
+
+Configuration file handling.
+"""
+
+import logging
+import typing as t
+
+from .journal import JournalSettings
+from .limits import Limits
+from .retry import RetryPolicy
+from .timing import timed
+
+
+__all__ = [
+    "Config",
+    "get_dependencies",
+    "get_journal_settings",
+    "get_limits",
+    "get_retry_policy",
+    "get_reverse_domains",
+    "load_config",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class Config:  # pylint: disable=too-few-public-methods
+    """The program configuration.
+
+    :param reverse_domains: Reverse domains to prepend to service names.
+    :param dependencies: The services each service depends on, keyed by service reference.
+    :param retry: The policy for retrying launchctl commands that fail transiently.
+    :param limits: The limits for the launchctl commands that change services.
+    :param journal: The settings for the journal of changes to services.
+    """
+
+    def __init__(
+        self,
+        reverse_domains: t.Optional[list[str]] = None,
+        dependencies: t.Optional[dict[str, list[str]]] = None,
+        retry: t.Optional[RetryPolicy] = None,
+        limits: t.Optional[Limits] = None,
+        journal: t.Optional[JournalSettings] = None,
+    ):
+        self.reverse_domains = reverse_domains or []
+        self.dependencies = dependencies or {}
+        self.retry = retry or RetryPolicy()
+        self.limits = limits or Limits()
+        self.journal = journal or JournalSettings()
+
+
+@timed("load_config")
+def load_config(data: t.Optional[dict[str, t.Any]]) -> Config:
+    """Build the configuration from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    return Config(
+        get_reverse_domains(data),
+        get_dependencies(data),
+        get_retry_policy(data),
+        get_limits(data),
+        get_journal_settings(data),
+    )
+
+
+def get_dependencies(data: t.Optional[dict[str, t.Any]]) -> dict[str, list[str]]:
+    """Build service dependencies from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    if data is None or "dependencies" not in data:
+        return {}
+
+    dependencies = data["dependencies"]
+
+    if not isinstance(dependencies, dict) or not all(
+        isinstance(value, list) and all(isinstance(item, str) for item in value) for value in dependencies.values()
+    ):
+        logger.warning('Invalid configuration file. "dependencies" must be a table of lists of service names.')
+        return {}
+
+    logger.debug("Configured with dependencies for %s services", len(dependencies))
+
+    return dependencies
+
+
+def get_journal_settings(data: t.Optional[dict[str, t.Any]]) -> JournalSettings:
+    """Build the journal settings from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    if data is None or "journal" not in data:
+        return JournalSettings()
+
+    journal = data["journal"]
+    default = JournalSettings()
+
+    if not isinstance(journal, dict):
+        logger.warning('Invalid configuration file. "journal" must be a table.')
+        return default
+
+    enabled = journal.get("enabled", default.enabled)
+    segment_size = journal.get("segment-size", default.segment_size)
+    segments = journal.get("segments", default.segments)
+
+    if not isinstance(enabled, bool):
+        logger.warning('Invalid configuration file. "journal.enabled" must be true or false.')
+        return default
+
+    if not all(
+        isinstance(value, int) and not isinstance(value, bool) and value > 0 for value in [segment_size, segments]
+    ):
+        logger.warning('Invalid configuration file. "journal.segment-size" and "journal.segments" must be positive.')
+        return default
+
+    logger.debug("Configured with journal: %s, %s segments of %s bytes", enabled, segments, segment_size)
+
+    return JournalSettings(enabled, segment_size, segments)
+
+
+def get_limits(data: t.Optional[dict[str, t.Any]]) -> Limits:
+    """Build the limits for changing services from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    if data is None or "limits" not in data:
+        return Limits()
+
+    limits = data["limits"]
+    default = Limits()
+
+    if not isinstance(limits, dict):
+        logger.warning('Invalid configuration file. "limits" must be a table.')
+        return default
+
+    rate = limits.get("rate", default.rate)
+    burst = limits.get("burst", default.burst)
+    in_flight = limits.get("in-flight", default.in_flight)
+    domains = limits.get("domains", {})
+
+    if not isinstance(rate, (int, float)) or isinstance(rate, bool) or rate < 0:
+        logger.warning('Invalid configuration file. "limits.rate" must be a number of changes per second.')
+        return default
+
+    if not all(isinstance(value, int) and not isinstance(value, bool) and value >= 0 for value in [burst, in_flight]):
+        logger.warning('Invalid configuration file. "limits.burst" and "limits.in-flight" must be whole numbers.')
+        return default
+
+    if not isinstance(domains, dict) or not all(
+        isinstance(value, int) and not isinstance(value, bool) and value >= 0 for value in domains.values()
+    ):
+        logger.warning('Invalid configuration file. "limits.domains" must be a table of whole numbers.')
+        return default
+
+    logger.debug("Configured with limits: %s changes/s, %s in flight, %s domains", rate, in_flight, len(domains))
+
+    return Limits(float(rate), burst, in_flight, domains)
+
+
+def get_retry_policy(data: t.Optional[dict[str, t.Any]]) -> RetryPolicy:
+    """Build the retry policy from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    if data is None or "retry" not in data:
+        return RetryPolicy()
+
+    retry = data["retry"]
+    default = RetryPolicy()
+
+    if not isinstance(retry, dict):
+        logger.warning('Invalid configuration file. "retry" must be a table.')
+        return default
+
+    attempts = retry.get("attempts", default.attempts)
+    delay = retry.get("delay", default.delay)
+    max_delay = retry.get("max-delay", default.max_delay)
+    codes = retry.get("codes", {})
+
+    if not isinstance(attempts, int) or isinstance(attempts, bool) or attempts < 1:
+        logger.warning('Invalid configuration file. "retry.attempts" must be a positive integer.')
+        return default
+
+    if not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0 for value in [delay, max_delay]
+    ):
+        logger.warning('Invalid configuration file. "retry.delay" and "retry.max-delay" must be numbers of seconds.')
+        return default
+
+    if not isinstance(codes, dict) or not all(
+        isinstance(value, list) and all(isinstance(item, int) for item in value) for value in codes.values()
+    ):
+        logger.warning('Invalid configuration file. "retry.codes" must be a table of lists of return codes.')
+        return default
+
+    logger.debug("Configured to retry %s subcommands up to %s times", len(codes), attempts)
+
+    return RetryPolicy(
+        attempts, delay, max_delay, {subcommand: frozenset(value) for subcommand, value in codes.items()}
+    )
+
+
+@timed("get_reverse_domains")
+def get_reverse_domains(data: t.Optional[dict[str, t.Any]]) -> list[str]:
+    """Build reverse domains from configuration file data.
+
+    :param data: The parsed configuration file data.
+    """
+    if data is None or "reverse-domains" not in data:
+        reverse_domains = []
+    else:
+        reverse_domains = data["reverse-domains"]
+
+        if not isinstance(reverse_domains, list):
+            logger.warning('Invalid configuration file. "reverse-domains" must be a list.')
+            reverse_domains = []
+
+    logger.debug("Configured with %s reverse domains", len(reverse_domains))
+
+    return reverse_domains
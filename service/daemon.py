@@ -0,0 +1,442 @@
+"""
+service.daemon
+
+A resident server that handles service requests over a Unix domain socket, and a client for it.
+
+The server keeps the configuration, service index, and launchctl executor loaded between requests. Requests and
+responses are JSON objects, one per line, and a connection can be used for any number of requests:
+
+    {"command": "status", "names": ["xserv"], "match": []}
+    {"ok": true, "errors": [], "states": [{"name": "com.foo.xserv", "state": "running", ...}]}
+
+Commands are "ping", "status", and the service operations in `service.operations.COMMANDS`; "start" accepts an "enable"
+flag, "stop" a "disable" flag, and "restart" a "strategy" (see `service.launchctl.restart`). "restart", "start", and
+"stop" accept a "wait" timeout in seconds. Every command except "ping" accepts a "no_cache" flag to resolve services
+without the service index, and the service operations accept "jobs", the maximum number of services to change at the
+same time. Service references with a path must use an absolute path.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import socketserver
+import threading
+import time
+import typing as t
+
+from . import batch, metadata
+from .cache import get_cache_dir
+from .domain import get_context
+from .launchctl import RESTART_STRATEGIES
+from .operations import COMMANDS, Operation, run
+from .selector import resolve, resolve_dependencies
+from .status import query, snapshot
+from .watcher import apply
+
+if t.TYPE_CHECKING:
+    from .config import Config
+    from .index import ServiceIndex
+    from .status import Status
+    from .watcher import Watcher
+
+
+__all__ = ["Client", "get_socket_file", "Server"]
+
+
+CONNECT_TIMEOUT = 0.5
+PROTOCOL_VERSION = 1
+SNAPSHOT_TTL = 1.0
+WATCH_TIMEOUT = 0.5
+
+
+logger = logging.getLogger(__name__)
+
+
+class Server:  # pylint: disable=too-many-instance-attributes
+    """A server that handles service requests.
+
+    Status requests share a snapshot of the loaded services for up to `snapshot_ttl` seconds; the snapshot is discarded
+    whenever the server changes a service. With a watcher, changes to the service directories are applied to the index
+    and the metadata cache as they happen, and the watched directories are not checked when a request resolves services
+    (see `service.index.ServiceIndex.set_watched`) while the watcher reports their changes.
+
+    :param file: The socket file to listen on.
+    :param config: The program configuration.
+    :param index: An optional index of the service directories.
+    :param jobs: The maximum number of services to change at the same time.
+    :param snapshot_ttl: The number of seconds a snapshot of the loaded services is reused.
+    :param watcher: An optional watcher of the service directories.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        file: Path,
+        config: Config,
+        index: t.Optional[ServiceIndex] = None,
+        *,
+        jobs: int = batch.DEFAULT_JOBS,
+        snapshot_ttl: float = SNAPSHOT_TTL,
+        watcher: t.Optional[Watcher] = None,
+    ):
+        self._file = file
+        self._config = config
+        self._index = index
+        self._jobs = jobs
+        self._snapshot_ttl = snapshot_ttl
+        self._watcher = watcher
+        self._context = get_context()
+        self._lock = threading.Lock()
+        self._snapshot: t.Optional[tuple[float, dict[str, Status]]] = None
+        self._server: t.Optional[_UnixServer] = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def file(self) -> Path:
+        """The socket file the server listens on."""
+        return self._file
+
+    def handle(self, request: t.Any) -> dict[str, t.Any]:
+        """Handle a request.
+
+        :param request: The decoded request.
+
+        :returns: The response.
+        """
+        try:
+            return self._handle(request)
+        except (RuntimeError, ValueError) as exc:
+            return {"ok": False, "error": str(exc)}
+
+    def serve(self) -> None:
+        """Listen for requests until the server is shut down.
+
+        A socket file left behind by a server that is no longer running is replaced. The socket file is created with
+        access for the current user only.
+
+        :raises RuntimeError: When another server is listening on the socket file.
+        """
+        client = Client.connect(self._file)
+
+        if client is not None:
+            client.close()
+            raise RuntimeError(f'A daemon is already listening on "{self._file}"')
+
+        self._file.parent.mkdir(parents=True, exist_ok=True)
+        self._file.unlink(missing_ok=True)
+        umask = os.umask(0o177)
+
+        try:
+            self._server = _UnixServer(str(self._file), _Handler)
+        finally:
+            os.umask(umask)
+
+        self._server.handler = self.handle
+        logger.debug('Listening on "%s"', self._file)
+        self._stopped.clear()
+        watch = None
+
+        if self._watcher is not None:
+            watch = threading.Thread(target=self._watch, name="watcher", daemon=True)
+            watch.start()
+
+        self._ready.set()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+
+            if watch is not None:
+                watch.join()
+
+            self._server.server_close()
+            self._file.unlink(missing_ok=True)
+            self._ready.clear()
+
+    def shutdown(self) -> None:
+        """Stop the server; must be called from a thread other than the one running `serve`."""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def wait(self, timeout: t.Optional[float] = None) -> bool:
+        """Wait until the server is listening.
+
+        :param timeout: The maximum number of seconds to wait.
+
+        :returns: Whether the server is listening.
+        """
+        return self._ready.wait(timeout)
+
+    def _get_snapshot(self) -> dict[str, Status]:
+        """Get a snapshot of the loaded services, taking a new one if the last one has expired."""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._snapshot[0] < self._snapshot_ttl:
+                return self._snapshot[1]
+
+        loaded = snapshot()
+
+        with self._lock:
+            self._snapshot = (time.monotonic(), loaded)
+
+        return loaded
+
+    def _set_watched(self, directories: list[Path]) -> None:
+        """Set the directories the index does not check because the watcher keeps them current.
+
+        :param directories: The watched service directories.
+        """
+        if self._index is not None:
+            with self._lock:
+                self._index.set_watched(directories)
+
+    def _watch(self) -> None:
+        """Apply changes to the service directories until the server is shut down or the watcher fails."""
+        watcher = t.cast("Watcher", self._watcher)
+        watched = watcher.watched
+        self._set_watched(watched)
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    changes = watcher.read(WATCH_TIMEOUT)
+                except OSError as exc:
+                    logger.warning("Stopped watching service directories: %s", exc)
+                    return
+
+                # a removed directory is checked by the index again until the watcher watches it again
+                if watcher.watched != watched:
+                    watched = watcher.watched
+                    self._set_watched(watched)
+
+                if changes:
+                    with self._lock:
+                        apply(changes, self._index)
+        finally:
+            self._set_watched([])
+
+    def _handle(self, request: t.Any) -> dict[str, t.Any]:
+        """Handle a request.
+
+        :param request: The decoded request.
+
+        :raises ValueError: When the request is invalid.
+        :raises RuntimeError: When the loaded services cannot be listed.
+        """
+        if not isinstance(request, dict):
+            raise ValueError("Invalid request")
+
+        command = request.get("command")
+
+        if command == "ping":
+            return {"ok": True, "version": PROTOCOL_VERSION, "pid": os.getpid()}
+
+        if command != "status" and command not in COMMANDS:
+            raise ValueError(f'Unknown command "{command}"')
+
+        operation = _get_operation(request) if command != "status" else None
+        jobs = _get_jobs(request, self._jobs)
+        names = _get_strings(request, "names")
+        expressions = _get_strings(request, "match")
+        index = None if request.get("no_cache") else self._index
+
+        if not names and not expressions:
+            raise ValueError("No services referenced")
+
+        with self._lock:
+            services, errors = resolve(names, expressions, self._config.reverse_domains, index, self._context)
+            dependencies = None
+
+            if operation is not None and self._config.dependencies and len(services) > 1:
+                dependencies = resolve_dependencies(services, self._config, index)
+
+            if index is not None:
+                index.save()
+
+            metadata.save()
+
+        if operation is None:
+            states = query(services, self._get_snapshot())
+            return {"ok": not errors, "errors": errors, "states": [state.to_dict() for state in states]}
+
+        results = []
+
+        try:
+            for result in run(services, operation, jobs, dependencies):
+                results.append(
+                    {
+                        "name": result.service.name,
+                        "ok": result.ok,
+                        "message": operation.describe(result),
+                        "record": result.to_dict(operation.command),
+                    }
+                )
+        finally:
+            with self._lock:
+                self._snapshot = None
+
+        return {"ok": not errors and all(result["ok"] for result in results), "errors": errors, "results": results}
+
+
+class Client:
+    """A connection to a server.
+
+    :param sock: A socket connected to the server.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._socket = sock
+        self._reader = sock.makefile("rb")
+
+    def __enter__(self) -> Client:
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.close()
+
+    @classmethod
+    def connect(cls, file: Path, timeout: float = CONNECT_TIMEOUT) -> t.Optional[Client]:
+        """Connect to a server.
+
+        :param file: The socket file the server listens on.
+        :param timeout: The maximum number of seconds to wait for the connection.
+
+        :returns: The client, or `None` when no server is listening.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+
+        try:
+            sock.connect(str(file))
+        except OSError as exc:
+            logger.debug('No daemon listening on "%s": %s', file, exc)
+            sock.close()
+            return None
+
+        sock.settimeout(None)
+
+        return cls(sock)
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._reader.close()
+        self._socket.close()
+
+    def request(self, request: dict[str, t.Any]) -> dict[str, t.Any]:
+        """Send a request and wait for the response.
+
+        :param request: The request.
+
+        :raises RuntimeError: When the connection to the server is lost or the response is invalid.
+        """
+        try:
+            self._socket.sendall(json.dumps(request).encode() + b"\n")
+            line = self._reader.readline()
+        except OSError as exc:
+            raise RuntimeError("Lost connection to the daemon") from exc
+
+        try:
+            response = json.loads(line)
+        except ValueError as exc:
+            raise RuntimeError("Invalid response from the daemon") from exc
+
+        if not isinstance(response, dict):
+            raise RuntimeError("Invalid response from the daemon")
+
+        return response
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A Unix domain socket server that handles each connection in a thread."""
+
+    daemon_threads = True
+    handler: t.Callable[[t.Any], dict[str, t.Any]]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle the requests received on a connection."""
+
+    def handle(self) -> None:
+        server = t.cast(_UnixServer, self.server)
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Invalid request"}
+            else:
+                response = server.handler(request)
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def get_socket_file() -> Path:
+    """Get the socket file for the active domain.
+
+    The `SERVICE_SOCKET` environment variable overrides the default location.
+    """
+    if os.environ.get("SERVICE_SOCKET"):
+        return Path(os.environ["SERVICE_SOCKET"])
+
+    return get_cache_dir().joinpath(f"daemon-{get_context().key}.sock")
+
+
+def _get_jobs(request: dict[str, t.Any], default: int) -> int:
+    """Get the maximum number of services to change at the same time for a request.
+
+    :param request: The request.
+    :param default: The number used when the request does not set one.
+
+    :raises ValueError: When the number is invalid.
+    """
+    jobs = request.get("jobs", default)
+
+    if isinstance(jobs, bool) or not isinstance(jobs, int) or jobs < 1:
+        raise ValueError('"jobs" must be a positive integer')
+
+    return jobs
+
+
+def _get_operation(request: dict[str, t.Any]) -> Operation:
+    """Get the operation for a request.
+
+    :param request: The request.
+
+    :raises ValueError: When the restart strategy or wait timeout is invalid.
+    """
+    strategy = request.get("strategy", "kickstart")
+
+    if strategy not in RESTART_STRATEGIES:
+        raise ValueError(f'Unknown restart strategy "{strategy}"')
+
+    wait = request.get("wait")
+
+    if wait is not None and (isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0):
+        raise ValueError('"wait" must be a number of seconds')
+
+    return Operation(
+        request["command"],
+        enable=bool(request.get("enable")),
+        disable=bool(request.get("disable")),
+        strategy=strategy,
+        wait=wait,
+    )
+
+
+def _get_strings(request: dict[str, t.Any], key: str) -> list[str]:
+    """Get a list of strings from a request.
+
+    :param request: The request.
+    :param key: The request key.
+
+    :raises ValueError: When the value is not a list of strings.
+    """
+    value = request.get(key, [])
+
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f'"{key}" must be a list of strings')
+
+    return value
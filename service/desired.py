@@ -0,0 +1,111 @@
+"""
+service.desired
+
+The desired state of services, read from a file, and the steps that converge services to it.
+"""
+
+from __future__ import annotations
+import logging
+from pathlib import Path
+import typing as t
+
+from .plan import Step
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # pragma: no cover (Python 3.10)
+    import tomli as tomllib  # type: ignore
+
+if t.TYPE_CHECKING:
+    from .service import Service
+
+
+__all__ = ["DesiredState", "get_steps", "load"]
+
+
+KEYS = ("enabled", "loaded")
+
+
+logger = logging.getLogger(__name__)
+
+
+class DesiredState(t.NamedTuple):
+    """The desired state of a service.
+
+    :param loaded: Whether the service should be loaded (started), or `None` to leave it as it is.
+    :param enabled: Whether the service should be enabled, or `None` to leave it as it is.
+    """
+
+    loaded: t.Optional[bool] = None
+    enabled: t.Optional[bool] = None
+
+    def update(self, other: DesiredState) -> DesiredState:
+        """Combine with another desired state, which takes precedence where it is set.
+
+        :param other: The other desired state.
+        """
+        return DesiredState(
+            self.loaded if other.loaded is None else other.loaded,
+            self.enabled if other.enabled is None else other.enabled,
+        )
+
+
+def get_steps(targets: t.Iterable[tuple[Service, DesiredState]]) -> list[Step]:
+    """Get the steps that bring services to their desired state.
+
+    A service is enabled before it is started and disabled after it is stopped. The steps include services that are
+    already in their desired state; compile them with the current state (see `service.plan.compile_plan`) to leave
+    those out.
+
+    :param targets: The services and their desired state.
+    """
+    steps = []
+
+    for service, desired in targets:
+        runtime = None if desired.loaded is None else ("start" if desired.loaded else "stop")
+        state = None if desired.enabled is None else ("enable" if desired.enabled else "disable")
+        commands = [state, runtime] if desired.enabled else [runtime, state]
+        steps.extend(Step(command, service) for command in commands if command is not None)
+
+    return steps
+
+
+def load(file: Path) -> dict[str, DesiredState]:
+    """Read the desired state of services from a TOML file.
+
+    Each table is named with a service reference (see `service.selector.resolve`) and sets `loaded` and/or `enabled`:
+
+        [xserv]
+        loaded = true
+        enabled = true
+
+        ["com.acme.worker.*"]
+        loaded = false
+
+    :param file: The file.
+
+    :returns: The desired state keyed by service reference, in the order of the file.
+
+    :raises ValueError: When the file cannot be read or is invalid.
+    """
+    try:
+        data = tomllib.loads(file.read_text(encoding="utf8"))
+    except (OSError, UnicodeDecodeError) as exc:
+        raise ValueError(f'Cannot read "{file}": {exc}') from exc
+    except tomllib.TOMLDecodeError as exc:
+        raise ValueError(f'Invalid desired state file "{file}": {exc}') from exc
+
+    states = {}
+
+    for reference, values in data.items():
+        if not isinstance(values, dict) or set(values) - set(KEYS) or not values:
+            raise ValueError(f'Invalid desired state for "{reference}". Set "loaded" and/or "enabled".')
+
+        if not all(isinstance(value, bool) for value in values.values()):
+            raise ValueError(f'Invalid desired state for "{reference}". "loaded" and "enabled" must be true or false.')
+
+        states[reference] = DesiredState(values.get("loaded"), values.get("enabled"))
+
+    logger.debug('Read the desired state of %s service references from "%s"', len(states), file)
+
+    return states
@@ -0,0 +1,52 @@
+"""
+service.domain
+
+The launchd domain services are managed in.
+"""
+
+from __future__ import annotations
+import os
+from pathlib import Path
+import typing as t
+
+from . import launchctl
+
+
+__all__ = ["DomainContext", "get_context"]
+
+
+class DomainContext(t.NamedTuple):
+    """A launchd domain: the system domain, or the gui domain of a user.
+
+    A context is resolved once and passed to the functions that depend on the domain, so they do not read the
+    environment again and one process can work in several domains.
+
+    :param uid: The user ID of the gui domain, or `None` for the system domain.
+    :param home: The home directory of the user, whose LaunchAgents are managed (gui domain only).
+    """
+
+    uid: t.Optional[int] = None
+    home: t.Optional[Path] = None
+
+    @property
+    def is_system(self) -> bool:
+        """Whether this is the system domain."""
+        return self.uid is None
+
+    @property
+    def key(self) -> str:
+        """A name for the domain that can be used in file names, e.g., "system" or "gui-501"."""
+        return launchctl.DOMAIN_SYS if self.uid is None else f"{launchctl.DOMAIN_GUI}-{self.uid}"
+
+    @property
+    def target(self) -> str:
+        """The launchctl domain target, e.g., "system" or "gui/501"."""
+        return launchctl.DOMAIN_SYS if self.uid is None else f"{launchctl.DOMAIN_GUI}/{self.uid}"
+
+
+def get_context() -> DomainContext:
+    """Get the active domain: the system domain when run with sudo, otherwise the gui domain of the effective user."""
+    if os.getenv("SUDO_USER"):
+        return DomainContext()
+
+    return DomainContext(os.geteuid(), Path.home())
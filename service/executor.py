@@ -0,0 +1,328 @@
+"""
+service.executor
+
+Backends that run launchctl commands.
+"""
+
+import abc
+import contextlib
+import logging
+import queue
+import select
+import shlex
+import subprocess
+import threading
+import typing as t
+
+from .transport import LocalTransport, Transport
+
+
+__all__ = ["Executor", "FakeExecutor", "SessionExecutor", "SubprocessExecutor"]
+
+
+LAUNCHCTL = "launchctl"
+
+E = t.TypeVar("E", bound="Executor")
+
+# Reads one shell-quoted command per line, runs it, and replies with a line with the return code and the sizes of its
+# output, followed by the output. The reply is framed so it can be read from any byte stream (e.g., over SSH). Output is
+# captured and measured with shell builtins (lengths are in bytes with LC_ALL=C), so each command only starts the
+# command itself. Command substitution strips trailing newlines, so one is added back to non-empty output.
+SESSION_SCRIPT = """
+LC_ALL=C
+export LC_ALL
+err=$(mktemp) || exit 1
+trap 'rm -f "$err"' EXIT
+while IFS= read -r line; do
+  eval "set -- $line"
+  out=$("$@" </dev/null 2>"$err")
+  code=$?
+  [ -z "$out" ] || out="$out
+"
+  stderr=
+  if [ -s "$err" ]; then
+    while IFS= read -r text || [ -n "$text" ]; do
+      stderr="$stderr$text
+"
+    done <"$err"
+  fi
+  printf '%s %s %s\\n%s%s' "$code" "${#out}" "${#stderr}" "$out" "$stderr"
+done
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class Executor(abc.ABC):
+    """Base class for launchctl command executors.
+
+    Executors run a launchctl subcommand and raise `subprocess.CalledProcessError` when it exits with a non-zero return
+    code, so callers can handle failures the same way regardless of the backend.
+
+    :param program: The launchctl program to run.
+    """
+
+    def __init__(self, program: str = LAUNCHCTL):
+        self._program = program
+
+    def __enter__(self: E) -> E:
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.close()
+
+    @property
+    def host(self) -> t.Optional[str]:
+        """The host launchctl commands run on, or `None` for this machine."""
+        return None
+
+    @property
+    def program(self) -> str:
+        """The launchctl program to run."""
+        return self._program
+
+    def close(self) -> None:
+        """Release any resources held by the executor."""
+
+    @abc.abstractmethod
+    def run(self, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+        """Run a launchctl subcommand.
+
+        :param subcommand: The launchctl subcommand to run.
+        :param args: The arguments for the subcommand.
+
+        :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+        """
+
+
+class SubprocessExecutor(Executor):
+    """Run each launchctl command in a new process."""
+
+    def run(self, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run([self._program, subcommand, *args], check=True, capture_output=True)
+
+
+class SessionExecutor(Executor):
+    """Run launchctl commands through a pool of long-lived helper processes.
+
+    Each helper is a small shell process that reads commands from a pipe and runs them, so the calling process does not
+    spawn a new process per command; each command is still a new launchctl process, started by the helper. Helpers are
+    started on demand, up to `size`, and each runs one command at a time. Helpers are started through a transport, which
+    runs them on this machine by default; with a remote transport (see `service.transport`), launchctl commands run on
+    another host over one connection.
+
+    With a `timeout`, a command that does not complete in time fails, and so does every later command, since a helper
+    that stops responding usually means the host or the connection to it is gone.
+
+    :param program: The launchctl program to run.
+    :param size: The maximum number of helper processes; limited to the number of commands the transport can run at the
+    same time.
+    :param transport: The transport to start helpers with; an open transport is not closed with the executor.
+    :param timeout: The maximum number of seconds a command can take, or `None` to wait indefinitely.
+
+    :raises ValueError: When `size` is less than 1.
+    """
+
+    def __init__(
+        self,
+        program: str = LAUNCHCTL,
+        size: int = 1,
+        transport: t.Optional[Transport] = None,
+        timeout: t.Optional[float] = None,
+    ):
+        super().__init__(program)
+
+        if size < 1:
+            raise ValueError("The session pool size must be at least 1")
+
+        self._transport = transport
+        self._size = min(size, (transport and transport.max_sessions) or size)
+        self._timeout = timeout
+        self._failure: t.Optional[RuntimeError] = None
+        self._idle: queue.SimpleQueue[t.Optional[_Session]] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._sessions: list[_Session] = []
+
+    @property
+    def host(self) -> t.Optional[str]:
+        return None if self._transport is None else self._transport.host
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+
+            self._sessions.clear()
+            idle, self._idle = self._idle, queue.SimpleQueue()
+
+        # wake the threads waiting for a helper; each passes the wake-up on before failing
+        idle.put(None)
+
+    def run(self, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+        """Run a launchctl subcommand.
+
+        :param subcommand: The launchctl subcommand to run.
+        :param args: The arguments for the subcommand.
+
+        :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+        :raises ValueError: When an argument contains a newline.
+        :raises RuntimeError: When the helper process stops unexpectedly, the executor is closed while waiting for a
+        helper, or this or an earlier command did not complete within the timeout.
+        """
+        cmd = [self._program, subcommand, *args]
+
+        if any("\n" in arg for arg in cmd):
+            raise ValueError("Command arguments cannot contain newlines")
+
+        if self._failure is not None:
+            raise self._failure
+
+        session = self._acquire()
+
+        try:
+            result = session.run(cmd, self._timeout)
+        except subprocess.TimeoutExpired as exc:
+            host = self.host or "localhost"
+            self._failure = RuntimeError(f'launchctl on "{host}" did not respond within {exc.timeout}s')
+            self._discard(session)
+            self.close()
+            raise self._failure from exc
+        except BaseException as exc:
+            self._discard(session)
+
+            if self._failure is not None:
+                raise self._failure from exc
+
+            raise
+
+        with self._lock:
+            if session in self._sessions:
+                self._idle.put(session)
+
+        result.check_returncode()
+
+        return result
+
+    def _acquire(self) -> "_Session":
+        """Get an idle helper, starting a new one if the pool is not full.
+
+        :raises RuntimeError: When the executor is closed while waiting for a helper.
+        """
+        with self._lock:
+            idle = self._idle
+
+            with contextlib.suppress(queue.Empty):
+                session = idle.get_nowait()
+
+                if session is not None:
+                    return session
+
+            if len(self._sessions) < self._size:
+                session = _Session(self._transport or LocalTransport())
+                self._sessions.append(session)
+                return session
+
+        session = idle.get()
+
+        if session is None:
+            idle.put(None)
+            raise self._failure or RuntimeError("The launchctl session pool was closed")
+
+        return session
+
+    def _discard(self, session: "_Session") -> None:
+        """Stop a helper that can no longer be used and free its slot in the pool."""
+        session.close()
+
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+
+class FakeExecutor(Executor):
+    """Record launchctl commands without running them.
+
+    :param returncodes: The return code for each subcommand. Subcommands that are not listed succeed.
+    :param outputs: The output for each subcommand.
+    """
+
+    def __init__(self, returncodes: t.Optional[dict[str, int]] = None, outputs: t.Optional[dict[str, bytes]] = None):
+        super().__init__()
+        self._returncodes = returncodes or {}
+        self._outputs = outputs or {}
+        self._lock = threading.Lock()
+        self.commands: list[list[str]] = []
+
+    def run(self, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+        cmd = [self._program, subcommand, *args]
+
+        with self._lock:
+            self.commands.append(cmd)
+
+        result = subprocess.CompletedProcess(
+            cmd, self._returncodes.get(subcommand, 0), stdout=self._outputs.get(subcommand, b""), stderr=b""
+        )
+        result.check_returncode()
+
+        return result
+
+
+class _Session:
+    """A helper process that runs commands sent to it over a pipe.
+
+    :param transport: The transport to start the helper with.
+    """
+
+    def __init__(self, transport: Transport):
+        self._process = subprocess.Popen(  # pylint: disable=consider-using-with
+            transport.command(["/bin/sh", "-c", SESSION_SCRIPT]), stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        logger.debug('Started launchctl session %s on "%s"', self._process.pid, transport.host)
+
+    def close(self) -> None:
+        """Stop the helper process."""
+        if self._process.stdin:
+            with contextlib.suppress(BrokenPipeError):
+                self._process.stdin.close()
+
+        try:
+            self._process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+        if self._process.stdout:
+            self._process.stdout.close()
+
+        logger.debug("Stopped launchctl session %s", self._process.pid)
+
+    def run(self, cmd: list[str], timeout: t.Optional[float] = None) -> subprocess.CompletedProcess:
+        """Run a command in the helper process.
+
+        :param cmd: The command and its arguments.
+        :param timeout: The maximum number of seconds to wait for the reply, or `None` to wait indefinitely.
+
+        :raises RuntimeError: When the helper process has stopped.
+        :raises subprocess.TimeoutExpired: When the reply does not start within the timeout.
+        """
+        assert self._process.stdin and self._process.stdout
+
+        try:
+            self._process.stdin.write(f"{shlex.join(cmd)}\n".encode())
+            self._process.stdin.flush()
+
+            # every earlier reply was read completely, so the reply has started once the pipe is readable
+            if timeout is not None and not select.select([self._process.stdout], [], [], timeout)[0]:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+            reply = self._process.stdout.readline().split()
+            returncode, stdout_size, stderr_size = (int(value) for value in reply)
+            stdout = self._process.stdout.read(stdout_size)
+            stderr = self._process.stdout.read(stderr_size)
+        except (OSError, ValueError) as exc:
+            raise RuntimeError("The launchctl session stopped unexpectedly") from exc
+
+        if len(stdout) != stdout_size or len(stderr) != stderr_size:
+            raise RuntimeError("The launchctl session stopped unexpectedly")
+
+        return subprocess.CompletedProcess(cmd, returncode, stdout=stdout, stderr=stderr)
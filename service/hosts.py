@@ -0,0 +1,131 @@
+"""
+service.hosts
+
+Run operations on services on several hosts at the same time.
+"""
+
+from __future__ import annotations
+import functools
+import logging
+import queue
+import threading
+import typing as t
+
+from . import batch, launchctl, operations
+from .executor import SessionExecutor
+
+if t.TYPE_CHECKING:
+    from .operations import Operation
+    from .service import Service
+    from .transport import Transport
+
+
+__all__ = ["COMMAND_TIMEOUT", "run"]
+
+
+COMMAND_TIMEOUT = 120.0
+
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    transports: t.Sequence[Transport],
+    services: t.Sequence[Service],
+    operation: Operation,
+    jobs: int = batch.DEFAULT_JOBS,
+    dependencies: t.Optional[t.Mapping[Service, t.Iterable[Service]]] = None,
+) -> t.Iterator[tuple[str, batch.Result]]:
+    """Run an operation on services on every host (see `service.operations.run`).
+
+    All hosts are handled at the same time, each in its own thread. On each host, the launchctl commands run through a
+    pool of up to `jobs` helper processes started with the transport of the host (fewer if the transport limits the
+    number of sessions), so every host gets one connection and at most `jobs` services on a host are changed at the
+    same time. Each transport is opened before and closed after the operation; when a host cannot be reached, or a
+    launchctl command on it does not complete within `COMMAND_TIMEOUT` seconds, the operation fails for every remaining
+    service on that host.
+
+    :param transports: The transports of the hosts.
+    :param services: The services to operate on, which are located at the same paths on every host.
+    :param operation: The operation.
+    :param jobs: The maximum number of services to change at the same time on each host.
+    :param dependencies: The services each service depends on.
+
+    :returns: The host and the result, for each service on each host as it completes.
+
+    :raises ValueError: When `jobs` is less than 1.
+    """
+    if jobs < 1:
+        raise ValueError("The number of jobs must be at least 1")
+
+    if not services:
+        return
+
+    results: queue.SimpleQueue[t.Optional[tuple[str, batch.Result]]] = queue.SimpleQueue()
+    run_operation = functools.partial(operations.run, services, operation, jobs, dependencies)
+    threads = [
+        threading.Thread(
+            target=_run_host,
+            args=(transport, services, run_operation, jobs, results),
+            name=f"{__name__}-{transport.host}",
+            daemon=True,
+        )
+        for transport in transports
+    ]
+
+    logger.debug("Running operation on %s services on %s hosts", len(services), len(threads))
+
+    for thread in threads:
+        thread.start()
+
+    running = len(threads)
+
+    while running:
+        item = results.get()
+
+        if item is None:
+            running -= 1
+        else:
+            yield item
+
+    for thread in threads:
+        thread.join()
+
+
+def _run_host(
+    transport: Transport,
+    services: t.Sequence[Service],
+    run_operation: t.Callable[[], t.Iterable[batch.Result]],
+    jobs: int,
+    results: queue.SimpleQueue[t.Optional[tuple[str, batch.Result]]],
+) -> None:
+    """Run an operation on services on a single host and put the results on a queue, followed by `None`.
+
+    :param transport: The transport of the host.
+    :param services: The services to operate on.
+    :param run_operation: A callable that runs the operation on the services and returns the results.
+    :param jobs: The maximum number of services to change at the same time.
+    :param results: The queue.
+    """
+    pending = dict.fromkeys(services)
+
+    try:
+        transport.open()
+
+        try:
+            with SessionExecutor(
+                size=min(jobs, len(services)), transport=transport, timeout=COMMAND_TIMEOUT
+            ) as executor:
+                with launchctl.use_executor(executor):
+                    for result in run_operation():
+                        pending.pop(result.service, None)
+                        results.put((transport.host, result))
+        finally:
+            transport.close()
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.debug('Operation failed on "%s": %s', transport.host, exc)
+
+        for service in pending:
+            results.put((transport.host, batch.Result(service, exc)))
+    finally:
+        results.put(None)
@@ -0,0 +1,258 @@
+"""
+service.index
+
+A persistent index of the files in service directories.
+"""
+
+import logging
+import os
+from pathlib import Path
+import typing as t
+
+from .cache import get_cache_dir, read_cache, write_cache
+from .domain import get_context
+
+
+__all__ = ["get_index_file", "ServiceIndex"]
+
+
+INDEX_VERSION = 1
+
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceIndex:
+    """An index of the service files in one or more service directories.
+
+    The index records the inode and modification time of each directory when it is scanned. A directory is only scanned
+    again when the index is refreshed and either value has changed, so files added to or removed from a directory are
+    picked up without probing every potential service file path. The index also maps each service label (the file name
+    without its extension) to the directories that have a service file for it, so looking up a service does not depend
+    on the number of files in the directories.
+
+    Directories kept current by a watcher (see `service.watcher.apply`) can be marked as watched, so refreshing the
+    index does not check them once they have been indexed.
+
+    :param file: The file used to persist the index.
+    """
+
+    def __init__(self, file: Path):
+        self._file = file
+        self._directories: dict[str, dict[str, t.Any]] = {}
+        self._files: dict[str, set[str]] = {}
+        self._labels: dict[str, set[str]] = {}
+        self._watched: set[str] = set()
+        self._dirty = False
+
+    @property
+    def file(self) -> Path:
+        """The file used to persist the index."""
+        return self._file
+
+    @classmethod
+    def load(cls, file: Path) -> "ServiceIndex":
+        """Load an index from a file.
+
+        An empty index is returned when the file does not exist, cannot be read, or was written by an incompatible
+        version.
+
+        :param file: The file the index was persisted to.
+        """
+        index = cls(file)
+        data = read_cache(file)
+
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            logger.debug('Ignoring incompatible service index at "%s"', file)
+            return index
+
+        for directory, entry in data.get("directories", {}).items():
+            index._directories[directory] = entry
+            index._set_files(directory, set(entry["files"]))
+
+        logger.debug("Loaded service index with %s directories", len(index._directories))
+
+        return index
+
+    def save(self) -> None:
+        """Persist the index if it has changed since it was loaded.
+
+        Failing to write the index is not an error; the index will be rebuilt on the next run.
+        """
+        if not self._dirty:
+            return
+
+        if write_cache(self._file, {"version": INDEX_VERSION, "directories": self._directories}):
+            self._dirty = False
+            logger.debug('Saved service index to "%s"', self._file)
+
+    def candidates(self, directories: list[Path], file_names: list[str]) -> list[Path]:
+        """Get the indexed service files matching any of the file names.
+
+        Directories that have not been indexed are scanned. Results are ordered by directory, then by file name, which
+        is the same order in which the files would be probed without an index.
+
+        :param directories: The service directories to search.
+        :param file_names: The service file names to look for.
+        """
+        for directory in directories:
+            if str(directory) not in self._files:
+                self.scan(directory)
+
+        found = {name: self._labels.get(name.removesuffix(".plist"), set()) for name in file_names}
+
+        return [
+            directory.joinpath(name)
+            for directory in directories
+            for name in file_names
+            if str(directory) in found[name]
+        ]
+
+    def files(self, directory: Path) -> set[str]:
+        """Get the indexed service file names in a directory, scanning the directory if it has not been indexed.
+
+        :param directory: The service directory.
+        """
+        files = self._files.get(str(directory))
+
+        if files is None:
+            files = self.scan(directory)
+
+        return files
+
+    def key(self, directory: Path) -> t.Optional[tuple[int, int]]:
+        """Get the inode and modification time of a directory when it was last indexed.
+
+        :param directory: The service directory.
+
+        :returns: The inode and modification time, or `None` if the directory has not been indexed or does not exist.
+        """
+        entry = self._directories.get(str(directory))
+
+        return None if entry is None else (entry["inode"], entry["mtime"])
+
+    def refresh(self, directories: list[Path]) -> bool:
+        """Scan any directory that has changed since it was indexed; watched directories are not checked.
+
+        :param directories: The service directories to check.
+
+        :returns: Whether any directory was scanned.
+        """
+        changed = False
+
+        for directory in directories:
+            entry = self._directories.get(str(directory))
+
+            if entry is not None and str(directory) in self._watched:
+                continue
+
+            try:
+                stat = directory.stat()
+            except OSError:
+                stat = None
+
+            if entry is None or stat is None or (entry["inode"], entry["mtime"]) != (stat.st_ino, stat.st_mtime_ns):
+                self.scan(directory)
+                changed = True
+
+        return changed
+
+    def rebuild(self, directories: list[Path]) -> int:
+        """Discard the index and scan all directories.
+
+        :param directories: The service directories to index.
+
+        :returns: The number of indexed service files.
+        """
+        self._directories.clear()
+        self._files.clear()
+        self._labels.clear()
+
+        return sum(len(self.scan(directory)) for directory in directories)
+
+    def set_watched(self, directories: t.Iterable[Path]) -> None:
+        """Set the directories a watcher keeps current, replacing any set before.
+
+        :param directories: The watched service directories; none when the watcher stops.
+        """
+        self._watched = {str(directory) for directory in directories}
+
+    def update(self, directory: Path, added: t.Iterable[str] = (), removed: t.Iterable[str] = ()) -> None:
+        """Add and remove service files in a directory's entry without scanning the directory.
+
+        The directory's inode and modification time are recorded again, so the change is not picked up a second time by
+        `refresh`. A directory that has not been indexed is scanned instead.
+
+        :param directory: The service directory.
+        :param added: The names of the service files added to the directory.
+        :param removed: The names of the service files removed from the directory.
+        """
+        files = self._files.get(str(directory))
+
+        try:
+            stat = directory.stat()
+        except OSError:
+            stat = None
+
+        if files is None or stat is None:
+            self.scan(directory)
+            return
+
+        files = (files - set(removed)) | {name for name in added if name.endswith(".plist")}
+        self._directories[str(directory)] = {"inode": stat.st_ino, "mtime": stat.st_mtime_ns, "files": sorted(files)}
+        self._set_files(str(directory), files)
+        self._dirty = True
+
+    def scan(self, directory: Path) -> set[str]:
+        """Scan a directory and update its index entry.
+
+        :param directory: The service directory to scan.
+
+        :returns: The names of the service files in the directory.
+        """
+        logger.debug('Indexing "%s"', directory)
+
+        try:
+            stat = directory.stat()
+
+            with os.scandir(directory) as entries:
+                files = {entry.name for entry in entries if entry.name.endswith(".plist")}
+        except OSError:
+            self._directories.pop(str(directory), None)
+            self._set_files(str(directory), None)
+            self._dirty = True
+            return set()
+
+        self._directories[str(directory)] = {"inode": stat.st_ino, "mtime": stat.st_mtime_ns, "files": sorted(files)}
+        self._set_files(str(directory), files)
+        self._dirty = True
+
+        return files
+
+    def _set_files(self, directory: str, files: t.Optional[set[str]]) -> None:
+        """Replace the service files of a directory and their labels.
+
+        :param directory: The service directory.
+        :param files: The names of the service files in the directory, or `None` to remove the directory.
+        """
+        for name in self._files.pop(directory, set()):
+            directories = self._labels.get(name.removesuffix(".plist"))
+
+            if directories is not None:
+                directories.discard(directory)
+
+                if not directories:
+                    del self._labels[name.removesuffix(".plist")]
+
+        if files is None:
+            return
+
+        self._files[directory] = files
+
+        for name in files:
+            self._labels.setdefault(name.removesuffix(".plist"), set()).add(directory)
+
+
+def get_index_file() -> Path:
+    """Get the index file for the active domain."""
+    return get_cache_dir().joinpath(f"index-{get_context().key}.json")
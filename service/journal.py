@@ -0,0 +1,404 @@
+"""
+service.journal
+
+An append-only journal of the changes made to services.
+"""
+
+from __future__ import annotations
+import datetime
+import fcntl
+import getpass
+import json
+import logging
+import os
+from pathlib import Path
+import queue
+import re
+import threading
+import typing as t
+
+from .cache import read_cache, write_cache
+
+if t.TYPE_CHECKING:
+    from .domain import DomainContext
+
+
+__all__ = ["Entry", "get_journal_dir", "Journal", "JournalSettings", "parse_time", "read"]
+
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_SEGMENTS = 32
+SYSTEM_JOURNAL_DIR = Path("/Library/Logs/service/journal")
+USER_JOURNAL_DIR = Path("Library/Logs/service/journal")
+INDEX_SUFFIX = ".idx"
+LOCK_FILE = "lock"
+SEGMENT_SUFFIX = ".jsonl"
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+logger = logging.getLogger(__name__)
+
+
+class Entry(t.NamedTuple):
+    """A change made to a service.
+
+    :param time: The wall clock time the change started.
+    :param user: The user that made the change.
+    :param service: The service name.
+    :param domain: The domain of the service.
+    :param operation: The launchctl subcommand that made the change.
+    :param returncode: The launchctl return code, or `None` when launchctl could not be run.
+    :param duration: The duration of the change in seconds.
+    :param host: The host of the service, or `None` for this machine.
+    """
+
+    time: float
+    user: str
+    service: str
+    domain: str
+    operation: str
+    returncode: t.Optional[int]
+    duration: float
+    host: t.Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the change succeeded."""
+        return self.returncode == 0
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> Entry:
+        """Create an entry from its journal record.
+
+        :param data: The record.
+
+        :raises KeyError: When a required field is missing.
+        """
+        fields, defaults = cls._fields, cls._field_defaults  # pylint: disable=no-member
+        return cls(**{field: data[field] for field in fields if field in data or field not in defaults})
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Get the journal record of the entry; the host is left out for this machine."""
+        data = self._asdict()  # pylint: disable=no-member
+        data["time"] = round(self.time, 6)
+        data["duration"] = round(self.duration, 6)
+
+        if self.host is None:
+            del data["host"]
+
+        return data
+
+
+class JournalSettings(t.NamedTuple):
+    """Settings for the journal.
+
+    :param enabled: Whether changes are recorded.
+    :param segment_size: The size in bytes at which a new segment is started.
+    :param segments: The number of segments to keep.
+    """
+
+    enabled: bool = True
+    segment_size: int = DEFAULT_SEGMENT_SIZE
+    segments: int = DEFAULT_SEGMENTS
+
+
+class Journal:
+    """Record changes to services in a directory of segment files, shared by every process that uses the directory.
+
+    Each segment is a JSON Lines file. Recording a change only puts it on a queue; a background thread appends the
+    changes waiting on the queue to the active segment with a single write, followed by a single fsync, so a burst of
+    changes costs one disk flush. When the active segment reaches `segment_size`, a small index of the segment is
+    written next to it and a new segment is started, and the oldest segments beyond `segments` are removed.
+
+    :param directory: The directory for the segment files.
+    :param settings: The journal settings.
+    :param user: The user to record changes for; the user that invoked sudo, or the current user by default.
+    """
+
+    def __init__(self, directory: Path, settings: t.Optional[JournalSettings] = None, user: t.Optional[str] = None):
+        self.directory = directory
+        self.settings = settings or JournalSettings()
+        self.user = user or _get_user()
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[t.Optional[Entry]] = queue.SimpleQueue()
+        self._thread: t.Optional[threading.Thread] = None
+        self._closed = False
+
+    def close(self) -> None:
+        """Write the recorded changes and stop the writer thread; changes recorded later are written immediately."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._closed = True
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def record(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        service: str,
+        domain: str,
+        operation: str,
+        returncode: t.Optional[int],
+        start: float,
+        duration: float,
+        host: t.Optional[str] = None,
+    ) -> None:
+        """Record a change to a service; the change is written in the background until the journal is closed.
+
+        :param service: The service name.
+        :param domain: The domain of the service.
+        :param operation: The launchctl subcommand that made the change.
+        :param returncode: The launchctl return code, or `None` when launchctl could not be run.
+        :param start: The wall clock time the change started.
+        :param duration: The duration of the change in seconds.
+        :param host: The host of the service, or `None` for this machine.
+        """
+        entry = Entry(start, self.user, service, domain, operation, returncode, duration, host)
+
+        with self._lock:
+            if not self._closed:
+                self._queue.put(entry)
+
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_entries, name=__name__, daemon=True)
+                    self._thread.start()
+
+                return
+
+        self._write([entry])
+
+    def _append(self, entries: list[Entry]) -> None:
+        """Append entries to the active segment, starting a new segment first when the active segment is full.
+
+        :param entries: The entries.
+
+        :raises OSError: When the entries cannot be written.
+        """
+        data = "".join(f"{json.dumps(entry.to_dict(), separators=(',', ':'))}\n" for entry in entries).encode()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock = os.open(self.directory / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            numbers = _segment_numbers(self.directory)
+            number = numbers[-1] if numbers else 1
+
+            if numbers and _segment_file(self.directory, number).stat().st_size >= self.settings.segment_size:
+                _write_index(self.directory, number)
+                number += 1
+
+                for old in numbers[: max(0, len(numbers) + 1 - self.settings.segments)]:
+                    _segment_file(self.directory, old).unlink(missing_ok=True)
+                    _index_file(self.directory, old).unlink(missing_ok=True)
+
+                logger.debug("Started journal segment %s", number)
+
+            fd = os.open(_segment_file(self.directory, number), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        finally:
+            os.close(lock)
+
+    def _write_entries(self) -> None:
+        """Write the recorded entries in batches until the journal is closed."""
+        done = False
+
+        while not done:
+            batch = [self._queue.get()]
+
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            done = None in batch
+            entries = [entry for entry in batch if entry is not None]
+
+            if entries:
+                self._write(entries)
+
+    def _write(self, entries: list[Entry]) -> None:
+        """Write entries to the journal, logging a warning if they cannot be written.
+
+        :param entries: The entries.
+        """
+        try:
+            self._append(entries)
+        except (OSError, TypeError, ValueError) as exc:
+            logger.warning('Failed to write %s changes to the journal "%s": %s', len(entries), self.directory, exc)
+
+
+def get_journal_dir(context: DomainContext) -> Path:
+    """Get the journal directory for a domain.
+
+    Changes to the system domain, or made as root, are recorded in one journal in `SYSTEM_JOURNAL_DIR`, whichever
+    user invoked sudo and whether or not a daemon made them. Changes to the gui domain of a user are recorded in the
+    user's `~/Library/Logs`. The `SERVICE_JOURNAL` environment variable overrides the location.
+
+    :param context: The domain.
+    """
+    if os.environ.get("SERVICE_JOURNAL"):
+        return Path(os.environ["SERVICE_JOURNAL"])
+
+    if context.is_system or os.geteuid() == 0:
+        return SYSTEM_JOURNAL_DIR
+
+    return (context.home or Path.home()) / USER_JOURNAL_DIR
+
+
+def parse_time(value: str, now: t.Optional[float] = None) -> float:
+    """Parse a point in time, written as a duration ago (e.g., "90s", "30m", "2h", "7d") or an ISO 8601 date and time
+    in local time (e.g., "2026-10-17" or "2026-10-17 09:30").
+
+    :param value: The point in time.
+    :param now: The current time; the wall clock time by default.
+
+    :returns: The point in time as a wall clock time.
+
+    :raises ValueError: When the value is invalid.
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value.strip())
+
+    if match:
+        now = datetime.datetime.now().timestamp() if now is None else now
+        return now - float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+    try:
+        return datetime.datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError as exc:
+        raise ValueError(f'Invalid time "{value}"') from exc
+
+
+def read(directory: Path, name: t.Optional[str] = None, since: t.Optional[float] = None) -> t.Iterator[Entry]:
+    """Read the changes in a journal, oldest segment first.
+
+    A full segment is only read when its index shows it has changes to the service since the requested time, so
+    queries for recent or rare changes read little more than the indexes.
+
+    :param directory: The journal directory.
+    :param name: Only read the changes to the service with this name or label; a label matches the last part of a
+    label, e.g., "xserv" matches "com.bar.foo.xserv".
+    :param since: Only read the changes that started at or after this wall clock time.
+    """
+    for number in _segment_numbers(directory):
+        index = read_cache(_index_file(directory, number))
+
+        if isinstance(index, dict) and not _may_contain(index, name, since):
+            continue
+
+        for entry in _read_segment(directory, number):
+            if (since is None or entry.time >= since) and (name is None or _matches(entry.service, name)):
+                yield entry
+
+
+def _get_user() -> str:
+    """Get the user that runs the program; the user that invoked sudo when run with sudo, or the user ID when the user
+    has no name.
+    """
+    try:
+        return os.getenv("SUDO_USER") or getpass.getuser()
+    except (KeyError, OSError):
+        return str(os.getuid())
+
+
+def _index_file(directory: Path, number: int) -> Path:
+    """Get the index file of a segment.
+
+    :param directory: The journal directory.
+    :param number: The segment number.
+    """
+    return directory / f"{number:08d}{INDEX_SUFFIX}"
+
+
+def _matches(service: str, name: str) -> bool:
+    """Check whether a recorded service name matches a requested name.
+
+    :param service: The recorded service name.
+    :param name: The requested name.
+    """
+    return service == name or service.endswith(f".{name}")
+
+
+def _may_contain(index: dict[str, t.Any], name: t.Optional[str], since: t.Optional[float]) -> bool:
+    """Check whether a segment may contain matching changes according to its index.
+
+    :param index: The segment index.
+    :param name: The requested service name.
+    :param since: The requested time.
+    """
+    if since is not None and index.get("end", since) < since:
+        return False
+
+    return name is None or any(_matches(service, name) for service in index.get("services", [name]))
+
+
+def _read_segment(directory: Path, number: int) -> t.Iterator[Entry]:
+    """Read the changes in a segment; incomplete or invalid records are skipped.
+
+    :param directory: The journal directory.
+    :param number: The segment number.
+    """
+    try:
+        file = _segment_file(directory, number).open("rb")
+    except FileNotFoundError:
+        return
+
+    with file:
+        for line in file:
+            try:
+                yield Entry.from_dict(json.loads(line))
+            except (KeyError, TypeError, ValueError):
+                logger.debug("Skipping an invalid record in journal segment %s", number)
+
+
+def _segment_file(directory: Path, number: int) -> Path:
+    """Get the file of a segment.
+
+    :param directory: The journal directory.
+    :param number: The segment number.
+    """
+    return directory / f"{number:08d}{SEGMENT_SUFFIX}"
+
+
+def _segment_numbers(directory: Path) -> list[int]:
+    """Get the numbers of the segments in a journal, oldest first.
+
+    :param directory: The journal directory.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+
+    return sorted(
+        int(name[: -len(SEGMENT_SUFFIX)])
+        for name in names
+        if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+    )
+
+
+def _write_index(directory: Path, number: int) -> None:
+    """Write the index of a full segment: the time range and the names of the services it has changes to.
+
+    :param directory: The journal directory.
+    :param number: The segment number.
+    """
+    entries = list(_read_segment(directory, number))
+
+    if entries:
+        write_cache(
+            _index_file(directory, number),
+            {
+                "start": min(entry.time for entry in entries),
+                "end": max(entry.time for entry in entries),
+                "count": len(entries),
+                "services": sorted({entry.service for entry in entries}),
+            },
+        )
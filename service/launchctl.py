@@ -5,15 +5,45 @@ An interface for constructing and executing launchctl commands.
 """
 
 from __future__ import annotations
+import contextlib
+import contextvars
 import logging
 import subprocess
+import time
 import typing as t
 
+from . import timing
+from .executor import SubprocessExecutor
+from .limits import Limiter
+from .retry import RetryPolicy
+
 if t.TYPE_CHECKING:
+    from .executor import Executor
+    from .journal import Journal
     from .service import Service
 
 
-__all__ = ["DOMAIN_GUI", "DOMAIN_SYS", "boot", "change_state"]
+__all__ = [
+    "DOMAIN_GUI",
+    "DOMAIN_SYS",
+    "RESTART_STRATEGIES",
+    "boot",
+    "change_state",
+    "domain_exists",
+    "get_executor",
+    "get_journal",
+    "get_limiter",
+    "get_retry_policy",
+    "is_already_booted",
+    "list_disabled",
+    "list_loaded",
+    "restart",
+    "set_executor",
+    "set_journal",
+    "set_limiter",
+    "set_retry_policy",
+    "use_executor",
+]
 
 
 DOMAIN_GUI = "gui"
@@ -21,24 +51,213 @@ DOMAIN_SYS = "system"
 
 ERROR_GUI_ALREADY_STARTED = 5
 ERROR_GUI_ALREADY_STOPPED = 5
+ERROR_NOT_LOADED = 113
+ERROR_NOT_RUNNING = 3
 ERROR_SIP = 150
 ERROR_SYS_ALREADY_STARTED = 37
 ERROR_SYS_ALREADY_STOPPED = 113
 
+RESTART_STRATEGIES = ("kickstart", "reload", "signal")
+
+
+T = t.TypeVar("T")
+
+# The launchctl commands of an operation on a service, as subcommands and their arguments. Each command is run with
+# `_change`, and a failed command is thrown into the generator; the generator returns the result of the operation.
+Steps = t.Generator[tuple[str, ...], None, T]
 
 logger = logging.getLogger(__name__)
 
+_executor: Executor = SubprocessExecutor()
+_context_executor: contextvars.ContextVar[t.Optional[Executor]] = contextvars.ContextVar(
+    f"{__name__}.executor", default=None
+)
+_journal: t.Optional[Journal] = None  # pylint: disable=invalid-name
+_limiter = Limiter()
+_retry_policy = RetryPolicy()
+
+
+def _execute(subcommand: str, *args: str) -> subprocess.CompletedProcess:
+    """Construct and execute a launchctl command with the active executor.
+
+    The command is retried according to the active retry policy when it fails transiently.
+
+    :param subcommand: The launchctl subcommand to run
+    :param args: The arguments for the subcommand
+
+    :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+    """
+    logger.debug('Calling launchctl with command "%s"', " ".join([get_executor().program, subcommand, *args]))
+    delays = _retry_policy.delays()
+
+    while True:
+        try:
+            return _run(subcommand, *args)
+        except subprocess.CalledProcessError as exc:
+            delay = next(delays, None) if _retry_policy.is_transient(subcommand, exc.returncode) else None
+
+            if delay is None:
+                raise
+
+            logger.debug(
+                "launchctl %s failed with return code %s, retrying in %.3fs", subcommand, exc.returncode, delay
+            )
+            time.sleep(delay)
+
+
+def _change(service: Service, subcommand: str, *args: str) -> subprocess.CompletedProcess:
+    """Execute a launchctl command that changes a service once the active limiter lets it start (see
+    `service.limits.Limiter`), and record the change in the active journal, if any (see `service.journal.Journal`).
+
+    :param service: The service the command changes.
+    :param subcommand: The launchctl subcommand to run
+    :param args: The arguments for the subcommand
+
+    :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
+    """
+    host = get_executor().host
+
+    with _limiter.acquire(service.domain, host), _record_change(service, subcommand, host):
+        return _execute(subcommand, *args)
+
+
+@contextlib.contextmanager
+def _record_change(service: Service, subcommand: str, host: t.Optional[str] = None) -> t.Iterator[None]:
+    """Record the launchctl command run in the block in the active journal, if any.
+
+    :param service: The service the command changes.
+    :param subcommand: The launchctl subcommand.
+    :param host: The host of the service, or `None` for this machine.
+    """
+    journal = _journal
+
+    if journal is None:
+        yield
+        return
+
+    start, started = time.time(), time.perf_counter()
+    returncode = None
+
+    try:
+        yield
+        returncode = 0
+    except subprocess.CalledProcessError as exc:
+        returncode = exc.returncode
+        raise
+    finally:
+        journal.record(service.name, service.domain, subcommand, returncode, start, time.perf_counter() - started, host)
+
 
-def _execute(subcommand: str, *args: str) -> None:
-    """Construct and execute a launchctl command.
+def _run(subcommand: str, *args: str) -> subprocess.CompletedProcess:
+    """Execute a launchctl command once with the active executor.
 
     :param subcommand: The launchctl subcommand to run
     :param args: The arguments for the subcommand
+
+    :raises subprocess.CalledProcessError: When the command exits with a non-zero return code.
     """
-    cmd = ["launchctl", subcommand, *args]
+    with timing.span("launchctl", subcommand=subcommand) as span:
+        try:
+            result = get_executor().run(subcommand, *args)
+        except subprocess.CalledProcessError as exc:
+            span.set(returncode=exc.returncode)
+            raise
+
+        span.set(returncode=result.returncode)
+
+    return result
+
+
+def get_executor() -> Executor:
+    """Get the executor used to run launchctl commands: the executor set for the current context, if any (see
+    `use_executor`), or the executor set for the program."""
+    return _context_executor.get() or _executor
+
+
+def set_executor(executor: Executor) -> Executor:
+    """Set the executor used to run launchctl commands.
+
+    :param executor: The executor to use.
+
+    :returns: The previous executor.
+    """
+    global _executor  # pylint: disable=global-statement
+
+    previous, _executor = _executor, executor
 
-    logger.debug('Calling launchctl with command "%s"', " ".join(cmd))
-    subprocess.run(cmd, check=True, capture_output=True)
+    return previous
+
+
+@contextlib.contextmanager
+def use_executor(executor: Executor) -> t.Iterator[Executor]:
+    """Use an executor for the launchctl commands run in the current context, e.g., to run the commands of one thread
+    on another host. Operations run with `service.batch.run` inherit the context they are started in.
+
+    :param executor: The executor to use.
+    """
+    token = _context_executor.set(executor)
+
+    try:
+        yield executor
+    finally:
+        _context_executor.reset(token)
+
+
+def get_journal() -> t.Optional[Journal]:
+    """Get the journal that records the launchctl commands that change services."""
+    return _journal
+
+
+def set_journal(journal: t.Optional[Journal]) -> t.Optional[Journal]:
+    """Set the journal that records the launchctl commands that change services.
+
+    :param journal: The journal to use, or `None` to stop recording changes.
+
+    :returns: The previous journal.
+    """
+    global _journal  # pylint: disable=global-statement
+
+    previous, _journal = _journal, journal
+
+    return previous
+
+
+def get_limiter() -> Limiter:
+    """Get the limiter that schedules the launchctl commands that change services."""
+    return _limiter
+
+
+def set_limiter(limiter: Limiter) -> Limiter:
+    """Set the limiter that schedules the launchctl commands that change services.
+
+    :param limiter: The limiter to use.
+
+    :returns: The previous limiter.
+    """
+    global _limiter  # pylint: disable=global-statement
+
+    previous, _limiter = _limiter, limiter
+
+    return previous
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Get the policy for retrying launchctl commands that fail transiently."""
+    return _retry_policy
+
+
+def set_retry_policy(policy: RetryPolicy) -> RetryPolicy:
+    """Set the policy for retrying launchctl commands that fail transiently.
+
+    :param policy: The retry policy to use.
+
+    :returns: The previous retry policy.
+    """
+    global _retry_policy  # pylint: disable=global-statement
+
+    previous, _retry_policy = _retry_policy, policy
+
+    return previous
 
 
 def boot(service: Service, run: bool = False) -> None:
@@ -50,25 +269,7 @@ def boot(service: Service, run: bool = False) -> None:
     :raises RuntimeError: When the service is already in the target state, runtime state change is prevented by SIP, or
     changing the runtime state fails.
     """
-    subcmd, action, current_state = ("bootstrap", "start", "started") if run else ("bootout", "stop", "stopped")
-
-    logger.debug("Changing service runtime state: %s (%s)", service.name, action)
-
-    try:
-        _execute(subcmd, service.domain, service.file)
-    except subprocess.CalledProcessError as exc:
-        if exc.returncode in [
-            ERROR_GUI_ALREADY_STARTED,
-            ERROR_GUI_ALREADY_STOPPED,
-            ERROR_SYS_ALREADY_STARTED,
-            ERROR_SYS_ALREADY_STOPPED,
-        ]:
-            msg = f"{service.name} is already {current_state}"
-        else:
-            reason = " due to SIP" if exc.returncode == ERROR_SIP else ""
-            msg = f"Failed to {action} {service.name}{reason}"
-
-        raise RuntimeError(msg) from exc
+    _run_steps(service, _boot_steps(service, run))
 
 
 def change_state(service: Service, enable: bool = False) -> None:
@@ -80,14 +281,238 @@ def change_state(service: Service, enable: bool = False) -> None:
     :raises ValueError: When an unknown service state is specified.
     :raises RuntimeError: When the service state cannot be changed or changing the service state fails.
     """
-    subcmd = "enable" if enable else "disable"
+    _run_steps(service, _change_state_steps(service, enable))
 
-    logger.debug("Changing service state: %s (%s)", service.name, subcmd)
 
+def domain_exists(domain: str) -> bool:
+    """Check whether a domain exists, e.g., whether the gui domain of a user exists because the user is logged in.
+
+    :param domain: The domain.
+    """
+    logger.debug("Checking domain: %s", domain)
+
+    try:
+        _execute("print", domain)
+    except subprocess.CalledProcessError:
+        return False
+
+    return True
+
+
+def is_already_booted(error: BaseException, run: bool) -> bool:
+    """Check whether an error raised by `boot` means the service was already in the target state.
+
+    :param error: The error.
+    :param run: Whether the service was being run (started).
+    """
+    cause = error.__cause__
+    codes = (
+        (ERROR_GUI_ALREADY_STARTED, ERROR_SYS_ALREADY_STARTED)
+        if run
+        else (ERROR_GUI_ALREADY_STOPPED, ERROR_SYS_ALREADY_STOPPED)
+    )
+
+    return (
+        isinstance(cause, subprocess.CalledProcessError)
+        and cause.cmd[1:2] == ["bootstrap" if run else "bootout"]
+        and cause.returncode in codes
+    )
+
+
+def list_disabled(domain: str = DOMAIN_SYS) -> str:
+    """Get the enabled state of the services in a domain that have been enabled or disabled, as reported by
+    `launchctl print-disabled`.
+
+    :param domain: The domain.
+
+    :raises RuntimeError: When the enabled state cannot be listed.
+    """
+    logger.debug("Listing disabled services: %s", domain)
+
+    try:
+        return _execute("print-disabled", domain).stdout.decode(errors="replace")
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError(f'Failed to list disabled services in the "{domain}" domain') from exc
+
+
+def list_loaded() -> str:
+    """Get the services loaded in the active domain, as reported by `launchctl list`.
+
+    :raises RuntimeError: When the loaded services cannot be listed.
+    """
+    logger.debug("Listing loaded services")
+
+    try:
+        return _execute("list").stdout.decode(errors="replace")
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError("Failed to list loaded services") from exc
+
+
+def restart(service: Service, strategy: str = "kickstart") -> str:
+    """Restart a service, falling back to another strategy when the requested one cannot be used.
+
+    Strategies:
+
+    - "kickstart": kill and start the service with a single `launchctl kickstart -k` call; the service stays loaded.
+      Falls back to "reload" when the service is not loaded.
+    - "reload": unload and load the service with `launchctl bootout` and `launchctl bootstrap`; the service file is
+      read again, but the service does not exist between the calls.
+    - "signal": send SIGTERM with `launchctl kill` and let launchd start the service again. Falls back to "kickstart"
+      when the service is not always kept alive (KeepAlive is not true), not loaded, or not running.
+
+    :param service: The service to restart.
+    :param strategy: The strategy to try first; one of `RESTART_STRATEGIES`.
+
+    :returns: The strategy that restarted the service.
+
+    :raises ValueError: When the strategy is unknown.
+    :raises RuntimeError: When restarting the service fails.
+    """
+    return _run_steps(service, _restart_steps(service, strategy))
+
+
+def _boot_error(service: Service, run: bool, returncode: int) -> RuntimeError:
+    """Create the error for a failed runtime state change.
+
+    :param service: The service that was modified.
+    :param run: Whether the service was being run (started).
+    :param returncode: The launchctl return code.
+    """
+    action, current_state = ("start", "started") if run else ("stop", "stopped")
+
+    if returncode in [
+        ERROR_GUI_ALREADY_STARTED,
+        ERROR_GUI_ALREADY_STOPPED,
+        ERROR_SYS_ALREADY_STARTED,
+        ERROR_SYS_ALREADY_STOPPED,
+    ]:
+        msg = f"{service.name} is already {current_state}"
+    else:
+        reason = " due to SIP" if returncode == ERROR_SIP else ""
+        msg = f"Failed to {action} {service.name}{reason}"
+
+    return RuntimeError(msg)
+
+
+def _restart_error(service: Service, returncode: int) -> RuntimeError:
+    """Create the error for a failed restart.
+
+    :param service: The service that was restarted.
+    :param returncode: The launchctl return code.
+    """
+    reason = " due to SIP" if returncode == ERROR_SIP else ""
+    return RuntimeError(f"Failed to restart {service.name}{reason}")
+
+
+def _check_state_domain(service: Service) -> None:
+    """Ensure the service state can be changed in the service domain.
+
+    :param service: The service to target.
+
+    :raises RuntimeError: When the service is not in the system domain.
+    """
     if service.domain != DOMAIN_SYS:
         raise RuntimeError(f'Cannot change service state in the "{service.domain}" domain')
 
+
+def _boot_steps(service: Service, run: bool) -> Steps[None]:
+    """Get the launchctl commands that start or stop a service (see `boot`).
+
+    :param service: The service to modify.
+    :param run: Whether to run (start) the service.
+    """
+    subcmd = "bootstrap" if run else "bootout"
+
+    logger.debug("Changing service runtime state: %s (%s)", service.name, "start" if run else "stop")
+
+    try:
+        yield (subcmd, service.domain, service.file)
+    except subprocess.CalledProcessError as exc:
+        raise _boot_error(service, run, exc.returncode) from exc
+
+
+def _change_state_steps(service: Service, enable: bool) -> Steps[None]:
+    """Get the launchctl commands that enable or disable a service (see `change_state`).
+
+    :param service: The service to target.
+    :param enable: Whether the service should be enabled.
+    """
+    subcmd = "enable" if enable else "disable"
+
+    logger.debug("Changing service state: %s (%s)", service.name, subcmd)
+    _check_state_domain(service)
+
     try:
-        _execute(subcmd, service.id)
+        yield (subcmd, service.id)
     except subprocess.CalledProcessError as exc:
         raise RuntimeError(f"Failed to {subcmd} {service.name}") from exc
+
+
+def _restart_steps(service: Service, strategy: str) -> Steps[str]:
+    """Get the launchctl commands that restart a service (see `restart`); a failed command is thrown into the generator
+    so it can fall back to another strategy.
+
+    :param service: The service to restart.
+    :param strategy: The strategy to try first.
+
+    :returns: The strategy that restarted the service.
+    """
+    if strategy not in RESTART_STRATEGIES:
+        raise ValueError(f'Unknown restart strategy "{strategy}"')
+
+    logger.debug("Restarting service: %s (%s)", service.name, strategy)
+
+    if strategy == "signal":
+        if not service.metadata.keep_alive:
+            logger.debug("%s is not kept alive, falling back to kickstart", service.name)
+        else:
+            try:
+                yield ("kill", "TERM", service.id)
+                return strategy
+            except subprocess.CalledProcessError as exc:
+                if exc.returncode not in [ERROR_NOT_LOADED, ERROR_NOT_RUNNING]:
+                    raise _restart_error(service, exc.returncode) from exc
+
+                logger.debug("%s is not running, falling back to kickstart", service.name)
+
+        strategy = "kickstart"
+
+    if strategy == "kickstart":
+        try:
+            yield ("kickstart", "-k", service.id)
+            return strategy
+        except subprocess.CalledProcessError as exc:
+            if exc.returncode != ERROR_NOT_LOADED:
+                raise _restart_error(service, exc.returncode) from exc
+
+        # the service is not loaded, so there is nothing to unload
+        logger.debug("%s is not loaded, falling back to reload", service.name)
+        yield from _boot_steps(service, True)
+        return "reload"
+
+    yield from _boot_steps(service, False)
+    yield from _boot_steps(service, True)
+
+    return strategy
+
+
+def _run_steps(service: Service, steps: Steps[T]) -> T:
+    """Run the launchctl commands of an operation on a service, throwing each failed command into the operation.
+
+    :param service: The service the commands change.
+    :param steps: The launchctl commands of the operation.
+
+    :returns: The result of the operation.
+    """
+    try:
+        step = next(steps)
+
+        while True:
+            try:
+                _change(service, *step)
+            except subprocess.CalledProcessError as exc:
+                step = steps.throw(exc)
+            else:
+                step = next(steps)
+    except StopIteration as stop:
+        return stop.value
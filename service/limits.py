@@ -0,0 +1,328 @@
+"""
+service.limits
+
+Limit the rate and concurrency of the launchctl commands that change services, across processes.
+"""
+
+from __future__ import annotations
+import contextlib
+import fcntl
+import logging
+import math
+import os
+from pathlib import Path
+import re
+import time
+import types
+import typing as t
+
+from . import timing
+
+
+__all__ = ["Limiter", "Limits"]
+
+
+POLL_DELAY = 0.01
+MAX_POLL_DELAY = 0.1
+UNSAFE_CHARS = re.compile(r"[^\w.@-]")
+
+
+logger = logging.getLogger(__name__)
+
+
+class Limits(t.NamedTuple):
+    """Limits for the launchctl commands that change services; a limit of 0 means no limit.
+
+    :param rate: The number of changes started per second, on average.
+    :param burst: The number of changes that can start at once after a quiet period; `rate` rounded up if 0.
+    :param in_flight: The number of changes running at the same time.
+    :param domains: The number of changes running at the same time in a domain, keyed by domain (e.g., "gui/501") or
+    domain type (e.g., "gui").
+    """
+
+    rate: float = 0.0
+    burst: int = 0
+    in_flight: int = 0
+    domains: t.Mapping[str, int] = types.MappingProxyType({})
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is set."""
+        return bool(self.rate or self.in_flight or any(self.domains.values()))
+
+    def domain_limit(self, domain: str) -> int:
+        """Get the limit for a domain.
+
+        :param domain: The domain, e.g., "system" or "gui/501".
+        """
+        return self.domains.get(domain, self.domains.get(domain.partition("/")[0], 0))
+
+
+class Limiter:
+    """Schedule changes to services within limits shared by every process that uses the same directory.
+
+    The rate is limited with a token bucket stored in a file. Each concurrency limit is a set of slot files, and a
+    change holds an exclusive lock on one slot file while it runs. Locks are released by the operating system when a
+    process exits, so a process that crashes does not hold on to its slots.
+
+    :param limits: The limits.
+    :param directory: The directory for the bucket and slot files.
+    """
+
+    def __init__(self, limits: t.Optional[Limits] = None, directory: t.Optional[Path] = None):
+        self.limits = limits or Limits()
+        self._dir = directory
+
+    @contextlib.contextmanager
+    def acquire(self, domain: str, host: t.Optional[str] = None) -> t.Iterator[None]:
+        """Wait until a change in a domain can start, and hold its place until the change is done.
+
+        The slot of the domain is taken before the slot of the in-flight limit, so changes waiting for a busy domain do
+        not hold in-flight slots that changes in other domains could use. Each host has its own limits.
+
+        :param domain: The domain of the service that is changed.
+        :param host: The host of the service, or `None` for this machine.
+        """
+        prefix = self._prepare(host)
+
+        if prefix is None:
+            yield
+            return
+
+        with contextlib.ExitStack() as slots:
+            with timing.span("limit", domain=domain):
+                slots.enter_context(
+                    self._slot(f"{prefix}domain-{domain.replace('/', '-')}", self.limits.domain_limit(domain))
+                )
+                slots.enter_context(self._slot(f"{prefix}in-flight", self.limits.in_flight))
+                self._take(f"{prefix}bucket")
+
+            yield
+
+    @contextlib.asynccontextmanager
+    async def acquire_async(self, domain: str, host: t.Optional[str] = None) -> t.AsyncIterator[None]:
+        """Wait until a change in a domain can start without blocking the event loop, and hold its place until the
+        change is done.
+
+        See `acquire`.
+
+        :param domain: The domain of the service that is changed.
+        :param host: The host of the service, or `None` for this machine.
+        """
+        prefix = self._prepare(host)
+
+        if prefix is None:
+            yield
+            return
+
+        async with contextlib.AsyncExitStack() as slots:
+            with timing.span("limit", domain=domain):
+                await slots.enter_async_context(
+                    self._slot_async(f"{prefix}domain-{domain.replace('/', '-')}", self.limits.domain_limit(domain))
+                )
+                await slots.enter_async_context(self._slot_async(f"{prefix}in-flight", self.limits.in_flight))
+                await self._take_async(f"{prefix}bucket")
+
+            yield
+
+    def _prepare(self, host: t.Optional[str]) -> t.Optional[str]:
+        """Create the directory for the bucket and slot files.
+
+        :param host: The host of the service, or `None` for this machine.
+
+        :returns: The prefix of the bucket and slot files of the host, or `None` when no limit is set.
+        """
+        if not self.limits.enabled or self._dir is None:
+            return None
+
+        self._dir.mkdir(parents=True, exist_ok=True)
+
+        return "" if host is None else f"host-{UNSAFE_CHARS.sub('-', host)}-"
+
+    def _lock_slot(self, name: str, size: int) -> t.Optional[int]:
+        """Lock one of the free slots of a concurrency limit.
+
+        :param name: The name of the limit.
+        :param size: The number of slots.
+
+        :returns: The file descriptor of the locked slot file, or `None` when every slot is taken.
+        """
+        assert self._dir is not None
+
+        for index in range(size):
+            fd = os.open(self._dir / f"{name}-{index}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+
+            return fd
+
+        return None
+
+    @contextlib.contextmanager
+    def _slot(self, name: str, size: int) -> t.Iterator[None]:
+        """Hold one of the slots of a concurrency limit, waiting until one is free.
+
+        :param name: The name of the limit.
+        :param size: The number of slots; no slot is held if 0.
+        """
+        if size < 1:
+            yield
+            return
+
+        delay = POLL_DELAY
+
+        while (fd := self._lock_slot(name, size)) is None:
+            time.sleep(delay)
+            delay = min(MAX_POLL_DELAY, delay * 2)
+
+        try:
+            yield
+        finally:
+            _unlock(fd)
+
+    @contextlib.asynccontextmanager
+    async def _slot_async(self, name: str, size: int) -> t.AsyncIterator[None]:
+        """Hold one of the slots of a concurrency limit, waiting until one is free without blocking the event loop.
+
+        :param name: The name of the limit.
+        :param size: The number of slots; no slot is held if 0.
+        """
+        if size < 1:
+            yield
+            return
+
+        # imported here since `asyncio` is slow to import and is not needed to start the program
+        # pylint: disable-next=import-outside-toplevel
+        import asyncio
+
+        delay = POLL_DELAY
+
+        while (fd := self._lock_slot(name, size)) is None:
+            await asyncio.sleep(delay)
+            delay = min(MAX_POLL_DELAY, delay * 2)
+
+        try:
+            yield
+        finally:
+            _unlock(fd)
+
+    def _take(self, name: str) -> None:
+        """Take a token from a bucket, waiting until one is available.
+
+        :param name: The name of the bucket file.
+        """
+        if self.limits.rate <= 0:
+            return
+
+        assert self._dir is not None
+        fd = os.open(self._dir / name, os.O_RDWR | os.O_CREAT, 0o600)
+
+        try:
+            while True:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                wait = self._refill(fd)
+
+                if not wait:
+                    return
+
+                time.sleep(wait)
+        finally:
+            os.close(fd)
+
+    async def _take_async(self, name: str) -> None:
+        """Take a token from a bucket, waiting until one is available without blocking the event loop.
+
+        :param name: The name of the bucket file.
+        """
+        if self.limits.rate <= 0:
+            return
+
+        # pylint: disable-next=import-outside-toplevel
+        import asyncio
+
+        assert self._dir is not None
+        fd = os.open(self._dir / name, os.O_RDWR | os.O_CREAT, 0o600)
+
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    await asyncio.sleep(POLL_DELAY)
+                    continue
+
+                wait = self._refill(fd)
+
+                if not wait:
+                    return
+
+                await asyncio.sleep(wait)
+        finally:
+            os.close(fd)
+
+    def _refill(self, fd: int) -> float:
+        """Refill a locked bucket and take a token from it if one is available, then unlock the bucket.
+
+        :param fd: The bucket file descriptor.
+
+        :returns: 0 when a token was taken, or the number of seconds until the next token is available.
+        """
+        rate = self.limits.rate
+        burst = self.limits.burst or math.ceil(rate)
+
+        try:
+            now = time.time()
+            tokens, last = _read_bucket(fd, burst, now)
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+
+            if tokens >= 1:
+                _write_bucket(fd, tokens - 1, now)
+                return 0.0
+
+            _write_bucket(fd, tokens, now)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        return (1 - tokens) / rate
+
+
+def _read_bucket(fd: int, burst: int, now: float) -> tuple[float, float]:
+    """Read the number of tokens in a bucket and when it was last updated; a new bucket is full.
+
+    :param fd: The bucket file descriptor.
+    :param burst: The size of the bucket.
+    :param now: The current time.
+    """
+    os.lseek(fd, 0, os.SEEK_SET)
+
+    try:
+        tokens, last = (float(value) for value in os.read(fd, 64).split())
+    except ValueError:
+        return float(burst), now
+
+    return tokens, last
+
+
+def _write_bucket(fd: int, tokens: float, now: float) -> None:
+    """Write the number of tokens in a bucket and the current time.
+
+    :param fd: The bucket file descriptor.
+    :param tokens: The number of tokens.
+    :param now: The current time.
+    """
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{tokens!r} {now!r}".encode())
+
+
+def _unlock(fd: int) -> None:
+    """Unlock and close a slot file.
+
+    :param fd: The slot file descriptor.
+    """
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
@@ -0,0 +1,254 @@
+"""
+service.metadata
+
+Service metadata read from service files.
+"""
+
+from __future__ import annotations
+import functools
+import logging
+import os
+from pathlib import Path
+import plistlib
+import threading
+import typing as t
+
+from .cache import get_cache_dir, read_cache, write_cache
+
+
+__all__ = ["Metadata", "MetadataCache", "invalidate", "parse", "read", "save"]
+
+
+CACHE_VERSION = 3
+LRU_SIZE = 4096
+
+
+logger = logging.getLogger(__name__)
+
+
+class Metadata(t.NamedTuple):
+    """The metadata of a service.
+
+    :param label: The service label.
+    :param program: The program the service runs.
+    :param program_arguments: The program arguments, including the program.
+    :param keep_alive: Whether launchd always starts the service again when it exits; `False` when the KeepAlive key
+    sets conditions, since the service may not be started again after it is stopped.
+    :param run_at_load: Whether the service runs when it is loaded.
+    :param stdout_path: The file standard output is written to.
+    :param stderr_path: The file standard error is written to.
+    :param disabled: Whether the service file disables the service, unless it is enabled with launchctl.
+    """
+
+    label: t.Optional[str] = None
+    program: t.Optional[str] = None
+    program_arguments: tuple[str, ...] = ()
+    keep_alive: bool = False
+    run_at_load: bool = False
+    stdout_path: t.Optional[str] = None
+    stderr_path: t.Optional[str] = None
+    disabled: bool = False
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> Metadata:
+        """Create metadata from a dictionary created with `to_dict`.
+
+        :param data: The metadata dictionary.
+        """
+        return cls(**{**data, "program_arguments": tuple(data.get("program_arguments", ()))})
+
+    @classmethod
+    def from_plist(cls, data: dict[str, t.Any]) -> Metadata:
+        """Create metadata from parsed service file data.
+
+        :param data: The parsed service file.
+        """
+        program_arguments = data.get("ProgramArguments", [])
+
+        if not isinstance(program_arguments, list):
+            program_arguments = []
+
+        program_arguments = tuple(str(argument) for argument in program_arguments)
+        program = data.get("Program", program_arguments[0] if program_arguments else None)
+
+        return cls(
+            label=_optional_str(data.get("Label")),
+            program=_optional_str(program),
+            program_arguments=program_arguments,
+            keep_alive=data.get("KeepAlive") is True,
+            run_at_load=bool(data.get("RunAtLoad", False)),
+            stdout_path=_optional_str(data.get("StandardOutPath")),
+            stderr_path=_optional_str(data.get("StandardErrorPath")),
+            disabled=data.get("Disabled") is True,
+        )
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Convert the metadata to a JSON-serializable dictionary."""
+        return {**self._asdict(), "program_arguments": list(self.program_arguments)}  # pylint: disable=no-member
+
+
+class MetadataCache:
+    """A persistent cache of service metadata.
+
+    Entries are keyed by the service file path and validated with the file inode, size, and modification time, so an
+    entry is only used while the file is unchanged.
+
+    :param file: The file used to persist the cache.
+    """
+
+    def __init__(self, file: Path):
+        self._file = file
+        self._entries: dict[str, dict[str, t.Any]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, file: Path) -> MetadataCache:
+        """Load a cache from a file.
+
+        An empty cache is returned when the file does not exist, cannot be read, or was written by an incompatible
+        version.
+
+        :param file: The file the cache was persisted to.
+        """
+        cache = cls(file)
+        data = read_cache(file)
+
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            cache._entries = data.get("entries", {})
+
+        return cache
+
+    def get(self, path: str, key: tuple[int, int, int]) -> t.Optional[Metadata]:
+        """Get cached metadata.
+
+        :param path: The service file path.
+        :param key: The service file inode, size, and modification time.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+
+        if entry is None or tuple(entry["key"]) != key:
+            return None
+
+        return Metadata.from_dict(entry["metadata"])
+
+    def invalidate(self, path: str) -> None:
+        """Remove cached metadata.
+
+        :param path: The service file path.
+        """
+        with self._lock:
+            if self._entries.pop(path, None) is not None:
+                self._dirty = True
+
+    def put(self, path: str, key: tuple[int, int, int], metadata: Metadata) -> None:
+        """Cache metadata.
+
+        :param path: The service file path.
+        :param key: The service file inode, size, and modification time.
+        :param metadata: The metadata.
+        """
+        with self._lock:
+            self._entries[path] = {"key": list(key), "metadata": metadata.to_dict()}
+            self._dirty = True
+
+    def save(self) -> None:
+        """Persist the cache if it has changed since it was loaded, dropping the entries of service files that no longer
+        exist (e.g., removed or renamed) so the cache does not grow without limit."""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            self._entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+
+            if write_cache(self._file, {"version": CACHE_VERSION, "entries": self._entries}):
+                self._dirty = False
+
+
+_cache: t.Optional[MetadataCache] = None  # pylint: disable=invalid-name
+_cache_lock = threading.Lock()
+
+
+def invalidate(path: Path) -> None:
+    """Discard the cached metadata for a service file.
+
+    :param path: The service file path.
+    """
+    _get_cache().invalidate(str(path.absolute()))
+
+
+def parse(path: Path) -> Metadata:
+    """Parse a service file.
+
+    Both XML and binary property lists are supported. Empty metadata is returned when the file cannot be parsed.
+
+    :param path: The service file path.
+    """
+    try:
+        with path.open("rb") as file:
+            data = plistlib.load(file)
+    except (OSError, ValueError, plistlib.InvalidFileException) as exc:
+        logger.debug('Cannot parse service file "%s": %s', path, exc)
+        return Metadata()
+
+    return Metadata.from_plist(data) if isinstance(data, dict) else Metadata()
+
+
+def read(path: Path) -> Metadata:
+    """Read the metadata for a service file.
+
+    Metadata is memoized in memory and in a persistent cache, so a service file is only parsed again after it changes.
+
+    :param path: The service file path.
+    """
+    path = path.absolute()
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return Metadata()
+
+    return _read(str(path), (stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+
+def save() -> None:
+    """Persist the metadata cache if it has been used."""
+    if _cache is not None:
+        _cache.save()
+
+
+@functools.lru_cache(maxsize=LRU_SIZE)
+def _read(path: str, key: tuple[int, int, int]) -> Metadata:
+    """Read the metadata for an unchanged service file from the persistent cache or by parsing it.
+
+    :param path: The absolute service file path.
+    :param key: The service file inode, size, and modification time.
+    """
+    cache = _get_cache()
+    metadata = cache.get(path, key)
+
+    if metadata is None:
+        metadata = parse(Path(path))
+        cache.put(path, key, metadata)
+
+    return metadata
+
+
+def _get_cache() -> MetadataCache:
+    """Get the process-wide metadata cache, loading it on first use."""
+    global _cache  # pylint: disable=global-statement
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache.load(get_cache_dir().joinpath("metadata.json"))
+
+        return _cache
+
+
+def _optional_str(value: t.Any) -> t.Optional[str]:
+    """Convert a value to a string unless it is missing.
+
+    :param value: The value.
+    """
+    return None if value is None else str(value)
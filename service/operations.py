@@ -0,0 +1,195 @@
+"""
+service.operations
+
+The operations that change services, shared by the command-line interface and the daemon.
+"""
+
+from __future__ import annotations
+import logging
+import typing as t
+
+from . import batch, launchctl
+
+if t.TYPE_CHECKING:
+    from .service import Service
+
+
+__all__ = ["COMMANDS", "Operation", "run"]
+
+
+COMMANDS = ("disable", "enable", "restart", "start", "stop")
+
+
+logger = logging.getLogger(__name__)
+
+
+class Operation(t.NamedTuple):
+    """An operation on a single service.
+
+    :param command: The command name; one of `COMMANDS`.
+    :param enable: Whether to enable services before starting them (start only).
+    :param disable: Whether to disable services after stopping them (stop only).
+    :param strategy: The strategy to restart services with (restart only; see `service.launchctl.restart`).
+    :param wait: The number of seconds to wait until services are running or have exited (restart, start, and stop
+    only); services are not waited for if `None`.
+    """
+
+    command: str
+    enable: bool = False
+    disable: bool = False
+    strategy: str = "kickstart"
+    wait: t.Optional[float] = None
+
+    def __call__(self, service: Service) -> t.Optional[str]:
+        """Run the operation on a service.
+
+        :param service: The service.
+
+        :returns: The strategy used to restart the service (restart only).
+
+        :raises RuntimeError: When the operation fails.
+        :raises ValueError: When the command or restart strategy is unknown.
+        """
+        if self.command == "disable":
+            launchctl.change_state(service, enable=False)
+        elif self.command == "enable":
+            launchctl.change_state(service, enable=True)
+        elif self.command == "restart":
+            return launchctl.restart(service, self.strategy)
+        elif self.command == "start":
+            if self.enable:
+                launchctl.change_state(service, enable=True)
+
+            launchctl.boot(service, run=True)
+        elif self.command == "stop":
+            launchctl.boot(service, run=False)
+
+            if self.disable:
+                launchctl.change_state(service, enable=False)
+        else:
+            raise ValueError(f'Unknown command "{self.command}"')
+
+        return None
+
+    @property
+    def message(self) -> str:
+        """The message reported when the operation succeeds; formatted with the service name."""
+        if self.command == "start":
+            return f"%s {'enabled and ' if self.enable else ''}started"
+
+        if self.command == "stop":
+            return f"%s stopped{' and disabled' if self.disable else ''}"
+
+        return f"%s {self.command}d" if self.command.endswith("e") else f"%s {self.command}ed"
+
+    def describe(self, result: batch.Result) -> str:
+        """Get the message reported for the outcome of the operation on a service.
+
+        :param result: The result of the operation.
+        """
+        if not result.ok:
+            return str(result.error)
+
+        message = self.message % result.service.name
+
+        return f"{message} ({result.value})" if result.value else message
+
+    @property
+    def ordered(self) -> bool:
+        """Whether the operation respects the configured dependencies between services."""
+        return self.command in ("restart", "start", "stop")
+
+    @property
+    def reverse(self) -> bool:
+        """Whether services are handled before the services they depend on."""
+        return self.command == "stop"
+
+    @property
+    def running(self) -> t.Optional[bool]:
+        """Whether services run after the operation, or `None` if the operation does not start or stop services."""
+        if self.command in ("restart", "start"):
+            return True
+
+        return False if self.command == "stop" else None
+
+    def satisfied(self, result: batch.Result) -> bool:
+        """Check whether a failed operation still left a service in the runtime state the services ordered after it
+        need, because it was already started (start) or stopped (stop).
+
+        :param result: The failed result.
+        """
+        if self.command not in ("start", "stop") or result.error is None:
+            return False
+
+        return launchctl.is_already_booted(result.error, self.command == "start")
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Convert the operation to a JSON-serializable dictionary."""
+        return self._asdict()  # pylint: disable=no-member
+
+
+def run(
+    services: t.Sequence[Service],
+    operation: Operation,
+    jobs: int = batch.DEFAULT_JOBS,
+    dependencies: t.Optional[t.Mapping[Service, t.Iterable[Service]]] = None,
+) -> t.Iterator[batch.Result]:
+    """Run an operation on services (see `service.batch.run`), respecting dependencies if the operation is ordered.
+
+    When the operation waits, failures are yielded as operations complete and successes once every service is running
+    or has exited; a service that does not reach its state in time fails.
+
+    :param services: The services to operate on.
+    :param operation: The operation.
+    :param jobs: The maximum number of services to change at the same time.
+    :param dependencies: The services each service depends on.
+
+    :raises ValueError: When `jobs` is less than 1 or the dependencies contain a cycle.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from .status import snapshot, wait
+
+    running = operation.running if operation.wait is not None else None
+    previous = None
+
+    if running and operation.command == "restart":
+        # a restarted service is running again once its process ID changes
+        try:
+            previous = snapshot()
+        except RuntimeError as exc:
+            logger.debug("Waiting for restarted services to run: %s", exc)
+
+    changed = []
+
+    for result in batch.run(
+        services,
+        operation,
+        jobs,
+        dependencies if operation.ordered else None,
+        reverse=operation.reverse,
+        satisfied=operation.satisfied,
+    ):
+        if result.ok and running is not None:
+            changed.append(result)
+        else:
+            yield result
+
+    if not changed:
+        return
+
+    try:
+        pending = set(wait([result.service for result in changed], running, operation.wait, previous))  # type: ignore
+        error = None
+    except RuntimeError as exc:
+        pending = {result.service for result in changed}
+        error = exc
+
+    for result in changed:
+        if result.service not in pending:
+            yield result
+        else:
+            yield batch.Result(
+                result.service,
+                error or RuntimeError(f"Timed out waiting for {result.service.name} to {operation.command}"),
+                duration=result.duration,
+            )
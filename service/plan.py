@@ -0,0 +1,320 @@
+"""
+service.plan
+
+Compile a sequence of operations on services into the fewest launchctl calls that reach the same result.
+"""
+
+from __future__ import annotations
+import functools
+import logging
+import re
+import shlex
+import typing as t
+
+from . import batch
+from .operations import COMMANDS, Operation
+
+if t.TYPE_CHECKING:
+    from .service import Service
+
+
+__all__ = ["Action", "compile_plan", "parse_step", "Plan", "run", "Step"]
+
+
+STEP_PATTERN = re.compile(r"^\s*([a-z]+)(?:\s*:\s*|\s+)(\S.*?)\s*$")
+
+
+logger = logging.getLogger(__name__)
+
+
+class Step(t.NamedTuple):
+    """An operation requested for a service.
+
+    :param command: The command name; one of `service.operations.COMMANDS`.
+    :param service: The service.
+    """
+
+    command: str
+    service: Service
+
+
+class Action(t.NamedTuple):
+    """The compiled operations on a single service.
+
+    :param service: The service.
+    :param commands: The commands to run, in order; empty when the service is already in the requested state.
+    :param strategy: The strategy to restart the service with (see `service.launchctl.restart`).
+    :param reason: Why commands were left out, if any were.
+    """
+
+    service: Service
+    commands: tuple[str, ...]
+    strategy: str = "kickstart"
+    reason: t.Optional[str] = None
+
+    def __call__(self, service: Service) -> t.Optional[str]:
+        """Run the commands on a service.
+
+        :param service: The service.
+
+        :returns: The strategy used to restart the service, if it was restarted.
+
+        :raises RuntimeError: When a command fails; the remaining commands are not run.
+        """
+        value = None
+
+        for command in self.commands:
+            value = Operation(command, strategy=self.strategy)(service) or value
+
+        return value
+
+    @property
+    def calls(self) -> list[tuple[str, ...]]:
+        """The launchctl arguments for each call the commands make, when no restart strategy falls back."""
+        service = self.service
+        calls: list[tuple[str, ...]] = []
+
+        for command in self.commands:
+            if command in ("enable", "disable"):
+                calls.append((command, service.id))
+            elif command == "start":
+                calls.append(("bootstrap", service.domain, service.file))
+            elif command == "stop":
+                calls.append(("bootout", service.domain, service.file))
+            elif self.strategy == "reload":
+                calls.extend([("bootout", service.domain, service.file), ("bootstrap", service.domain, service.file)])
+            elif self.strategy == "signal" and service.metadata.keep_alive:
+                calls.append(("kill", "TERM", service.id))
+            else:
+                calls.append(("kickstart", "-k", service.id))
+
+        return calls
+
+    @property
+    def message(self) -> str:
+        """The message reported when the commands succeed; formatted with the service name."""
+        if not self.commands:
+            return "%s unchanged"
+
+        return "%s " + " and ".join(Operation(command).message.removeprefix("%s ") for command in self.commands)
+
+    def satisfied(self, result: batch.Result) -> bool:
+        """Check whether failed commands still left a service in the runtime state the services ordered after it need
+        (see `service.operations.Operation.satisfied`).
+
+        :param result: The failed result.
+        """
+        return any(Operation(command).satisfied(result) for command in self.commands)
+
+    @property
+    def stopping(self) -> bool:
+        """Whether the service is stopped."""
+        return "stop" in self.commands
+
+    def describe(self, result: batch.Result) -> str:
+        """Get the message reported for the outcome of the commands on a service.
+
+        :param result: The result of the commands.
+        """
+        if not result.ok:
+            return str(result.error)
+
+        details = [value for value in [result.value, self.reason] if value]
+
+        return " ".join([self.message % result.service.name, *(f"({detail})" for detail in details)])
+
+
+class Plan(t.NamedTuple):
+    """Compiled operations on services.
+
+    :param actions: The compiled operations on each service, in the order the services were first referenced.
+    :param steps: The number of steps the plan was compiled from.
+    """
+
+    actions: list[Action]
+    steps: int
+
+    @property
+    def calls(self) -> int:
+        """The number of launchctl calls the plan makes, when no restart strategy falls back."""
+        return sum(len(action.calls) for action in self.actions)
+
+    def format(self) -> t.Iterator[str]:
+        """Format the plan as launchctl command lines, with a comment for each service that is left unchanged."""
+        for action in self.actions:
+            if not action.commands:
+                yield f"# {action.service.name} unchanged ({action.reason})"
+
+            for call in action.calls:
+                yield shlex.join(["launchctl", *call])
+
+        yield f"# {self.steps} steps, {self.calls} launchctl calls"
+
+
+def compile_plan(
+    steps: t.Iterable[Step],
+    strategy: str = "kickstart",
+    loaded: t.Optional[t.Container[str]] = None,
+    enabled: t.Optional[t.Mapping[str, bool]] = None,
+) -> Plan:
+    """Compile operations on services into the fewest commands for each service.
+
+    The steps for each service are combined into at most one runtime change and one state change:
+
+    - The last of "enable" and "disable" wins, and duplicates are removed.
+    - "stop" wins over earlier runtime changes; "start" after "stop" or "restart" becomes "restart", as does "restart"
+      after "start" or "stop". A single `launchctl kickstart` replaces `bootout` and `bootstrap`.
+    - The state change runs before the runtime change if it was requested before it, and after it otherwise, so "start"
+      with "enable" enables first and "stop" with "disable" disables last.
+
+    When the current state is known, commands that would not change it are left out: "start" for a loaded service,
+    "stop" for a service that is not loaded, and "enable" or "disable" for a service known to be in that state.
+
+    :param steps: The operations, in the order they were requested.
+    :param strategy: The strategy to restart services with.
+    :param loaded: The labels of the loaded services.
+    :param enabled: Whether each service is enabled, by label; services that are not included are not known.
+
+    :raises ValueError: When a command is unknown.
+    """
+    commands: dict[str, list[str]] = {}
+    services: dict[str, Service] = {}
+    count = 0
+
+    for step in steps:
+        if step.command not in COMMANDS:
+            raise ValueError(f'Unknown command "{step.command}"')
+
+        services.setdefault(step.service.file, step.service)
+        commands.setdefault(step.service.file, []).append(step.command)
+        count += 1
+
+    actions = [
+        _compile(services[file], file_commands, strategy, loaded, enabled) for file, file_commands in commands.items()
+    ]
+    logger.debug("Compiled %s steps for %s services", count, len(actions))
+
+    return Plan(actions, count)
+
+
+def parse_step(text: str) -> tuple[str, str]:
+    """Parse a step written as "COMMAND:NAME" or "COMMAND NAME".
+
+    :param text: The step.
+
+    :returns: The command and the service reference.
+
+    :raises ValueError: When the step cannot be parsed or the command is unknown.
+    """
+    match = STEP_PATTERN.match(text)
+
+    if match is None:
+        raise ValueError(f'Invalid step "{text}"')
+
+    command, reference = match.groups()
+
+    if command not in COMMANDS:
+        raise ValueError(f'Unknown command "{command}" in step "{text}"')
+
+    return command, reference
+
+
+def run(
+    plan: Plan, jobs: int = batch.DEFAULT_JOBS, dependencies: t.Optional[t.Mapping[Service, t.Iterable[Service]]] = None
+) -> t.Iterator[tuple[Action, batch.Result]]:
+    """Run a plan (see `service.batch.run`).
+
+    Services that are stopped are handled first, in reverse dependency order, and then the remaining services in
+    dependency order.
+
+    :param plan: The plan.
+    :param jobs: The maximum number of services to change at the same time.
+    :param dependencies: The services each service depends on.
+
+    :returns: The action and its result, for each service as it completes.
+
+    :raises ValueError: When `jobs` is less than 1 or the dependencies contain a cycle.
+    """
+    for stopping in [True, False]:
+        actions = {action.service: action for action in plan.actions if action.stopping == stopping}
+
+        for result in batch.run(
+            list(actions),
+            functools.partial(_call, actions),
+            jobs,
+            dependencies,
+            reverse=stopping,
+            satisfied=functools.partial(_satisfied, actions),
+        ):
+            yield actions[result.service], result
+
+
+def _call(actions: dict[Service, Action], service: Service) -> t.Optional[str]:
+    """Run the action for a service.
+
+    :param actions: The actions, by service.
+    :param service: The service.
+
+    :returns: The strategy used to restart the service, if it was restarted.
+
+    :raises RuntimeError: When a command fails.
+    """
+    return actions[service](service)
+
+
+def _satisfied(actions: dict[Service, Action], result: batch.Result) -> bool:
+    """Check whether the failed action for a service still satisfies the services ordered after it (see
+    `Action.satisfied`).
+
+    :param actions: The actions, by service.
+    :param result: The failed result.
+    """
+    return actions[result.service].satisfied(result)
+
+
+def _compile(
+    service: Service,
+    commands: list[str],
+    strategy: str,
+    loaded: t.Optional[t.Container[str]],
+    enabled: t.Optional[t.Mapping[str, bool]],
+) -> Action:
+    """Compile the commands for a single service.
+
+    :param service: The service.
+    :param commands: The commands, in the order they were requested.
+    :param strategy: The strategy to restart the service with.
+    :param loaded: The labels of the loaded services.
+    :param enabled: Whether each service is enabled, by label.
+    """
+    runtime = state = None
+    state_first = False
+    skipped = []
+
+    for command in commands:
+        if command in ("enable", "disable"):
+            state = command
+            state_first = False
+        else:
+            if command == "stop":
+                runtime = "stop"
+            elif command == "start" and runtime in (None, "start"):
+                runtime = "start"
+            else:
+                runtime = "restart"
+
+            state_first = state is not None
+
+    if state is not None and enabled is not None and enabled.get(service.label) == (state == "enable"):
+        skipped.append(f"already {state}d")
+        state = None
+
+    if runtime in ("start", "stop") and loaded is not None and (runtime == "start") == (service.label in loaded):
+        skipped.append("already started" if runtime == "start" else "already stopped")
+        runtime = None
+
+    ordered = [state, runtime] if state_first else [runtime, state]
+
+    return Action(
+        service, tuple(command for command in ordered if command is not None), strategy, ", ".join(skipped) or None
+    )
@@ -0,0 +1,153 @@
+"""
+service.resolver
+
+Resolve service names without a reverse domain to service files.
+"""
+
+from __future__ import annotations
+import functools
+import logging
+import os
+from pathlib import Path
+import typing as t
+
+if t.TYPE_CHECKING:
+    from .index import ServiceIndex
+
+
+__all__ = ["get_resolver", "list_files", "Resolver"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class Resolver:
+    """Resolve service names without a reverse domain to service files.
+
+    The reverse domains are compiled into a prefix tree of name segments, and each service directory is listed once
+    into a map from the name without its reverse domain to the matching service files, so the cost of resolving a name
+    does not grow with the number of reverse domains. A directory is listed again when it changes, as recorded by the
+    index when one is used.
+
+    :param reverse_domains: The reverse domains service names can be given without.
+    """
+
+    def __init__(self, reverse_domains: t.Iterable[str]):
+        self._trie: dict[str, t.Any] = {}
+        self._directories: dict[Path, tuple[tuple[int, int], dict[str, list[tuple[str, str]]]]] = {}
+
+        for reverse_domain in reverse_domains:
+            node = self._trie
+
+            for segment in reverse_domain.split("."):
+                node = node.setdefault(segment, {})
+
+            node[""] = reverse_domain
+
+    def resolve(self, name: str, directories: list[Path], index: t.Optional[ServiceIndex] = None) -> list[Path]:
+        """Get the service files for a service name without a reverse domain.
+
+        :param name: The service name, without reverse domain or file extension.
+        :param directories: The service directories to search.
+        :param index: An optional index of the service directories to list them with.
+
+        :returns: The service files with the name in any reverse domain, ordered by directory.
+
+        :raises ValueError: When services with the name exist in more than one reverse domain.
+        """
+        matches = [
+            (reverse_domain, directory.joinpath(file_name))
+            for directory in directories
+            for reverse_domain, file_name in self._get_names(directory, index).get(name, [])
+        ]
+        reverse_domains = sorted({reverse_domain for reverse_domain, _ in matches})
+
+        if len(reverse_domains) > 1:
+            full_names = ", ".join(f"{reverse_domain}.{name}" for reverse_domain in reverse_domains)
+            raise ValueError(f'Service "{name}" is ambiguous: {full_names}')
+
+        return [file_path for _, file_path in matches]
+
+    def short_names(self, name: str) -> t.Iterator[tuple[str, str]]:
+        """Get the service name without each reverse domain it starts with.
+
+        :param name: The full service name.
+
+        :returns: The reverse domain and the name without it.
+        """
+        node = self._trie
+        position = 0
+
+        for segment in name.split(".")[:-1]:
+            node = node.get(segment)
+
+            if node is None:
+                return
+
+            position += len(segment) + 1
+
+            if "" in node:
+                yield node[""], name[position:]
+
+    def _get_names(self, directory: Path, index: t.Optional[ServiceIndex]) -> dict[str, list[tuple[str, str]]]:
+        """Get the service files in a directory keyed by the names without their reverse domains.
+
+        :param directory: The service directory.
+        :param index: An optional index of the service directories to list the directory with.
+        """
+        if index is not None:
+            index.refresh([directory])
+            key = index.key(directory)
+        else:
+            try:
+                stat = directory.stat()
+                key = (stat.st_ino, stat.st_mtime_ns)
+            except OSError:
+                key = None
+
+        if key is None:
+            return {}
+
+        cached = self._directories.get(directory)
+
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        logger.debug('Mapping service names in "%s"', directory)
+        file_names = list_files(directory, index)
+
+        names: dict[str, list[tuple[str, str]]] = {}
+
+        for file_name in sorted(file_names):
+            for reverse_domain, short_name in self.short_names(file_name[: -len(".plist")]):
+                names.setdefault(short_name, []).append((reverse_domain, file_name))
+
+        self._directories[directory] = (key, names)
+
+        return names
+
+
+@functools.lru_cache(maxsize=8)
+def get_resolver(reverse_domains: tuple[str, ...]) -> Resolver:
+    """Get the resolver for a set of reverse domains, compiling it the first time.
+
+    :param reverse_domains: The reverse domains.
+    """
+    return Resolver(reverse_domains)
+
+
+def list_files(directory: Path, index: t.Optional[ServiceIndex] = None) -> t.Iterable[str]:
+    """List the service file names in a directory.
+
+    :param directory: The service directory.
+    :param index: An optional index of the service directories.
+    """
+    if index is not None:
+        return index.files(directory)
+
+    try:
+        with os.scandir(directory) as entries:
+            return [entry.name for entry in entries if entry.name.endswith(".plist")]
+    except OSError as exc:
+        logger.debug('Cannot list "%s": %s', directory, exc)
+        return []
@@ -0,0 +1,51 @@
+"""
+service.retry
+
+Retry policies for launchctl commands that fail transiently.
+"""
+
+from __future__ import annotations
+import random
+import types
+import typing as t
+
+
+__all__ = ["RetryPolicy"]
+
+
+WILDCARD = "*"
+
+
+class RetryPolicy(t.NamedTuple):
+    """When and how often to retry a failed launchctl command.
+
+    A command is retried when its return code is classified as transient for its subcommand, or for all subcommands
+    with the `WILDCARD` key. The delay before each retry doubles from `delay` up to `max_delay`, with random jitter so
+    commands that failed together are not retried together. The default policy does not retry.
+
+    :param attempts: The maximum number of times to run a command, including the first attempt.
+    :param delay: The number of seconds to wait before the first retry.
+    :param max_delay: The maximum number of seconds to wait before a retry.
+    :param codes: The transient return codes, keyed by launchctl subcommand.
+    """
+
+    attempts: int = 1
+    delay: float = 0.1
+    max_delay: float = 2.0
+    codes: t.Mapping[str, frozenset[int]] = types.MappingProxyType({})
+
+    def delays(self) -> t.Iterator[float]:
+        """Get the delay before each retry."""
+        delay = self.delay
+
+        for _ in range(self.attempts - 1):
+            yield random.uniform(delay / 2, delay)
+            delay = min(self.max_delay, delay * 2)
+
+    def is_transient(self, subcommand: str, returncode: int) -> bool:
+        """Check whether a failure is transient.
+
+        :param subcommand: The launchctl subcommand.
+        :param returncode: The launchctl return code.
+        """
+        return returncode in self.codes.get(subcommand, ()) or returncode in self.codes.get(WILDCARD, ())
@@ -0,0 +1,628 @@
+"""
+service.runner
+
+Resolve the target services of a command and run operations on them, with the daemon, on other hosts or in this process.
+
+The options that affect every command are stored on `ctx.meta` by the command-line interface (see `service.cli`).
+"""
+
+# pylint: disable=import-outside-toplevel
+
+from __future__ import annotations
+import collections
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+import typing as t
+
+import click
+
+from . import batch
+from .cache import get_cache_dir
+from .config import Config
+
+if t.TYPE_CHECKING:
+    from .daemon import Client
+    from .index import ServiceIndex
+    from .operations import Operation
+    from .plan import Plan, Step
+    from .service import Service
+    from .users import User
+
+
+__all__ = [
+    "compile_plan",
+    "connect_daemon",
+    "get_services",
+    "load_index",
+    "report_results",
+    "request_daemon",
+    "resolve_references",
+    "run_batch",
+    "run_plan",
+    "use_local_launchctl",
+]
+
+
+META_ALL_USERS = f"{__package__}.all_users"
+META_CLIENT = f"{__package__}.client"
+META_DOMAIN_LIMITS = f"{__package__}.domain_limits"
+META_DEPENDENCIES = f"{__package__}.dependencies"
+META_EXECUTOR = f"{__package__}.executor"
+META_FAILURES = f"{__package__}.failures"
+META_HOSTS = f"{__package__}.hosts"
+META_IN_FLIGHT = f"{__package__}.in_flight"
+META_JOBS = f"{__package__}.jobs"
+META_MATCH = f"{__package__}.match"
+META_NO_CACHE = f"{__package__}.no_cache"
+META_NO_DAEMON = f"{__package__}.no_daemon"
+META_OUTPUT = f"{__package__}.output"
+META_PROFILE = f"{__package__}.profile"
+META_PROFILE_FILE = f"{__package__}.profile_file"
+META_PROFILE_FORMAT = f"{__package__}.profile_format"
+META_RATE = f"{__package__}.rate"
+META_REQUEST = f"{__package__}.request"
+META_UIDS = f"{__package__}.uids"
+META_USERS = f"{__package__}.users"
+
+# options the daemon cannot apply, since it runs launchctl commands with its own configuration, executor, and limits
+LOCAL_OPTIONS = ("config", "domain_limit", "executor", "in_flight", "rate")
+
+
+logger = logging.getLogger(__package__)
+
+
+def compile_plan(steps: list[Step], strategy: str, changes_only: bool = False) -> Plan:
+    """Compile steps against the current state of the services.
+
+    The current state is read with one `launchctl list` call, and one `launchctl print-disabled` call when services are
+    enabled or disabled. Services that have never been enabled or disabled with launchctl are enabled unless their
+    service file disables them.
+
+    :param steps: The steps.
+    :param strategy: The strategy to restart services with.
+    :param changes_only: Whether to leave out services that are already in the requested state and report how many
+    services are changed.
+
+    :raises click.ClickException: When the current state cannot be read.
+    """
+    from . import plan
+    from .launchctl import DOMAIN_SYS
+    from .status import enabled_states, snapshot
+
+    commands = {step.command for step in steps}
+    enabled = None
+
+    try:
+        loaded = snapshot() if commands & {"start", "stop"} else None
+
+        if steps and steps[0].service.domain == DOMAIN_SYS and commands & {"enable", "disable"}:
+            states = enabled_states()
+            enabled = {
+                step.service.label: states.get(step.service.label, not step.service.metadata.disabled) for step in steps
+            }
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc)) from exc
+
+    compiled = plan.compile_plan(steps, strategy, loaded, enabled)
+
+    if changes_only:
+        actions = [action for action in compiled.actions if action.commands]
+        logger.info("%s of %s services differ from the desired state", len(actions), len(compiled.actions))
+        compiled = plan.Plan(actions, compiled.steps)
+
+    return compiled
+
+
+def connect_daemon(ctx: click.Context) -> t.Optional[Client]:
+    """Connect to a running daemon.
+
+    The daemon is not used when `--no-daemon` or `--hosts` is passed, since the daemon only changes services on this
+    machine, or when any of `LOCAL_OPTIONS` is passed, since the daemon uses the configuration, executor, and limits it
+    was started with. With `--output jsonl` the daemon is not used either, since it replies once every service is
+    changed and the records could not be streamed as each service completes.
+
+    :param ctx: The current click execution context.
+
+    :returns: The client, or `None` when the daemon is not used or not running.
+    """
+    from click.core import ParameterSource
+
+    root = ctx.find_root()
+
+    if (
+        ctx.meta.get(META_NO_DAEMON)
+        or ctx.meta.get(META_HOSTS)
+        or ctx.meta.get(META_OUTPUT) == "jsonl"
+        or any(root.get_parameter_source(name) == ParameterSource.COMMANDLINE for name in LOCAL_OPTIONS)
+    ):
+        return None
+
+    from .daemon import Client, get_socket_file
+
+    client = Client.connect(get_socket_file())
+
+    if client is not None:
+        logger.debug("Using the daemon")
+        ctx.call_on_close(client.close)
+
+    return client
+
+
+def get_services(
+    ctx: click.Context, param: click.Parameter, value: tuple[str, ...]  # pylint: disable=unused-argument
+) -> None:
+    """Get the target services and store them on `ctx.obj`.
+
+    Service references containing shell-style wildcards and the `--match` regular expressions are resolved together
+    with a single pass over the service directories. Services that cannot be located and patterns that do not match
+    any service are reported and counted as failures so the remaining services are still processed.
+
+    When a daemon is running the references are not resolved; they are sent to the daemon with the command instead,
+    with relative paths made absolute since the daemon runs in another directory, and with `--jobs` and `--no-cache`.
+
+    With `--all-users` or `--uid`, the references are resolved in the gui domain of each user, without the daemon or
+    the service index.
+
+    :param ctx: The current click execution context.
+    :param param: The parameter that triggered the callback.
+    :param value: The parameter value.
+
+    :raises click.UsageError: When no services are referenced or a regular expression is invalid.
+    """
+    expressions = ctx.meta.get(META_MATCH) or ()
+
+    if not value and not expressions:
+        raise click.UsageError("Missing argument 'NAMES...' or option '--match'.", ctx)
+
+    users = _get_users(ctx)
+    client = connect_daemon(ctx) if users is None else None
+
+    if client is not None:
+        ctx.meta[META_CLIENT] = client
+        ctx.meta[META_REQUEST] = _get_daemon_request(ctx, value, expressions)
+        ctx.obj = []
+        return
+
+    from .index import get_index_file, ServiceIndex
+
+    index = None if ctx.meta.get(META_NO_CACHE) or users is not None else ServiceIndex.load(get_index_file())
+    ctx.obj = _resolve_services(ctx, value, expressions, index, users)
+
+
+def load_index(ctx: click.Context) -> t.Optional[ServiceIndex]:
+    """Load the service index, unless disabled with `--no-cache`.
+
+    :param ctx: The current click execution context.
+    """
+    from .index import get_index_file, ServiceIndex
+
+    return None if ctx.meta.get(META_NO_CACHE) else ServiceIndex.load(get_index_file())
+
+
+def report_results(ctx: click.Context, results: t.Iterable[tuple[str, dict[str, t.Any]]]) -> None:
+    """Report the result for each service as it completes.
+
+    With `--output jsonl`, the record of each operation is written to stdout as a JSON line, flushed as soon as the
+    operation completes, instead of logging the message.
+
+    The program exits with a non-zero status when any service failed or could not be located.
+
+    :param ctx: The current click execution context.
+    :param results: The message to report and the record of the operation (see `service.batch.Result.to_dict`), for
+    each service.
+    """
+    jsonl = ctx.meta.get(META_OUTPUT) == "jsonl"
+    failures = ctx.meta.get(META_FAILURES, 0)
+    total = failures
+
+    for message, record in results:
+        total += 1
+
+        if not record["ok"]:
+            failures += 1
+
+        if jsonl:
+            click.echo(json.dumps(record))
+        elif record["ok"]:
+            logger.info(message)
+        else:
+            logger.error(message)
+
+    if failures:
+        if total > 1:
+            logger.error("%s of %s services failed", failures, total)
+
+        ctx.exit(1)
+
+
+def request_daemon(ctx: click.Context, request: dict[str, t.Any]) -> t.Optional[dict[str, t.Any]]:
+    """Send a command for the target services to the daemon, if the services are handled by the daemon.
+
+    Services the daemon could not resolve are reported and counted as failures.
+
+    :param ctx: The current click execution context.
+    :param request: The command and its options.
+
+    :returns: The response, or `None` when the daemon is not used.
+
+    :raises click.ClickException: When the daemon rejects the request.
+    """
+    client = ctx.meta.get(META_CLIENT)
+
+    if client is None:
+        return None
+
+    response = client.request({**request, **ctx.meta[META_REQUEST]})
+
+    if "error" in response:
+        raise click.ClickException(response["error"])
+
+    for error in response["errors"]:
+        logger.error(error)
+
+    ctx.meta[META_FAILURES] = len(response["errors"])
+
+    return response
+
+
+def resolve_references(
+    ctx: click.Context, config: Config, index: t.Optional[ServiceIndex], references: t.Iterable[str]
+) -> dict[str, list[Service]]:
+    """Resolve service references one at a time, so the services of each reference are known.
+
+    References that cannot be resolved are reported and counted as failures.
+
+    :param ctx: The current click execution context.
+    :param config: The program configuration.
+    :param index: An optional index of the service directories.
+    :param references: The service references (see `service.selector.resolve`).
+
+    :returns: The services for each reference.
+
+    :raises click.UsageError: When a reference is invalid.
+    """
+    from .domain import get_context
+    from .selector import resolve
+
+    context = get_context()
+    resolved: dict[str, list[Service]] = {}
+
+    for reference in references:
+        if reference in resolved:
+            continue
+
+        try:
+            resolved[reference], errors = resolve([reference], (), config.reverse_domains, index, context)
+        except ValueError as exc:
+            raise click.UsageError(str(exc), ctx) from exc
+
+        for error in errors:
+            logger.error(error)
+
+        ctx.meta[META_FAILURES] = ctx.meta.get(META_FAILURES, 0) + len(errors)
+
+    _save_caches(index)
+
+    return resolved
+
+
+def run_batch(services: list[Service], operation: Operation) -> None:
+    """Run an operation on all target services and report the result for each service.
+
+    The program exits with a non-zero status when the operation fails for any service or any service could not be
+    located.
+
+    :param services: The services to operate on.
+    :param operation: The operation.
+    """
+    ctx = click.get_current_context()
+
+    if ctx.meta.get(META_USERS) is not None and operation.wait is not None:
+        raise click.UsageError("--wait cannot be used with --all-users or --uid.", ctx)
+
+    response = request_daemon(ctx, operation.to_dict())
+
+    if response is not None:
+        results = [(result["message"], result["record"]) for result in response["results"]]
+    elif ctx.meta.get(META_HOSTS):
+        results = _run_hosts(ctx, services, operation)
+    else:
+        results = _run_local(ctx, services, operation)
+
+    report_results(ctx, results)
+
+
+def run_plan(
+    ctx: click.Context, config: Config, index: t.Optional[ServiceIndex], compiled: Plan, dry_run: bool
+) -> None:
+    """Run a plan or print it.
+
+    :param ctx: The current click execution context.
+    :param config: The program configuration.
+    :param index: An optional index of the service directories.
+    :param compiled: The plan.
+    :param dry_run: Whether to print the launchctl calls instead of running them.
+    """
+    from . import plan
+    from .selector import resolve_dependencies
+
+    if dry_run:
+        for line in compiled.format():
+            click.echo(line)
+
+        return
+
+    services = [action.service for action in compiled.actions]
+    dependencies = resolve_dependencies(services, config, index) if config.dependencies and len(services) > 1 else None
+    jobs = use_local_launchctl(ctx, len(services))
+    report_results(
+        ctx,
+        (
+            (action.describe(result), result.to_dict("+".join(action.commands)))
+            for action, result in plan.run(compiled, jobs, dependencies)
+        ),
+    )
+
+
+def use_local_launchctl(ctx: click.Context, size: int) -> int:
+    """Configure launchctl commands run in this process with the retry policy, limits, journal, and executor for the
+    program.
+
+    :param ctx: The current click execution context.
+    :param size: The number of services that will be changed.
+
+    :returns: The maximum number of services to change at the same time.
+    """
+    from . import launchctl
+    from .executor import SessionExecutor
+
+    jobs = ctx.meta.get(META_JOBS, batch.DEFAULT_JOBS)
+    config = ctx.find_object(Config) or Config()
+    ctx.call_on_close(functools.partial(launchctl.set_retry_policy, launchctl.set_retry_policy(config.retry)))
+    _use_limits(ctx, config)
+    _use_journal(ctx, config)
+
+    if ctx.meta.get(META_EXECUTOR) == "session":
+        executor = SessionExecutor(size=min(jobs, size or 1))
+        ctx.call_on_close(executor.close)
+        ctx.call_on_close(functools.partial(launchctl.set_executor, launchctl.set_executor(executor)))
+
+    return jobs
+
+
+def _get_daemon_request(
+    ctx: click.Context, references: t.Sequence[str], expressions: t.Sequence[str]
+) -> dict[str, t.Any]:
+    """Get the part of a daemon request that selects the target services.
+
+    References with a path are made absolute, since the daemon runs in another directory.
+
+    :param ctx: The current click execution context.
+    :param references: The service references.
+    :param expressions: The regular expressions.
+    """
+    from click.core import ParameterSource
+
+    from .selector import is_pattern
+
+    request: dict[str, t.Any] = {
+        "names": [
+            name if is_pattern(name) or len(Path(name).parts) < 2 else str(Path(name).expanduser().absolute())
+            for name in references
+        ],
+        "match": list(expressions),
+    }
+
+    if ctx.find_root().get_parameter_source("jobs") == ParameterSource.COMMANDLINE:
+        request["jobs"] = ctx.meta[META_JOBS]
+
+    if ctx.meta.get(META_NO_CACHE):
+        request["no_cache"] = True
+
+    return request
+
+
+def _get_users(ctx: click.Context) -> t.Optional[list[User]]:
+    """Get the users targeted with `--all-users` or `--uid` and store their names on `ctx.meta`.
+
+    :param ctx: The current click execution context.
+
+    :returns: The users, or `None` when services are changed in the active domain.
+
+    :raises click.UsageError: When a user ID is unknown, or other users are targeted without root privileges.
+    """
+    from .users import get_users
+
+    uids = ctx.meta.get(META_UIDS) or None
+
+    if not ctx.meta.get(META_ALL_USERS) and uids is None:
+        return None
+
+    if ctx.meta.get(META_HOSTS):
+        raise click.UsageError("--all-users and --uid cannot be used with --hosts.", ctx)
+
+    if os.geteuid() != 0 and (uids is None or set(uids) != {os.geteuid()}):
+        raise click.UsageError("Changing the services of other users requires root privileges.", ctx)
+
+    try:
+        users = get_users(uids, ctx.meta.get(META_JOBS, batch.DEFAULT_JOBS))
+    except ValueError as exc:
+        raise click.UsageError(str(exc), ctx) from exc
+
+    logger.debug("Targeting %s users", len(users))
+    ctx.meta[META_USERS] = {user.uid: user.name for user in users}
+
+    return users
+
+
+def _resolve_services(
+    ctx: click.Context,
+    references: t.Sequence[str],
+    expressions: t.Sequence[str],
+    index: t.Optional[ServiceIndex],
+    users: t.Optional[list[User]],
+) -> list[Service]:
+    """Resolve the target services in the active domain, or in the gui domain of each user.
+
+    Services that cannot be resolved are reported and counted as failures, and the dependencies between the services
+    are stored on `ctx.meta`.
+
+    :param ctx: The current click execution context.
+    :param references: The service references.
+    :param expressions: The regular expressions.
+    :param index: An optional index of the service directories.
+    :param users: The targeted users, or `None` for the active domain.
+
+    :raises click.UsageError: When a regular expression is invalid.
+    """
+    from .selector import resolve, resolve_dependencies
+
+    config = ctx.find_object(Config) or Config()
+    services: list[Service] = []
+    dependencies: dict[Service, list[Service]] = {}
+    ctx.meta[META_FAILURES] = 0
+
+    for user in users or [None]:
+        try:
+            found, errors = resolve(references, expressions, config.reverse_domains, index, user and user.context)
+        except ValueError as exc:
+            raise click.UsageError(str(exc), ctx) from exc
+
+        for error in errors:
+            logger.error(error if user is None else f"{user.name}: {error}")
+
+        if config.dependencies and len(found) > 1:
+            dependencies.update(resolve_dependencies(found, config, index))
+
+        services.extend(found)
+        ctx.meta[META_FAILURES] += len(errors)
+
+    if dependencies:
+        ctx.meta[META_DEPENDENCIES] = dependencies
+
+    _save_caches(index)
+
+    return services
+
+
+def _run_hosts(
+    ctx: click.Context, services: list[Service], operation: Operation
+) -> t.Iterator[tuple[str, dict[str, t.Any]]]:
+    """Run an operation on the target services on every host passed with `--hosts`.
+
+    :param ctx: The current click execution context.
+    :param services: The services to operate on.
+    :param operation: The operation.
+
+    :returns: The message to report and the record of the operation, for each service on each host as it completes
+    (see `service.hosts.run`).
+    """
+    from . import hosts
+    from .transport import get_transport
+
+    jobs = use_local_launchctl(ctx, 0)
+    transports = [get_transport(host) for host in ctx.meta[META_HOSTS]]
+
+    for host, result in hosts.run(transports, services, operation, jobs, ctx.meta.get(META_DEPENDENCIES)):
+        yield f"{host}: {operation.describe(result)}", {"host": host, **result.to_dict(operation.command)}
+
+
+def _run_local(
+    ctx: click.Context, services: list[Service], operation: Operation
+) -> t.Iterator[tuple[str, dict[str, t.Any]]]:
+    """Run an operation on the target services in this process.
+
+    :param ctx: The current click execution context.
+    :param services: The services to operate on.
+    :param operation: The operation.
+
+    :returns: The message to report and the record of the operation, for each service as it completes (see
+    `service.operations.run`). When several users are targeted, the results are grouped by user, except with
+    `--output jsonl`, since each record includes the domain.
+    """
+    from . import operations
+
+    jobs = use_local_launchctl(ctx, len(services))
+    results = operations.run(services, operation, jobs, ctx.meta.get(META_DEPENDENCIES))
+    users = ctx.meta.get(META_USERS)
+
+    if users is None or ctx.meta.get(META_OUTPUT) == "jsonl":
+        for result in results:
+            yield operation.describe(result), result.to_dict(operation.command)
+
+        return
+
+    # report the results of each user together, as soon as every service of the user is done
+    pending = collections.Counter(service.context.uid for service in services)
+    groups: dict[t.Optional[int], list[tuple[str, dict[str, t.Any]]]] = {}
+
+    for result in results:
+        uid = result.service.context.uid
+        groups.setdefault(uid, []).append(
+            (f"{users[uid]}: {operation.describe(result)}", result.to_dict(operation.command))
+        )
+        pending[uid] -= 1
+
+        if not pending[uid]:
+            yield from groups.pop(uid)
+
+
+def _save_caches(index: t.Optional[ServiceIndex]) -> None:
+    """Persist the service index and the metadata cache after resolving services.
+
+    :param index: The index of the service directories, if used.
+    """
+    from . import metadata
+
+    if index is not None:
+        index.save()
+
+    metadata.save()
+
+
+def _use_journal(ctx: click.Context, config: Config) -> None:
+    """Record the launchctl commands run in this process that change services in the journal, unless disabled in the
+    configuration. Recorded changes are written before the program exits.
+
+    :param ctx: The current click execution context.
+    :param config: The program configuration.
+    """
+    if not config.journal.enabled:
+        return
+
+    from . import launchctl
+    from .domain import get_context
+    from .journal import get_journal_dir, Journal
+
+    journal = Journal(get_journal_dir(get_context()), config.journal)
+    ctx.call_on_close(journal.close)
+    ctx.call_on_close(functools.partial(launchctl.set_journal, launchctl.set_journal(journal)))
+
+
+def _use_limits(ctx: click.Context, config: Config) -> None:
+    """Schedule the launchctl commands run in this process with the limits from the configuration and the options.
+
+    :param ctx: The current click execution context.
+    :param config: The program configuration.
+    """
+    from . import launchctl
+    from .limits import Limiter
+
+    limits = config.limits
+
+    if ctx.meta.get(META_RATE) is not None:
+        limits = limits._replace(rate=ctx.meta[META_RATE])
+
+    if ctx.meta.get(META_IN_FLIGHT) is not None:
+        limits = limits._replace(in_flight=ctx.meta[META_IN_FLIGHT])
+
+    if ctx.meta.get(META_DOMAIN_LIMITS):
+        limits = limits._replace(domains={**limits.domains, **ctx.meta[META_DOMAIN_LIMITS]})
+
+    if limits.enabled:
+        logger.debug("Limiting changes: %s", limits)
+        limiter = Limiter(limits, get_cache_dir() / "limits")
+        ctx.call_on_close(functools.partial(launchctl.set_limiter, launchctl.set_limiter(limiter)))
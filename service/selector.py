@@ -0,0 +1,246 @@
+"""
+service.selector
+
+Resolve service references, shell-style patterns, and regular expressions to services.
+"""
+
+from __future__ import annotations
+import fnmatch
+import logging
+import re
+import typing as t
+
+from .domain import DomainContext, get_context
+from .resolver import get_resolver, list_files
+from .service import get_paths, locate, Service
+from .timing import timed
+
+if t.TYPE_CHECKING:
+    from .config import Config
+    from .index import ServiceIndex
+
+
+__all__ = ["is_pattern", "resolve", "resolve_dependencies", "select", "Selector"]
+
+
+PATTERN_CHARS = frozenset("*?[")
+
+
+logger = logging.getLogger(__name__)
+
+
+class Selector:  # pylint: disable=too-few-public-methods
+    """Match service names against shell-style patterns and regular expressions.
+
+    Patterns are matched against the full service name and, like service names passed to `locate`, against the name
+    without any of the configured reverse domains; e.g., with the reverse domain "com.acme", "worker.*" matches
+    "com.acme.worker.a". Regular expressions are searched for anywhere in the full service name.
+
+    All patterns and expressions are compiled into a single expression, and names are split with the compiled resolver
+    for the reverse domains, so the cost of matching a name does not grow with the number of reverse domains.
+
+    :param patterns: Shell-style patterns.
+    :param expressions: Regular expressions.
+    :param reverse_domains: The reverse domains to strip from service names.
+
+    :raises ValueError: When a regular expression is invalid.
+    """
+
+    def __init__(
+        self, patterns: t.Iterable[str] = (), expressions: t.Iterable[str] = (), reverse_domains: t.Iterable[str] = ()
+    ):
+        self._full = _compile([fnmatch.translate(pattern) for pattern in patterns])
+        self._search = _compile(expressions)
+        self._resolver = get_resolver(tuple(reverse_domains))
+
+    def matches(self, name: str) -> bool:
+        """Check whether a service name matches any pattern or expression.
+
+        :param name: The service name.
+        """
+        if self._search is not None and self._search.search(name):
+            return True
+
+        if self._full is None:
+            return False
+
+        if self._full.match(name):
+            return True
+
+        return any(self._full.match(short_name) for _, short_name in self._resolver.short_names(name))
+
+
+def is_pattern(name: str) -> bool:
+    """Check whether a service reference is a shell-style pattern.
+
+    :param name: The service reference.
+    """
+    return not PATTERN_CHARS.isdisjoint(name)
+
+
+def resolve(
+    references: t.Sequence[str],
+    expressions: t.Sequence[str] = (),
+    reverse_domains: t.Sequence[str] = (),
+    index: t.Optional[ServiceIndex] = None,
+    context: t.Optional[DomainContext] = None,
+) -> tuple[list[Service], list[str]]:
+    """Resolve service references and regular expressions to services.
+
+    References are located individually, except references containing shell-style wildcards, which are resolved
+    together with the regular expressions in a single pass over the service directories. Each service is returned once,
+    in the order it was first referenced.
+
+    :param references: Service references (see `locate`) and shell-style patterns.
+    :param expressions: Regular expressions.
+    :param reverse_domains: A list of reverse domains to prepend to service names.
+    :param index: An optional index of the service directories.
+    :param context: The domain to resolve services in; the active domain if not provided.
+
+    :returns: The services and an error message for each reference or expression that could not be resolved.
+
+    :raises ValueError: When a regular expression is invalid.
+    """
+    context = context or get_context()
+    patterns = [reference.removesuffix(".plist") for reference in references if is_pattern(reference)]
+    selector = Selector(patterns, expressions, reverse_domains) if patterns or expressions else None
+    services: list[Service] = []
+    errors: list[str] = []
+
+    for reference in references:
+        if not is_pattern(reference):
+            try:
+                services.append(locate(reference, list(reverse_domains), index, context))
+            except (RuntimeError, ValueError) as exc:
+                errors.append(str(exc))
+
+    if selector is None:
+        return _unique(services), errors
+
+    try:
+        selected = select(selector, index, context)
+    except ValueError as exc:
+        return _unique(services), [*errors, str(exc)]
+
+    singles = [(pattern, Selector([pattern], reverse_domains=reverse_domains)) for pattern in patterns]
+    singles.extend((expression, Selector(expressions=[expression])) for expression in expressions)
+
+    for reference, single in singles:
+        if not any(single.matches(service.name) for service in selected):
+            errors.append(f'No services match "{reference}"')
+
+    return _unique([*services, *selected]), errors
+
+
+def resolve_dependencies(
+    services: list[Service], config: Config, index: t.Optional[ServiceIndex]
+) -> dict[Service, list[Service]]:
+    """Resolve the configured dependencies between the target services.
+
+    Configured services are located in the domain of the first target service. Configured services that cannot be
+    located or are not targeted are ignored.
+
+    :param services: The target services.
+    :param config: The program configuration.
+    :param index: An optional index of the service directories.
+    """
+    targets = {service.file: service for service in services}
+    context = services[0].context if services else None
+    resolved: dict[str, t.Optional[Service]] = {}
+
+    def locate_target(name: str) -> t.Optional[Service]:
+        if name not in resolved:
+            try:
+                resolved[name] = targets.get(locate(name, config.reverse_domains, index, context).file)
+            except (RuntimeError, ValueError) as exc:
+                logger.debug('Ignoring dependency "%s": %s', name, exc)
+                resolved[name] = None
+
+        return resolved[name]
+
+    dependencies: dict[Service, list[Service]] = {}
+
+    for name, names in config.dependencies.items():
+        service = locate_target(name)
+
+        if service is not None:
+            dependencies.setdefault(service, []).extend(d for d in map(locate_target, names) if d is not None)
+
+    return dependencies
+
+
+@timed("select")
+def select(
+    selector: Selector, index: t.Optional[ServiceIndex] = None, context: t.Optional[DomainContext] = None
+) -> list[Service]:
+    """Select the valid services in a domain that match a selector.
+
+    Each service directory is read once, with one `os.scandir` pass or from the index; service files are not probed
+    individually. Services that fail validation (e.g., macOS system services) are skipped.
+
+    :param selector: The selector to match service names with.
+    :param index: An optional index of the service directories.
+    :param context: The domain; the active domain if not provided.
+
+    :raises ValueError: When no service paths are found.
+    """
+    context = context or get_context()
+    directories = get_paths(context)
+    services = []
+
+    if index is not None:
+        index.refresh(directories)
+
+    for directory in directories:
+        for file_name in sorted(list_files(directory, index)):
+            if not selector.matches(file_name[: -len(".plist")]):
+                continue
+
+            service = Service(directory.joinpath(file_name), context)
+
+            try:
+                service.validate()
+            except RuntimeError as exc:
+                logger.debug("Skipping %s: %s", file_name, exc)
+                continue
+
+            services.append(service)
+
+    logger.debug("Selected %s services", len(services))
+
+    return services
+
+
+def _unique(services: t.Iterable[Service]) -> list[Service]:
+    """Remove repeated services, keeping the first of each service file; different references (e.g., a name and a
+    label) can resolve to the same service file.
+
+    :param services: The services.
+    """
+    unique: dict[str, Service] = {}
+
+    for service in services:
+        unique.setdefault(service.file, service)
+
+    return list(unique.values())
+
+
+def _compile(expressions: t.Iterable[str]) -> t.Optional[re.Pattern]:
+    """Compile regular expressions into a single expression that matches any of them.
+
+    :param expressions: The regular expressions.
+
+    :raises ValueError: When an expression is invalid.
+    """
+    compiled = []
+
+    for expression in expressions:
+        try:
+            compiled.append(re.compile(expression).pattern)
+        except re.error as exc:
+            raise ValueError(f'Invalid regular expression "{expression}": {exc}') from exc
+
+    if not compiled:
+        return None
+
+    return re.compile("|".join(f"(?:{expression})" for expression in compiled))
@@ -4,14 +4,23 @@ service.service
 MacOS System and GUI domain services.
 """
 
+from __future__ import annotations
 import logging
 import os
 from pathlib import Path
+import typing as t
 
-from . import launchctl
+from . import metadata as _metadata
+from .domain import DomainContext, get_context
+from .resolver import get_resolver
+from .timing import timed
 
+if t.TYPE_CHECKING:
+    from .index import ServiceIndex
+    from .metadata import Metadata
 
-__all__ = ["locate", "Service"]
+
+__all__ = ["discover", "locate", "Service"]
 
 
 logger = logging.getLogger(__name__)
@@ -20,70 +29,153 @@ logger = logging.getLogger(__name__)
 class Service:
     """A LaunchAgent or LaunchDaemon service.
 
+    The domain, file, and name are derived when the service is created; the label and ID are derived on first use,
+    since they require reading the service file.
+
     :param path: The path to the service file.
+    :param context: The domain of the service; the active domain if not provided.
     """
 
-    def __init__(self, path: Path):
+    __slots__ = ("_context", "_domain", "_file", "_id", "_metadata", "_name", "_path")
+
+    def __init__(self, path: Path, context: t.Optional[DomainContext] = None):
         self._path = path
+        self._context = context or get_context()
+        self._domain = self._context.target
+        self._file = str(path.absolute())
+        self._name = path.stem
+        self._id: t.Optional[str] = None
+        self._metadata: t.Optional[Metadata] = None
+
+    @property
+    def context(self) -> DomainContext:
+        """The domain of the service."""
+        return self._context
 
     @property
     def domain(self) -> str:
         """The service domain."""
-        return launchctl.DOMAIN_SYS if os.getenv("SUDO_USER") else f"{launchctl.DOMAIN_GUI}/{os.geteuid()}"
+        return self._domain
 
     @property
     def file(self) -> str:
         """The absolute path to the service file."""
-        return str(self._path.absolute())
+        return self._file
 
     @property
     def id(self) -> str:
-        """The service ID in the system domain."""
-        return "/".join([self.domain, self.name]) if os.getenv("SUDO_USER") else ""
+        """The service target, e.g., "system/com.foo.xserv" or "gui/501/com.foo.xserv"."""
+        if self._id is None:
+            self._id = f"{self._domain}/{self.label}"
+
+        return self._id
+
+    @property
+    def label(self) -> str:
+        """The service label, or the service name if the service file does not define a label."""
+        return self.metadata.label or self._name
+
+    @property
+    def metadata(self) -> Metadata:
+        """The metadata from the service file, read on first use."""
+        if self._metadata is None:
+            self._metadata = _metadata.read(self._path)
+
+        return self._metadata
 
     @property
     def name(self) -> str:
         """The service name (service file name without extension)."""
-        return self._path.stem
+        return self._name
 
     @property
     def path(self) -> Path:
         """The path to the service file."""
         return self._path
 
+    @timed("validate")
     def validate(self) -> None:
         """Validate the service.
 
-        A service is considered valid if it is part of the active domain and is not a macOS system service.
+        A service is considered valid if it is part of its domain and is not a macOS system service.
 
         :raises RuntimeError: When the service is not valid.
         """
-        if self.domain == launchctl.DOMAIN_SYS:
-            if self.file.startswith("/System"):
-                raise RuntimeError(f"{self.name} is a macOS system service")
+        if self._context.is_system:
+            if self._file.startswith("/System"):
+                raise RuntimeError(f"{self._name} is a macOS system service")
 
-            if self.file.startswith("/Users"):
-                raise RuntimeError(f"{self.name} is not in the {self.domain} domain")
+            if self._file.startswith("/Users"):
+                raise RuntimeError(f"{self._name} is not in the {self._domain} domain")
         else:
-            if not self.file.startswith("/Users"):
-                raise RuntimeError(f"{self.name} is not in the {self.domain} domain")
+            if not self._file.startswith("/Users"):
+                raise RuntimeError(f"{self._name} is not in the {self._domain} domain")
+
+
+def discover(context: t.Optional[DomainContext] = None) -> list[Service]:
+    """Find all valid services in a domain.
 
+    Each service directory is listed once; services that fail validation (e.g., macOS system services) are skipped.
 
-def locate(name: str, reverse_domains: list[str]) -> Service:
+    :param context: The domain; the active domain if not provided.
+
+    :raises ValueError: When no service paths are found.
+    """
+    logger.debug("Discovering services")
+    context = context or get_context()
+    services = []
+
+    for service_path in get_paths(context):
+        try:
+            with os.scandir(service_path) as entries:
+                file_names = sorted(entry.name for entry in entries if entry.name.endswith(".plist"))
+        except OSError as exc:
+            logger.debug('Cannot list "%s": %s', service_path, exc)
+            continue
+
+        for file_name in file_names:
+            service = Service(service_path.joinpath(file_name), context)
+
+            try:
+                service.validate()
+            except RuntimeError:
+                continue
+
+            services.append(service)
+
+    return services
+
+
+@timed("locate")
+def locate(
+    name: str,
+    reverse_domains: list[str],
+    index: t.Optional[ServiceIndex] = None,
+    context: t.Optional[DomainContext] = None,
+) -> Service:
     """Locate a service.
 
     If an absolute or relative path is part of `name` that path is used to find the service. If a path is not present
     all directories containing services for the current domain will be searched.
 
+    A name without a reverse domain is resolved with the compiled resolver for the reverse domains (see
+    `service.resolver.Resolver`), so the cost does not grow with the number of reverse domains.
+
+    When an index is provided, the index is refreshed first, which costs one stat per service directory, so a service
+    file added to a directory that is searched earlier is never hidden by an indexed file in a later directory. Only
+    the service files recorded in the index are then probed.
+
     :param name: The service name, with optional absolute/relative path and file extension.
     :param reverse_domains: A list of reverse domains to prepend to the service name.
+    :param index: An optional index of the service directories.
+    :param context: The domain to search; the active domain if not provided.
 
-    :raises ValueError: When a service is not found or a service name without path and/or domain is provided and there
-    no reverse domains are configured.
+    :raises ValueError: When a service is not found, a service name without path and/or domain is provided and there
+    no reverse domains are configured, or a service name without domain matches services in several reverse domains.
     """
     logger.debug('Locating service "%s"', name)
+    context = context or get_context()
     original_name = name
-    service_path = None
 
     if not name.endswith(".plist"):
         name = f"{name}.plist"
@@ -95,28 +187,26 @@ def locate(name: str, reverse_domains: list[str]) -> Service:
     if len(path.parts) > 1:
         file_paths = [path.expanduser().absolute()]
     else:
-        if len(path.suffixes) > 1:
-            file_names = [path.name]
-        else:
-            if reverse_domains:
-                file_names = [f"{rd}.{path.name}" for rd in reverse_domains]
-            else:
-                raise ValueError("No reverse domains configured")
+        if len(path.suffixes) == 1 and not reverse_domains:
+            raise ValueError("No reverse domains configured")
 
-        file_paths = [p.joinpath(n) for p in get_paths() for n in file_names]
+        service_paths = get_paths(context)
 
-    for file_path in file_paths:
-        logger.debug('Trying "%s"', file_path)
+        if len(path.suffixes) == 1:
+            file_paths = get_resolver(tuple(reverse_domains)).resolve(path.stem, service_paths, index)
+        elif index is None:
+            file_paths = [p.joinpath(path.name) for p in service_paths]
+        else:
+            index.refresh(service_paths)
+            file_paths = index.candidates(service_paths, [path.name])
 
-        if file_path.is_file():
-            service_path = file_path
-            break
+    service_path = _probe(file_paths)
 
     if not service_path:
         raise ValueError(f'Service "{original_name}" not found')
 
     logger.debug('Service found, using "%s"', service_path)
-    service = Service(service_path)
+    service = Service(service_path, context)
 
     logger.debug("Validating service")
     service.validate()
@@ -124,14 +214,31 @@ def locate(name: str, reverse_domains: list[str]) -> Service:
     return service
 
 
-def get_paths() -> list[Path]:
-    """Get service paths for the active domain.
+def _probe(file_paths: list[Path]) -> t.Optional[Path]:
+    """Find the first existing service file.
+
+    :param file_paths: The potential service file paths, in order of preference.
+    """
+    for file_path in file_paths:
+        logger.debug('Trying "%s"', file_path)
+
+        if file_path.is_file():
+            return file_path
+
+    return None
+
+
+@timed("get_paths")
+def get_paths(context: t.Optional[DomainContext] = None) -> list[Path]:
+    """Get service paths for a domain.
+
+    :param context: The domain; the active domain if not provided.
 
     :raises ValueError: When no service paths are found.
     """
     logger.debug("Identifying service paths")
-
-    base_paths = ["/", "/System"] if os.getenv("SUDO_USER") else [Path.home()]
+    context = context or get_context()
+    base_paths = ["/", "/System"] if context.is_system else [context.home or Path.home()]
     service_paths = []
 
     for base in base_paths:
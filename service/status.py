@@ -0,0 +1,235 @@
+"""
+service.status
+
+Report the runtime state of services from a single launchctl snapshot.
+"""
+
+from __future__ import annotations
+import io
+import logging
+import random
+import re
+import time
+import typing as t
+
+from . import launchctl
+from .timing import timed
+
+if t.TYPE_CHECKING:
+    from .service import Service
+
+
+__all__ = ["enabled_states", "ServiceState", "Status", "parse_disabled", "parse_list", "query", "snapshot", "wait"]
+
+
+DISABLED_PATTERN = re.compile(r'^\s*"(?P<label>[^"]+)"\s*=>\s*(?P<state>\w+)')
+INITIAL_DELAY = 0.05
+MAX_DELAY = 1.0
+
+
+logger = logging.getLogger(__name__)
+
+
+class Status(t.NamedTuple):
+    """A loaded service as reported by launchctl.
+
+    :param label: The service label.
+    :param pid: The process ID, if the service is running.
+    :param last_exit_status: The last exit status, if the service has exited.
+    """
+
+    label: str
+    pid: t.Optional[int]
+    last_exit_status: t.Optional[int]
+
+
+class ServiceState(t.NamedTuple):
+    """The runtime state of a service.
+
+    :param service: The service.
+    :param status: The launchctl status, if the service is loaded.
+    """
+
+    service: Service
+    status: t.Optional[Status]
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the service is loaded."""
+        return self.status is not None
+
+    @property
+    def running(self) -> bool:
+        """Whether the service is running."""
+        return self.status is not None and self.status.pid is not None
+
+    @property
+    def state(self) -> str:
+        """A description of the service state."""
+        if self.running:
+            return "running"
+
+        return "loaded" if self.loaded else "unloaded"
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Convert the state to a JSON-serializable dictionary."""
+        return {
+            "name": self.service.name,
+            "label": self.service.label,
+            "path": self.service.file,
+            "domain": self.service.domain,
+            "state": self.state,
+            "pid": self.status.pid if self.status else None,
+            "last_exit_status": self.status.last_exit_status if self.status else None,
+        }
+
+
+def enabled_states(domain: str = launchctl.DOMAIN_SYS) -> dict[str, bool]:
+    """Get whether the services in a domain that have been enabled or disabled are enabled, keyed by label.
+
+    Services that have never been enabled or disabled are not included.
+
+    :param domain: The domain.
+
+    :raises RuntimeError: When the enabled state cannot be listed.
+    """
+    states = dict(parse_disabled(io.StringIO(launchctl.list_disabled(domain))))
+    logger.debug("%s services have an enabled state", len(states))
+
+    return states
+
+
+def parse_disabled(lines: t.Iterable[str]) -> t.Iterator[tuple[str, bool]]:
+    """Parse the output of `launchctl print-disabled`.
+
+    Both the "enabled"/"disabled" and the older "false"/"true" (disabled) forms are supported. Other lines are skipped.
+
+    :param lines: The output lines.
+
+    :returns: The label of each service and whether it is enabled.
+    """
+    for line in lines:
+        match = DISABLED_PATTERN.match(line)
+
+        if match is not None and match["state"] in ("disabled", "enabled", "false", "true"):
+            yield match["label"], match["state"] in ("enabled", "false")
+
+
+def parse_list(lines: t.Iterable[str]) -> t.Iterator[Status]:
+    """Parse the output of `launchctl list`.
+
+    Lines are parsed one at a time so output can be consumed as it is read. The header and malformed lines are skipped.
+
+    :param lines: The output lines.
+    """
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+
+        if len(fields) != 3 or fields[0] == "PID":
+            continue
+
+        pid, last_exit_status, label = fields
+
+        try:
+            yield Status(label, _parse_int(pid), _parse_int(last_exit_status))
+        except ValueError:
+            logger.debug('Skipping malformed launchctl list line "%s"', line.rstrip("\n"))
+
+
+def query(services: t.Iterable[Service], loaded: t.Optional[dict[str, Status]] = None) -> list[ServiceState]:
+    """Get the runtime state of services.
+
+    :param services: The services to query.
+    :param loaded: A snapshot of the loaded services; a new snapshot is taken if not provided.
+
+    :raises RuntimeError: When the loaded services cannot be listed.
+    """
+    if loaded is None:
+        loaded = snapshot()
+
+    return [ServiceState(service, loaded.get(service.label)) for service in services]
+
+
+def snapshot() -> dict[str, Status]:
+    """Take a snapshot of the services loaded in the active domain, keyed by label.
+
+    :raises RuntimeError: When the loaded services cannot be listed.
+    """
+    loaded = {status.label: status for status in parse_list(io.StringIO(launchctl.list_loaded()))}
+    logger.debug("%s services are loaded", len(loaded))
+
+    return loaded
+
+
+@timed("wait")
+def wait(  # pylint: disable=too-many-arguments
+    services: t.Iterable[Service],
+    running: bool,
+    timeout: float,
+    previous: t.Optional[dict[str, Status]] = None,
+    *,
+    initial_delay: float = INITIAL_DELAY,
+    max_delay: float = MAX_DELAY,
+) -> list[Service]:
+    """Wait until services are running (have a process ID) or are not running.
+
+    Every service still being waited on is checked against one snapshot per poll, so the number of launchctl calls does
+    not depend on the number of services. The delay between polls doubles from `initial_delay` up to `max_delay`, with
+    random jitter so many waiting processes do not poll at the same time.
+
+    :param services: The services to wait for.
+    :param running: Whether to wait until the services are running or until they are not running.
+    :param timeout: The maximum number of seconds to wait.
+    :param previous: A snapshot taken before the services were changed; a running service is only ready once its
+    process ID differs from the snapshot (e.g., after a restart).
+    :param initial_delay: The number of seconds to wait after the first poll.
+    :param max_delay: The maximum number of seconds between polls.
+
+    :returns: The services that were not ready before the timeout.
+
+    :raises RuntimeError: When the loaded services cannot be listed.
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(services)
+    delay = initial_delay
+
+    while pending:
+        pending = [state.service for state in query(pending) if not _is_ready(state, running, previous)]
+        remaining = deadline - time.monotonic()
+
+        if not pending or remaining <= 0:
+            break
+
+        logger.debug("Waiting for %s services", len(pending))
+        time.sleep(min(remaining, random.uniform(delay / 2, delay)))
+        delay = min(max_delay, delay * 2)
+
+    return pending
+
+
+def _is_ready(state: ServiceState, running: bool, previous: t.Optional[dict[str, Status]]) -> bool:
+    """Check whether a service has reached the state being waited for.
+
+    :param state: The current service state.
+    :param running: Whether the service should be running.
+    :param previous: A snapshot taken before the service was changed.
+    """
+    if not running:
+        return not state.running
+
+    if not state.running:
+        return False
+
+    before = previous.get(state.service.label) if previous is not None else None
+
+    return before is None or before.pid != state.status.pid  # type: ignore[union-attr]
+
+
+def _parse_int(value: str) -> t.Optional[int]:
+    """Parse an integer field that launchctl reports as "-" when it has no value.
+
+    :param value: The field value.
+
+    :raises ValueError: When the value is not an integer or "-".
+    """
+    return None if value == "-" else int(value)
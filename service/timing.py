@@ -0,0 +1,274 @@
+"""
+service.timing
+
+Timing spans for the operations on the path of every command.
+
+Spans are only recorded while a recorder is enabled; when disabled, `span` returns a shared no-op context manager and
+`timed` calls the wrapped function directly, so instrumented code pays for little more than a global lookup.
+"""
+
+from __future__ import annotations
+import contextlib
+import functools
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import time
+import typing as t
+
+
+__all__ = ["Recorder", "Span", "disable", "enable", "get_recorder", "span", "timed", "write_jsonl", "write_prometheus"]
+
+
+PROMETHEUS_METRIC = f"{__package__}_span_seconds"
+
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+class Span(t.NamedTuple):
+    """A timed operation.
+
+    :param name: The operation name.
+    :param start: The wall clock time the operation started.
+    :param duration: The duration of the operation in seconds.
+    :param attributes: Details of the operation (e.g., the launchctl subcommand and return code).
+    """
+
+    name: str
+    start: float
+    duration: float
+    attributes: dict[str, t.Any]
+
+    @property
+    def key(self) -> str:
+        """The name and attributes of the span, used to group spans of the same kind."""
+        if not self.attributes:
+            return self.name
+
+        return f"{self.name} {' '.join(f'{key}={value}' for key, value in sorted(self.attributes.items()))}"
+
+
+class Recorder:
+    """Collect spans from all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: list[Span] = []
+
+    def record(self, name: str, start: float, duration: float, attributes: dict[str, t.Any]) -> None:
+        """Record a span.
+
+        :param name: The operation name.
+        :param start: The wall clock time the operation started.
+        :param duration: The duration of the operation in seconds.
+        :param attributes: Details of the operation.
+        """
+        with self._lock:
+            self.spans.append(Span(name, start, duration, attributes))
+
+    def summary(self) -> dict[str, tuple[int, float, float]]:
+        """Summarize the spans by name and attributes.
+
+        :returns: The count, total duration, and maximum duration of each kind of span, in the order first recorded.
+        """
+        summary: dict[str, tuple[int, float, float]] = {}
+
+        for item in self.snapshot():
+            count, total, maximum = summary.get(item.key, (0, 0.0, 0.0))
+            summary[item.key] = (count + 1, total + item.duration, max(maximum, item.duration))
+
+        return summary
+
+    def snapshot(self) -> list[Span]:
+        """Get a copy of the spans recorded so far."""
+        with self._lock:
+            return list(self.spans)
+
+
+class _Span:
+    """A context manager that records a span when it exits.
+
+    Attributes added with `set` while the span is open are recorded with the span.
+    """
+
+    __slots__ = ("_attributes", "_name", "_recorder", "_start", "_started")
+
+    def __init__(self, recorder: Recorder, name: str, attributes: dict[str, t.Any]):
+        self._recorder = recorder
+        self._name = name
+        self._attributes = attributes
+        self._start = 0.0
+        self._started = 0.0
+
+    def __enter__(self) -> _Span:
+        self._start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self._recorder.record(self._name, self._start, time.perf_counter() - self._started, self._attributes)
+
+    def set(self, **attributes: t.Any) -> None:
+        """Add attributes to the span.
+
+        :param attributes: The attributes to add.
+        """
+        self._attributes.update(attributes)
+
+
+class _NullSpan:
+    """A span that records nothing, used while timing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        return None
+
+    def set(self, **attributes: t.Any) -> None:
+        """Ignore attributes.
+
+        :param attributes: The attributes to ignore.
+        """
+
+
+_NULL_SPAN = _NullSpan()
+_recorder: t.Optional[Recorder] = None  # pylint: disable=invalid-name
+
+
+def disable() -> t.Optional[Recorder]:
+    """Stop recording spans.
+
+    :returns: The recorder that was enabled, if any.
+    """
+    global _recorder  # pylint: disable=global-statement
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def enable() -> Recorder:
+    """Start recording spans with a new recorder.
+
+    :returns: The new recorder.
+    """
+    global _recorder  # pylint: disable=global-statement
+    _recorder = Recorder()
+    return _recorder
+
+
+def get_recorder() -> t.Optional[Recorder]:
+    """Get the enabled recorder, if any."""
+    return _recorder
+
+
+def span(name: str, **attributes: t.Any) -> t.Union[_Span, _NullSpan]:
+    """Time a block of code.
+
+    :param name: The operation name.
+    :param attributes: Details of the operation.
+    """
+    if _recorder is None:
+        return _NULL_SPAN
+
+    return _Span(_recorder, name, attributes)
+
+
+def timed(name: str) -> t.Callable[[F], F]:
+    """Time every call of a function.
+
+    :param name: The operation name.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            if _recorder is None:
+                return func(*args, **kwargs)
+
+            with _Span(_recorder, name, {}):
+                return func(*args, **kwargs)
+
+        return t.cast(F, wrapper)
+
+    return decorator
+
+
+def write_jsonl(recorder: Recorder, file: Path, **context: t.Any) -> None:
+    """Append the recorded spans to a JSON lines file.
+
+    All spans are appended with a single write so concurrent processes do not interleave lines.
+
+    :param recorder: The recorder.
+    :param file: The file to append to.
+    :param context: Fields added to every line (e.g., the command).
+    """
+    lines = [
+        json.dumps({**context, "name": item.name, "start": item.start, "duration": item.duration, **item.attributes})
+        for item in recorder.snapshot()
+    ]
+
+    if lines:
+        file.parent.mkdir(parents=True, exist_ok=True)
+
+        with file.open("a", encoding="utf8") as handle:
+            handle.write("\n".join(lines) + "\n")
+
+
+def write_prometheus(recorder: Recorder, file: Path) -> None:
+    """Add the recorded spans to a Prometheus textfile.
+
+    The file holds the total duration and count of each kind of span across all runs. It is updated under an exclusive
+    lock and replaced atomically so it can be read by the node exporter textfile collector at any time.
+
+    :param recorder: The recorder.
+    :param file: The textfile to update.
+    """
+    import fcntl  # pylint: disable=import-outside-toplevel
+
+    samples: dict[str, float] = {}
+
+    for item in recorder.snapshot():
+        labels = ",".join(
+            f'{key}="{_escape_label(str(value))}"'
+            for key, value in [("span", item.name), *sorted(item.attributes.items())]
+        )
+
+        for name, value in [
+            (f"{PROMETHEUS_METRIC}_sum{{{labels}}}", item.duration),
+            (f"{PROMETHEUS_METRIC}_count{{{labels}}}", 1),
+        ]:
+            samples[name] = samples.get(name, 0.0) + value
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+
+    with file.with_name(f"{file.name}.lock").open("w", encoding="utf8") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        with contextlib.suppress(OSError):
+            for line in file.read_text(encoding="utf8").splitlines():
+                match = re.match(r"^(\S+\{.*\}) (\S+)$", line)
+
+                if match:
+                    samples[match.group(1)] = samples.get(match.group(1), 0.0) + float(match.group(2))
+
+        lines = [
+            f"# HELP {PROMETHEUS_METRIC} Time spent in {__package__} operations.",
+            f"# TYPE {PROMETHEUS_METRIC} summary",
+            *(f"{name} {value!r}" for name, value in sorted(samples.items())),
+        ]
+        tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        tmp_file.write_text("\n".join(lines) + "\n", encoding="utf8")
+        tmp_file.replace(file)
+
+
+def _escape_label(value: str) -> str:
+    """Escape a Prometheus label value.
+
+    :param value: The label value.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,188 @@
+"""
+service.transport
+
+Transports that start the helper processes of a session executor on a host.
+"""
+
+import abc
+import logging
+from pathlib import Path
+import shlex
+import shutil
+import subprocess
+import tempfile
+import typing as t
+
+
+__all__ = ["LocalTransport", "SSHTransport", "TRANSPORTS", "Transport", "get_transport"]
+
+
+CONNECT_TIMEOUT = 10
+MAX_SESSIONS = 10
+SERVER_ALIVE_COUNT_MAX = 3
+SERVER_ALIVE_INTERVAL = 15
+
+
+logger = logging.getLogger(__name__)
+
+
+class Transport(abc.ABC):
+    """Base class for transports.
+
+    A transport turns a command into a local command that runs it on the host, e.g., through an SSH connection. The
+    connection is opened once and shared by every command until the transport is closed.
+
+    :param host: The host name.
+    """
+
+    max_sessions: t.Optional[int] = None
+    """The maximum number of commands that can run on the host at the same time, or `None` if there is no limit."""
+
+    def __init__(self, host: str):
+        self._host = host
+
+    def __enter__(self) -> "Transport":
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.close()
+
+    @property
+    def host(self) -> str:
+        """The host name."""
+        return self._host
+
+    def close(self) -> None:
+        """Close the connection to the host."""
+
+    @abc.abstractmethod
+    def command(self, cmd: list[str]) -> list[str]:
+        """Get the local command that runs a command on the host.
+
+        :param cmd: The command and its arguments.
+        """
+
+    def open(self) -> None:
+        """Open the connection to the host.
+
+        :raises RuntimeError: When the host cannot be reached.
+        """
+
+
+class LocalTransport(Transport):
+    """Run commands on this machine; a stand-in for a remote host (e.g., with a fake launchctl program).
+
+    :param host: The name to report for the host.
+    """
+
+    def __init__(self, host: str = "localhost"):
+        super().__init__(host)
+
+    def command(self, cmd: list[str]) -> list[str]:
+        return list(cmd)
+
+
+class SSHTransport(Transport):
+    """Run commands on a host over a single multiplexed SSH connection.
+
+    Opening the transport starts an SSH control master, so the host is authenticated once and every command runs in a
+    new session over the same connection. SSH is run in batch mode, so keys or an agent must be set up for the host.
+    The connection is closed when the host stops answering keepalive messages, and at most `MAX_SESSIONS` commands
+    run at the same time, the default `MaxSessions` of sshd.
+
+    :param host: The host, as accepted by ssh (e.g., "user@host" or a name from the SSH configuration).
+    :param program: The ssh program to run.
+    """
+
+    max_sessions = MAX_SESSIONS
+
+    def __init__(self, host: str, program: str = "ssh"):
+        super().__init__(host)
+        self._program = program
+        self._dir: t.Optional[Path] = None
+
+    def close(self) -> None:
+        if self._dir is None:
+            return
+
+        subprocess.run(
+            [self._program, *self._options(), "-O", "exit", self._host],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        shutil.rmtree(self._dir, ignore_errors=True)
+        self._dir = None
+        logger.debug('Closed the SSH connection to "%s"', self._host)
+
+    def command(self, cmd: list[str]) -> list[str]:
+        if self._dir is None:
+            raise RuntimeError(f'The SSH connection to "{self._host}" is not open')
+
+        return [self._program, "-T", *self._options(), "-o", "ControlMaster=no", self._host, shlex.join(cmd)]
+
+    def open(self) -> None:
+        if self._dir is not None:
+            return
+
+        self._dir = Path(tempfile.mkdtemp(prefix=f"{__package__}-"))
+        log = self._dir / "ssh.log"
+
+        # the master forks into the background once authenticated and keeps its output open, so it goes to a file
+        with log.open("wb") as stderr:
+            result = subprocess.run(
+                [self._program, *self._options(), "-o", "ControlMaster=yes", "-o", "ControlPersist=yes", "-N", "-f"]
+                + [self._host],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=stderr,
+                check=False,
+            )
+
+        if result.returncode:
+            reason = log.read_text(encoding="utf8", errors="replace").strip().splitlines()
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+            raise RuntimeError(f'Cannot connect to "{self._host}"{f": {reason[-1]}" if reason else ""}')
+
+        logger.debug('Opened an SSH connection to "%s"', self._host)
+
+    def _options(self) -> list[str]:
+        """Get the options for every ssh call."""
+        return [
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            f"ConnectTimeout={CONNECT_TIMEOUT}",
+            "-o",
+            f"ServerAliveInterval={SERVER_ALIVE_INTERVAL}",
+            "-o",
+            f"ServerAliveCountMax={SERVER_ALIVE_COUNT_MAX}",
+            "-o",
+            f"ControlPath={self._dir}/master",
+        ]
+
+
+TRANSPORTS: dict[str, t.Callable[[str], Transport]] = {"local": LocalTransport, "ssh": SSHTransport}
+
+
+def get_transport(spec: str) -> Transport:
+    """Create the transport for a host.
+
+    :param spec: The host, written as "[TRANSPORT://]HOST"; one of `TRANSPORTS`, SSH by default.
+
+    :raises ValueError: When the transport is unknown or the host is missing.
+    """
+    scheme, separator, host = spec.partition("://")
+
+    if not separator:
+        scheme, host = "ssh", spec
+
+    if scheme not in TRANSPORTS:
+        raise ValueError(f'Unknown transport "{scheme}" for host "{spec}"')
+
+    if not host:
+        raise ValueError(f'Invalid host "{spec}"')
+
+    return TRANSPORTS[scheme](host)
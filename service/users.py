@@ -0,0 +1,83 @@
+"""
+service.users
+
+The users whose gui domains are targeted when services are changed for several users at once.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from pathlib import Path
+import pwd
+import typing as t
+
+from . import batch, launchctl
+from .domain import DomainContext
+
+
+__all__ = ["User", "get_users"]
+
+
+MIN_UID = 501
+
+
+logger = logging.getLogger(__name__)
+
+
+class User(t.NamedTuple):
+    """A user account.
+
+    :param name: The user name.
+    :param uid: The user ID.
+    :param home: The home directory.
+    """
+
+    name: str
+    uid: int
+    home: Path
+
+    @property
+    def context(self) -> DomainContext:
+        """The gui domain of the user."""
+        return DomainContext(self.uid, self.home)
+
+
+def get_users(uids: t.Optional[t.Iterable[int]] = None, jobs: int = batch.DEFAULT_JOBS) -> list[User]:
+    """Get the users to target, ordered by user ID.
+
+    Without user IDs, every user that is logged in is targeted; a user is logged in when their gui domain exists. The
+    domains of the user accounts (user ID 501 and above) are checked concurrently.
+
+    :param uids: The user IDs of the users to target.
+    :param jobs: The maximum number of domains to check at the same time.
+
+    :raises ValueError: When a user ID does not belong to a user account.
+    """
+    if uids is not None:
+        users = {}
+
+        for uid in uids:
+            try:
+                users[uid] = _user(pwd.getpwuid(uid))
+            except KeyError as exc:
+                raise ValueError(f"Unknown user ID {uid}") from exc
+
+        return sorted(users.values(), key=lambda user: user.uid)
+
+    accounts = {entry.pw_uid: _user(entry) for entry in pwd.getpwall() if entry.pw_uid >= MIN_UID}
+    candidates = sorted(accounts.values(), key=lambda user: user.uid)
+
+    logger.debug("Checking the gui domains of %s users", len(candidates))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        exists = list(pool.map(lambda user: launchctl.domain_exists(user.context.target), candidates))
+
+    return [user for user, logged_in in zip(candidates, exists) if logged_in]
+
+
+def _user(entry: pwd.struct_passwd) -> User:
+    """Create a user from a password database entry.
+
+    :param entry: The entry.
+    """
+    return User(entry.pw_name, entry.pw_uid, Path(entry.pw_dir))
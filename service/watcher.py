@@ -0,0 +1,495 @@
+"""
+service.watcher
+
+Watch service directories for service files being added, removed, and changed.
+
+Backends:
+
+- `InotifyWatcher` (Linux) receives an event for each changed file from inotify.
+- `KqueueWatcher` (macOS and BSD) is woken by kqueue when a directory changes and compares it to its last listing.
+- `PollingWatcher` compares every directory to its last listing at an interval.
+
+Changes are applied to an index and the metadata cache with `apply`.
+"""
+
+from __future__ import annotations
+import abc
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+import typing as t
+
+from . import metadata
+
+if t.TYPE_CHECKING:
+    from .index import ServiceIndex
+
+
+__all__ = [
+    "ADDED",
+    "MODIFIED",
+    "RESCAN",
+    "REMOVED",
+    "apply",
+    "Change",
+    "get_watcher",
+    "InotifyWatcher",
+    "KqueueWatcher",
+    "PollingWatcher",
+    "Watcher",
+]
+
+
+ADDED = "added"
+MODIFIED = "modified"
+REMOVED = "removed"
+RESCAN = "rescan"
+
+POLL_INTERVAL = 1.0
+RESCAN_INTERVAL = 5.0
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+KQ_NOTE_REMOVED = getattr(select, "KQ_NOTE_DELETE", 0) | getattr(select, "KQ_NOTE_RENAME", 0)
+
+
+logger = logging.getLogger(__name__)
+
+
+class Change(t.NamedTuple):
+    """A change to a service directory.
+
+    :param directory: The service directory.
+    :param name: The service file name, or an empty string when the whole directory must be scanned again.
+    :param kind: The kind of change; one of `ADDED`, `MODIFIED`, `REMOVED`, or `RESCAN`.
+    """
+
+    directory: Path
+    name: str
+    kind: str
+
+    @property
+    def path(self) -> Path:
+        """The changed service file."""
+        return self.directory.joinpath(self.name)
+
+
+class Watcher(abc.ABC):
+    """Base class for service directory watchers.
+
+    :param directories: The service directories to watch.
+    """
+
+    def __init__(self, directories: t.Iterable[Path]):
+        self._directories = list(directories)
+
+    def __enter__(self) -> Watcher:
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.close()
+
+    @property
+    def directories(self) -> list[Path]:
+        """The watched service directories."""
+        return self._directories
+
+    @property
+    def watched(self) -> list[Path]:
+        """The service directories whose changes are reported now; a directory that is removed is left out until it is
+        created again and the watcher notices it."""
+        return self._directories
+
+    def close(self) -> None:
+        """Stop watching and release any resources held by the watcher."""
+
+    @abc.abstractmethod
+    def read(self, timeout: t.Optional[float] = None) -> list[Change]:
+        """Wait for changes to the service files.
+
+        Changes to the same file are combined, so each file is reported at most once per call.
+
+        :param timeout: The maximum number of seconds to wait; wait until there is a change if `None`.
+
+        :returns: The changes, or an empty list if there were none before the timeout.
+        """
+
+
+class InotifyWatcher(Watcher):
+    """Watch service directories with inotify (Linux).
+
+    :param directories: The service directories to watch.
+
+    :raises OSError: When inotify is not available.
+    """
+
+    def __init__(self, directories: t.Iterable[Path]):
+        super().__init__(directories)
+        self._libc = _get_libc()
+
+        if self._libc is None or not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Cannot initialize inotify")
+
+        self._watches: dict[int, Path] = {}
+
+        for directory in self._directories:
+            self._add_watch(directory)
+
+    @property
+    def watched(self) -> list[Path]:
+        return [directory for directory in self._directories if directory in self._watches.values()]
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def read(self, timeout: t.Optional[float] = None) -> list[Change]:
+        changes: dict[tuple[Path, str], Change] = {}
+
+        # a removed directory is watched again, and scanned, once it is created again
+        for directory in self._directories:
+            if directory not in self._watches.values() and directory.is_dir() and self._add_watch(directory):
+                _combine(changes, Change(directory, "", RESCAN))
+
+        if not select.select([self._fd], [], [], 0 if changes else timeout)[0]:
+            return list(changes.values())
+
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            for change in self._parse(data):
+                _combine(changes, change)
+
+        return list(changes.values())
+
+    def _add_watch(self, directory: Path) -> bool:
+        """Watch a directory.
+
+        :param directory: The directory.
+
+        :returns: Whether the directory is watched.
+        """
+        descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), INOTIFY_MASK)  # type: ignore
+
+        if descriptor < 0:
+            logger.debug('Cannot watch "%s": %s', directory, os.strerror(ctypes.get_errno()))
+            return False
+
+        self._watches[descriptor] = directory
+        return True
+
+    def _parse(self, data: bytes) -> t.Iterator[Change]:
+        """Parse inotify events.
+
+        :param data: The events read from the inotify file descriptor.
+        """
+        offset = 0
+
+        while offset < len(data):
+            descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.debug("inotify queue overflowed")
+                yield from (Change(directory, "", RESCAN) for directory in self._watches.values())
+                continue
+
+            directory = self._watches.get(descriptor)
+
+            if directory is None:
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self._watches.pop(descriptor, None)
+                yield Change(directory, "", RESCAN)
+            elif name.endswith(".plist"):
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    yield Change(directory, name, ADDED)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    yield Change(directory, name, REMOVED)
+                else:
+                    yield Change(directory, name, MODIFIED)
+
+
+class PollingWatcher(Watcher):
+    """Watch service directories by comparing them to their last listing at an interval.
+
+    :param directories: The service directories to watch.
+    :param interval: The number of seconds between listings.
+    """
+
+    def __init__(self, directories: t.Iterable[Path], interval: float = POLL_INTERVAL):
+        super().__init__(directories)
+        self._interval = interval
+        self._listings = {directory: _list(directory) for directory in self._directories}
+        self._last = time.monotonic()
+
+    def read(self, timeout: t.Optional[float] = None) -> list[Change]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self._last + self._interval - time.monotonic()
+
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+
+            if wait > 0:
+                time.sleep(wait)
+
+            changes = []
+
+            if time.monotonic() >= self._last + self._interval:
+                self._last = time.monotonic()
+                changes = _compare(self._listings, self._directories)
+
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+
+class KqueueWatcher(Watcher):
+    """Watch service directories with kqueue (macOS and BSD).
+
+    kqueue reports that a directory changed but not which file, so a changed directory is compared to its last listing.
+    Files changed in place do not change their directory; every directory is also compared at `rescan_interval`.
+
+    :param directories: The service directories to watch.
+    :param rescan_interval: The number of seconds between comparing every directory.
+
+    :raises OSError: When kqueue is not available.
+    """
+
+    def __init__(self, directories: t.Iterable[Path], rescan_interval: float = RESCAN_INTERVAL):
+        super().__init__(directories)
+
+        if not hasattr(select, "kqueue"):
+            raise OSError(errno.ENOSYS, "kqueue is not available")
+
+        self._kqueue = select.kqueue()  # type: ignore  # pylint: disable=no-member
+        self._rescan_interval = rescan_interval
+        self._last = time.monotonic()
+        self._listings = {directory: _list(directory) for directory in self._directories}
+        self._fds: dict[int, Path] = {}
+
+        for directory in self._directories:
+            self._add_watch(directory)
+
+    @property
+    def watched(self) -> list[Path]:
+        return [directory for directory in self._directories if directory in self._fds.values()]
+
+    def close(self) -> None:
+        for fd in self._fds:
+            os.close(fd)
+
+        self._fds.clear()
+        self._kqueue.close()
+
+    def read(self, timeout: t.Optional[float] = None) -> list[Change]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self._last + self._rescan_interval - time.monotonic()
+
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+
+            events = self._kqueue.control(None, len(self._fds) or 1, max(wait, 0))
+            changed = [self._fds[event.ident] for event in events if event.ident in self._fds]
+
+            # a removed directory is watched again when it is created again, at the latest at the next rescan
+            for event in events:
+                if event.ident in self._fds and event.fflags & KQ_NOTE_REMOVED:
+                    self._fds.pop(event.ident)
+                    os.close(event.ident)
+
+            if time.monotonic() >= self._last + self._rescan_interval:
+                self._last = time.monotonic()
+                changed = self._directories
+
+            changes = _compare(self._listings, list(dict.fromkeys(changed)))
+
+            for directory in changed:
+                if directory not in self._fds.values():
+                    self._add_watch(directory)
+
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+    def _add_watch(self, directory: Path) -> None:
+        """Watch a directory.
+
+        :param directory: The directory.
+        """
+        try:
+            fd = os.open(directory, os.O_RDONLY | getattr(os, "O_EVTONLY", 0))
+        except OSError as exc:
+            logger.debug('Cannot watch "%s": %s', directory, exc)
+            return
+
+        # kqueue is only available on BSD and macOS
+        # pylint: disable=no-member
+        event = select.kevent(  # type: ignore
+            fd,
+            filter=select.KQ_FILTER_VNODE,  # type: ignore
+            flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,  # type: ignore
+            fflags=select.KQ_NOTE_WRITE | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME,  # type: ignore
+        )
+        # pylint: enable=no-member
+        self._kqueue.control([event], 0, 0)
+        self._fds[fd] = directory
+
+
+def apply(changes: t.Iterable[Change], index: t.Optional[ServiceIndex] = None) -> None:
+    """Apply changes to an index and discard the cached metadata of the changed service files.
+
+    :param changes: The changes.
+    :param index: The index to update.
+    """
+    updates: dict[Path, tuple[set[str], set[str]]] = {}
+
+    for change in changes:
+        logger.debug('Service file %s: "%s"', change.kind, change.path)
+
+        if change.kind == RESCAN:
+            if index is not None:
+                index.scan(change.directory)
+
+            continue
+
+        metadata.invalidate(change.path)
+
+        if change.kind != MODIFIED:
+            added, removed = updates.setdefault(change.directory, (set(), set()))
+            (added if change.kind == ADDED else removed).add(change.name)
+
+    if index is not None:
+        for directory, (added, removed) in updates.items():
+            index.update(directory, added - removed, removed - added)
+
+
+def get_watcher(directories: t.Iterable[Path]) -> Watcher:
+    """Get the most efficient watcher available on this platform.
+
+    :param directories: The service directories to watch.
+    """
+    for backend in [InotifyWatcher, KqueueWatcher] if sys.platform.startswith("linux") else [KqueueWatcher]:
+        try:
+            return backend(directories)
+        except OSError as exc:
+            logger.debug("Cannot use %s: %s", backend.__name__, exc)
+
+    return PollingWatcher(directories)
+
+
+def _combine(changes: dict[tuple[Path, str], Change], change: Change) -> None:
+    """Combine a change with an earlier change to the same file.
+
+    :param changes: The changes so far, keyed by directory and file name.
+    :param change: The new change.
+    """
+    key = (change.directory, change.name)
+    earlier = changes.pop(key, None)
+
+    if earlier is not None and earlier.kind == ADDED and change.kind == MODIFIED:
+        change = earlier
+
+    changes[key] = change
+
+
+def _compare(listings: dict[Path, dict[str, tuple[int, int, int]]], directories: list[Path]) -> list[Change]:
+    """Compare directories to their last listing, and replace the listing.
+
+    :param listings: The last listing of each directory.
+    :param directories: The directories to compare.
+    """
+    changes = []
+
+    for directory in directories:
+        before = listings.get(directory, {})
+        after = _list(directory)
+        listings[directory] = after
+
+        changes.extend(Change(directory, name, REMOVED) for name in sorted(before.keys() - after.keys()))
+
+        for name in sorted(after):
+            if name not in before:
+                changes.append(Change(directory, name, ADDED))
+            elif before[name] != after[name]:
+                changes.append(Change(directory, name, MODIFIED))
+
+    return changes
+
+
+def _get_libc() -> t.Optional[ctypes.CDLL]:
+    """Load the C library."""
+    name = ctypes.util.find_library("c") or "libc.so.6"
+
+    try:
+        return ctypes.CDLL(name, use_errno=True)
+    except OSError as exc:
+        logger.debug('Cannot load "%s": %s', name, exc)
+        return None
+
+
+def _list(directory: Path) -> dict[str, tuple[int, int, int]]:
+    """List the service files in a directory with the inode, size, and modification time of each.
+
+    :param directory: The directory.
+    """
+    files = {}
+
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".plist"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+
+                    files[entry.name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        pass
+
+    return files
@@ -0,0 +1,240 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,protected-access
+
+import asyncio
+from pathlib import Path
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service import aio
+from service.journal import Journal
+from service.launchctl import (
+    DOMAIN_GUI,
+    DOMAIN_SYS,
+    ERROR_SIP,
+    ERROR_SYS_ALREADY_STOPPED,
+    set_journal,
+    set_limiter,
+    set_retry_policy,
+)
+from service.limits import Limiter, Limits
+from service.retry import RetryPolicy
+from service.service import Service
+
+
+@pytest.fixture(name="system_domain")
+def system_domain_fixture(mocker: MockerFixture) -> None:
+    mocker.patch("service.service.os.getenv", return_value="x")
+
+
+def test_locate(mocker: MockerFixture):
+    mock_locate = mocker.patch("service.aio._service.locate", return_value=Service(Path("xserv.plist")))
+
+    result = asyncio.run(aio.locate("xserv", ["com.foo.bar"]))
+
+    assert result is mock_locate.return_value
+    mock_locate.assert_called_once_with("xserv", ["com.foo.bar"], None, None)
+
+
+@pytest.mark.parametrize(
+    "return_code, msg",
+    [
+        (0, None),
+        (ERROR_SYS_ALREADY_STOPPED, "xserv is already stopped"),
+        (ERROR_SIP, "Failed to stop xserv due to SIP"),
+    ],
+)
+def test_boot(monkeypatch: pytest.MonkeyPatch, launchctl: Path, return_code: int, msg: str):
+    monkeypatch.setenv("LAUNCHCTL_RETURNCODE", str(return_code))
+    runner = aio.Runner(program=str(launchctl))
+
+    if msg:
+        with pytest.raises(RuntimeError, match=msg):
+            asyncio.run(aio.boot(Service(Path("xserv.plist")), run=False, runner=runner))
+    else:
+        asyncio.run(aio.boot(Service(Path("xserv.plist")), run=False, runner=runner))
+
+
+@pytest.mark.parametrize("should_fail", [True, False])
+@pytest.mark.usefixtures("system_domain")
+def test_change_state(monkeypatch: pytest.MonkeyPatch, launchctl: Path, should_fail: bool):
+    monkeypatch.setenv("LAUNCHCTL_RETURNCODE", str(int(should_fail)))
+    runner = aio.Runner(program=str(launchctl))
+    service = Service(Path("xserv.plist"))
+
+    if should_fail:
+        with pytest.raises(RuntimeError, match="Failed to enable xserv"):
+            asyncio.run(aio.change_state(service, enable=True, runner=runner))
+    else:
+        asyncio.run(aio.change_state(service, enable=True, runner=runner))
+
+
+def test_change_state_gui_domain(mocker: MockerFixture):
+    mocker.patch("service.service.os.getenv", return_value="")
+    mock_run = mocker.patch.object(aio.Runner, "run")
+
+    with pytest.raises(RuntimeError, match=f'Cannot change service state in the "{DOMAIN_GUI}/'):
+        asyncio.run(aio.change_state(Service(Path("xserv.plist")), enable=True))
+
+    mock_run.assert_not_called()
+
+
+@pytest.mark.usefixtures("system_domain", "launchctl")
+def test_boot_journal(mocker: MockerFixture):
+    journal = mocker.Mock(spec=Journal)
+    previous = set_journal(journal)
+
+    try:
+        asyncio.run(aio.boot(Service(Path("xserv.plist")), run=True))
+    finally:
+        set_journal(previous)
+
+    assert journal.record.call_args.args[:4] == ("xserv", DOMAIN_SYS, "bootstrap", 0)
+
+
+@pytest.mark.parametrize("strategy", ["kickstart", "reload"])
+@pytest.mark.usefixtures("system_domain", "launchctl")
+def test_restart(mocker: MockerFixture, strategy: str):
+    spy = mocker.spy(aio.Runner, "run")
+    service = Service(Path("xserv.plist"))
+
+    assert asyncio.run(aio.restart(service, strategy)) == strategy
+    assert [call.args[1:] for call in spy.call_args_list] == (
+        [("kickstart", "-k", service.id)]
+        if strategy == "kickstart"
+        else [("bootout", DOMAIN_SYS, service.file), ("bootstrap", DOMAIN_SYS, service.file)]
+    )
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_boot_retry(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LAUNCHCTL_RETURNCODE", "35")
+    mock_sleep = mocker.patch("service.aio.asyncio.sleep")
+    spy = mocker.spy(aio.Runner, "run")
+    previous = set_retry_policy(RetryPolicy(attempts=3, delay=0.01, codes={"bootstrap": frozenset([35])}))
+
+    try:
+        with pytest.raises(RuntimeError, match="Failed to start xserv"):
+            asyncio.run(aio.boot(Service(Path("xserv.plist")), run=True))
+    finally:
+        set_retry_policy(previous)
+
+    assert spy.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_boot_limiter(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "0.2")
+    runner = aio.Runner(limit=4)
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(4)]
+    previous = set_limiter(Limiter(Limits(in_flight=2), tmp_path / "limits"))
+
+    async def main() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*[aio.boot(service, run=True, runner=runner) for service in services])
+        return time.monotonic() - start
+
+    try:
+        elapsed = asyncio.run(main())
+    finally:
+        set_limiter(previous)
+
+    assert 0.4 <= elapsed < 0.8
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_boot_concurrency(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "0.3")
+    spy = mocker.spy(asyncio.BaseEventLoop, "run_in_executor")
+    runner = aio.Runner(limit=200)
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(100)]
+
+    async def main() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*[aio.boot(service, run=True, runner=runner) for service in services])
+        return time.monotonic() - start
+
+    # the changes run together instead of a few at a time on the threads of the default executor
+    assert asyncio.run(main()) < 2
+    spy.assert_not_called()
+
+
+def test_boot_cancel(mocker: MockerFixture, tmp_path: Path):
+    program = tmp_path / "launchctl"
+    program.write_text("#!/bin/sh\nexec sleep 10\n", encoding="utf8")
+    program.chmod(0o755)
+    spy = mocker.spy(asyncio, "create_subprocess_exec")
+    runner = aio.Runner(program=str(program))
+
+    async def main() -> None:
+        task = asyncio.create_task(aio.boot(Service(Path("xserv.plist")), run=True, runner=runner))
+
+        while not spy.spy_return_list:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert spy.spy_return_list[0].returncode < 0
+
+    asyncio.run(main())
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_runner_limit(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "0.2")
+    runner = aio.Runner(limit=2)
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(4)]
+
+    async def main() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*[aio.boot(service, run=True, runner=runner) for service in services])
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(main())
+
+    assert runner.limit == 2
+    assert 0.4 <= elapsed < 0.8
+
+
+def test_runner_cancel(mocker: MockerFixture, tmp_path: Path):
+    program = tmp_path / "launchctl"
+    program.write_text("#!/bin/sh\nexec sleep 10\n", encoding="utf8")
+    program.chmod(0o755)
+    spy = mocker.spy(asyncio, "create_subprocess_exec")
+    runner = aio.Runner(program=str(program))
+
+    async def main() -> None:
+        task = asyncio.create_task(runner.run("list"))
+
+        while not spy.spy_return_list:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    process = spy.spy_return_list[0]
+
+    assert process.returncode is not None
+    assert process.returncode < 0
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_runner_multiple_loops():
+    runner = aio.Runner(program="launchctl")
+
+    assert asyncio.run(runner.run("list")).stdout == b"list\n"
+    assert asyncio.run(runner.run("list")).stdout == b"list\n"
+    assert runner.program == "launchctl"
+
+
+def test_runner_invalid_limit():
+    with pytest.raises(ValueError, match="The concurrency limit must be at least 1"):
+        aio.Runner(limit=0)
@@ -0,0 +1,177 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import subprocess
+import threading
+import time
+import typing as t
+
+import pytest
+
+from service.batch import Result, run
+from service.service import Service
+
+
+def test_run():
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(5)]
+    failing = {services[1], services[3]}
+
+    def operation(service: Service) -> None:
+        if service in failing:
+            raise RuntimeError(f"Failed to start {service.name}")
+
+    results = list(run(services, operation, jobs=2))
+
+    assert {result.service for result in results} == set(services)
+    assert {result.service for result in results if not result.ok} == failing
+    assert all(str(r.error) == f"Failed to start {r.service.name}" for r in results if not r.ok)
+
+
+def test_run_value():
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(3)]
+
+    results = list(run(services, lambda service: service.name, jobs=2))
+
+    assert {(result.service, result.value) for result in results} == {(service, service.name) for service in services}
+
+
+def test_run_duration():
+    service = Service(Path("xserv.plist"))
+
+    (result,) = run([service], lambda service: time.sleep(0.05))
+
+    assert 0.05 <= result.duration < 0.5
+
+
+@pytest.mark.parametrize("error,returncode", [(None, 0), (RuntimeError("xserv skipped because yserv failed"), None)])
+def test_result_to_dict(error: t.Optional[Exception], returncode: t.Optional[int]):
+    service = Service(Path("/Library/LaunchDaemons/xserv.plist"))
+    result = Result(service, error, duration=0.1234567)
+
+    assert result.to_dict("start") == {
+        "service": "xserv",
+        "domain": service.domain,
+        "operation": "start",
+        "ok": error is None,
+        "returncode": returncode,
+        "duration": 0.123457,
+        "error": None if error is None else str(error),
+    }
+
+
+def test_result_returncode():
+    error = RuntimeError("xserv is already stopped")
+    error.__cause__ = subprocess.CalledProcessError(113, ["launchctl", "bootout"])
+
+    assert Result(Service(Path("xserv.plist")), error).returncode == 113
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_run_is_bounded(jobs: int):
+    services = [Service(Path(f"xserv{i}.plist")) for i in range(6)]
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def operation(service: Service) -> None:  # pylint: disable=unused-argument
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        threading.Event().wait(0.01)
+        with lock:
+            active.pop()
+
+    assert len(list(run(services, operation, jobs=jobs))) == len(services)
+    assert max(peak) <= jobs
+
+
+def test_run_no_services():
+    assert not list(run([], lambda service: None))
+
+
+def test_run_invalid_jobs():
+    with pytest.raises(ValueError, match="The number of jobs must be at least 1"):
+        list(run([Service(Path("xserv.plist"))], lambda service: None, jobs=0))
+
+
+def _record(order: list[str], failing: t.Container[str] = ()) -> t.Callable[[Service], None]:
+    lock = threading.Lock()
+
+    def operation(service: Service) -> None:
+        with lock:
+            order.append(service.name)
+
+        if service.name in failing:
+            raise RuntimeError(f"Failed to start {service.name}")
+
+    return operation
+
+
+@pytest.mark.parametrize("reverse", [True, False])
+def test_run_dependencies(reverse: bool):
+    db, proxy, worker1, worker2, other = [Service(Path(f"{name}.plist")) for name in ["db", "proxy", "w1", "w2", "x"]]
+    dependencies = {proxy: [db], worker1: [proxy], worker2: [proxy, Service(Path("unknown.plist"))]}
+    order: list[str] = []
+
+    results = list(
+        run([worker1, worker2, proxy, db, other], _record(order), jobs=4, dependencies=dependencies, reverse=reverse)
+    )
+    position = {name: order.index(name) for name in order}
+
+    assert all(result.ok for result in results)
+    assert len(order) == 5
+
+    if reverse:
+        assert max(position["w1"], position["w2"]) < position["proxy"] < position["db"]
+    else:
+        assert position["db"] < position["proxy"] < min(position["w1"], position["w2"])
+
+
+def test_run_dependencies_fail_fast():
+    db, proxy, worker1, worker2, other = [Service(Path(f"{name}.plist")) for name in ["db", "proxy", "w1", "w2", "x"]]
+    dependencies = {proxy: [db], worker1: [proxy], worker2: [proxy, db]}
+    order: list[str] = []
+
+    results = {r.service.name: r for r in run([worker1, worker2, proxy, db, other], _record(order, ["db"]), jobs=2)}
+    assert len(results) == 5
+
+    order.clear()
+    results = {
+        r.service.name: r
+        for r in run([worker1, worker2, proxy, db, other], _record(order, ["db"]), jobs=2, dependencies=dependencies)
+    }
+
+    assert sorted(order) == ["db", "x"]
+    assert results["x"].ok
+    assert str(results["db"].error) == "Failed to start db"
+    assert {str(results[name].error) for name in ["proxy", "w1", "w2"]} == {
+        "proxy skipped because db failed",
+        "w1 skipped because db failed",
+        "w2 skipped because db failed",
+    }
+
+
+def test_run_dependencies_satisfied():
+    db, proxy, worker = [Service(Path(f"{name}.plist")) for name in ["db", "proxy", "w1"]]
+    dependencies = {proxy: [db], worker: [proxy]}
+    order: list[str] = []
+    results = {
+        r.service.name: r
+        for r in run(
+            [worker, proxy, db],
+            _record(order, ["db", "proxy"]),
+            dependencies=dependencies,
+            satisfied=lambda result: result.service.name == "db",
+        )
+    }
+
+    assert order == ["db", "proxy"]
+    assert [name for name, result in results.items() if result.ok] == []
+    assert str(results["w1"].error) == "w1 skipped because proxy failed"
+
+
+def test_run_dependency_cycle():
+    a, b, c = [Service(Path(f"{name}.plist")) for name in ["a", "b", "c"]]
+
+    with pytest.raises(ValueError, match=r"Dependency cycle: (a -> b -> a|b -> a -> b)"):
+        list(run([a, b, c], lambda service: None, dependencies={a: [b], b: [a]}))
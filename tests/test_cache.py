@@ -0,0 +1,38 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+
+import pytest
+
+from service.cache import get_cache_dir, read_cache, write_cache
+
+
+def test_get_cache_dir(monkeypatch: pytest.MonkeyPatch, cache_dir: Path):
+    assert get_cache_dir() == cache_dir / "service"
+
+    monkeypatch.delenv("XDG_CACHE_HOME")
+
+    assert get_cache_dir() == Path.home() / ".cache" / "service"
+
+
+def test_read_write_cache(tmp_path: Path):
+    file = tmp_path / "cache" / "data.json"
+
+    assert read_cache(file) is None
+    assert write_cache(file, {"foo": [1, 2]})
+    assert read_cache(file) == {"foo": [1, 2]}
+
+
+def test_read_cache_invalid(tmp_path: Path):
+    file = tmp_path / "data.json"
+    file.write_text("{", encoding="utf8")
+
+    assert read_cache(file) is None
+
+
+def test_write_cache_failure(tmp_path: Path):
+    file = tmp_path / "data.json"
+    file.mkdir()
+
+    assert not write_cache(file, {})
+    assert not list(tmp_path.glob("*.tmp"))
@@ -1,8 +1,14 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring,too-many-arguments,too-many-positional-arguments
 
 from contextlib import nullcontext as does_not_raise
+import itertools
+import json
 from pathlib import Path
+import plistlib
+import pwd
 import subprocess
+import threading
+import time
 import typing as t
 
 import click
@@ -10,41 +16,58 @@ from click.testing import CliRunner
 import pytest
 from pytest_mock import MockerFixture
 
-from service.cli import cli, get_service, get_reverse_domains, verify_platform, MACOS_MIN_VERSION
+from service import timing
+from service.cli import (
+    cli,
+    get_boot_time,
+    get_macos_version,
+    get_services,
+    verify_platform,
+    BOOT_TIME_TOLERANCE,
+    META_FAILURES,
+    MACOS_MIN_VERSION,
+)
+from service.config import Config
+from service.daemon import Server
+from service.executor import FakeExecutor, SessionExecutor, SubprocessExecutor
+from service.index import get_index_file, ServiceIndex
+from service.launchctl import get_executor, get_journal, get_limiter, get_retry_policy, set_executor, set_limiter
+from service.limits import Limits
+from service.retry import RetryPolicy
 from service.service import Service
 
 
-@pytest.mark.parametrize("data", [None, {}, {"reverse-domains": ["com.foo.bar"]}, {"reverse-domains": {}}])
-def test_get_reverse_domains(capsys: pytest.CaptureFixture, data: t.Optional[dict[str, list[str]]]):
-    reverse_domains = data.get("reverse-domains", []) if isinstance(data, dict) else []
-    output = ""
-
-    if not isinstance(reverse_domains, list):
-        reverse_domains = []
-        output = 'Warning: Invalid configuration file. "reverse-domains" must be a list.\n'
+def test_get_services(mocker: MockerFixture):
+    mocker.patch("service.cli.Path.is_file", return_value=True)
+    ctx = click.Context(click.Command("cmd"))
+    ctx.obj = Config(["com.foo.bar"])
 
-    result = get_reverse_domains(data)
+    get_services(ctx, click.Option(["-x"]), ("name", "other"))
 
-    assert result == reverse_domains
-    assert capsys.readouterr().err == output
+    assert all(isinstance(service, Service) for service in ctx.obj)
+    assert [service.path for service in ctx.obj] == [
+        Path(f"~/Library/LaunchAgents/com.foo.bar.{name}.plist").expanduser().absolute() for name in ["name", "other"]
+    ]
+    assert ctx.meta[META_FAILURES] == 0
 
 
-def test_get_service(mocker: MockerFixture):
-    mocker.patch("service.cli.Path.is_file", return_value=True)
+def test_get_services_not_found(mocker: MockerFixture, capsys: pytest.CaptureFixture):
+    mocker.patch("service.cli.Path.is_file", return_value=False)
     ctx = click.Context(click.Command("cmd"))
-    ctx.obj = ["com.foo.bar"]
+    ctx.obj = Config(["com.foo.bar"])
 
-    get_service(ctx, click.Option(["-x"]), "name")
+    get_services(ctx, click.Option(["-x"]), ("/foo/name", "/foo/other"))
 
-    assert isinstance(ctx.obj, Service)
-    assert ctx.obj.path == Path("~/Library/LaunchAgents/com.foo.bar.name.plist").expanduser().absolute()
+    assert not ctx.obj
+    assert ctx.meta[META_FAILURES] == 2
+    assert capsys.readouterr().err == 'Error: Service "/foo/name" not found\nError: Service "/foo/other" not found\n'
 
 
 @pytest.mark.parametrize("version_offset", [-1, 0, 1])
 @pytest.mark.parametrize("name", ["Darwin", "x"])
 def test_verify_platform(mocker: MockerFixture, name: str, version_offset: int):
-    mocker.patch("service.cli.platform.system", return_value=name)
-    mocker.patch("service.cli.platform.mac_ver", return_value=[str(MACOS_MIN_VERSION + version_offset)])
+    mocker.patch("service.cli.os.uname", return_value=mocker.Mock(sysname=name))
+    mocker.patch("platform.mac_ver", return_value=[str(MACOS_MIN_VERSION + version_offset)])
     context = does_not_raise()
 
     if name != "Darwin":
@@ -56,6 +79,25 @@ def test_verify_platform(mocker: MockerFixture, name: str, version_offset: int):
         verify_platform()
 
 
+def test_get_macos_version(mocker: MockerFixture):
+    mock_mac_ver = mocker.patch("platform.mac_ver", return_value=["13.1.2"])
+    mock_boot_time = mocker.patch("service.cli.get_boot_time", return_value=1000.0)
+
+    assert get_macos_version() == "13.1.2"
+    assert get_macos_version() == "13.1.2"
+    mock_mac_ver.assert_called_once()
+
+    mock_boot_time.return_value += BOOT_TIME_TOLERANCE
+    mock_mac_ver.return_value = ["14.0"]
+
+    assert get_macos_version() == "14.0"
+    assert mock_mac_ver.call_count == 2
+
+
+def test_get_boot_time():
+    assert 0 < get_boot_time() <= time.time()
+
+
 def test_cli_version(config: Path):
     runner = CliRunner()
     result = runner.invoke(cli, ["-c", str(config), "--version"])
@@ -80,7 +122,7 @@ def test_cli_verifies_platform(mocker: MockerFixture, config: Path):
 @pytest.mark.parametrize("should_fail", [True, False])
 def test_cli_disable(mocker: MockerFixture, config: Path, plist: Path, should_fail: bool):
     mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
-    mock_run = mocker.patch("service.cli.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
     output = f"{plist.stem} disabled\n"
 
     if should_fail:
@@ -97,7 +139,7 @@ def test_cli_disable(mocker: MockerFixture, config: Path, plist: Path, should_fa
 @pytest.mark.parametrize("should_fail", [True, False])
 def test_cli_enable(mocker: MockerFixture, config: Path, plist: Path, should_fail: bool):
     mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
-    mock_run = mocker.patch("service.cli.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
     output = f"{plist.stem} enabled\n"
 
     if should_fail:
@@ -114,12 +156,12 @@ def test_cli_enable(mocker: MockerFixture, config: Path, plist: Path, should_fai
 @pytest.mark.parametrize("should_fail", [True, False])
 def test_cli_restart(mocker: MockerFixture, config: Path, plist: Path, should_fail: bool):
     mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
-    mock_run = mocker.patch("service.cli.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
-    output = f"{plist.stem} restarted\n"
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    output = f"{plist.stem} restarted (kickstart)\n"
 
     if should_fail:
         mock_run.side_effect = subprocess.CalledProcessError(1, [])
-        output = f"Error: Failed to stop {plist.stem}\n"
+        output = f"Error: Failed to restart {plist.stem}\n"
 
     runner = CliRunner()
     result = runner.invoke(cli, ["-c", str(config), "restart", str(plist.absolute())])
@@ -128,12 +170,53 @@ def test_cli_restart(mocker: MockerFixture, config: Path, plist: Path, should_fa
     assert result.output == output
 
 
+def test_cli_restart_profile(mocker: MockerFixture, config: Path, plist: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "--profile", "restart", str(plist.absolute())])
+    lines = result.output.splitlines()
+
+    assert result.exit_code == 0
+    assert lines[0] == f"{plist.stem} restarted (kickstart)"
+    assert lines[1].split() == ["SPAN", "COUNT", "TOTAL", "MEAN", "MAX"]
+    assert {"command", "launchctl", "locate", "validate", "load_config", "verify_platform"} <= {
+        line.split()[0] for line in lines[2:]
+    }
+    assert timing.get_recorder() is None
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "prometheus"])
+def test_cli_profile_file(mocker: MockerFixture, tmp_path: Path, config: Path, plist: Path, fmt: str):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    file = tmp_path / "profile"
+    args = ["-c", str(config), "--profile-file", str(file), "--profile-format", fmt, "start", str(plist.absolute())]
+
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 0
+    assert result.output == f"{plist.stem} started\n"
+
+    if fmt == "jsonl":
+        spans = [json.loads(line) for line in file.read_text(encoding="utf8").splitlines()]
+        launchctl_span = next(span for span in spans if span["name"] == "launchctl")
+        assert (launchctl_span["command"], launchctl_span["subcommand"], launchctl_span["returncode"]) == (
+            "start",
+            "bootstrap",
+            0,
+        )
+    else:
+        assert 'service_span_seconds_count{span="command",command="start"} 1.0' in file.read_text(encoding="utf8")
+
+
 @pytest.mark.parametrize("short_opts", [True, False])
 @pytest.mark.parametrize("enable", [True, False])
 @pytest.mark.parametrize("should_fail", [True, False])
 def test_cli_start(mocker: MockerFixture, config: Path, plist: Path, should_fail: bool, enable: bool, short_opts: bool):
     mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
-    mock_run = mocker.patch("service.cli.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    mock_save = mocker.patch("service.metadata.save")
     output = f"{plist.stem} {'enabled and ' if enable else ''}started\n"
 
     if should_fail:
@@ -152,6 +235,7 @@ def test_cli_start(mocker: MockerFixture, config: Path, plist: Path, should_fail
 
     assert result.exit_code == int(should_fail)
     assert result.output == output
+    mock_save.assert_called_once_with()
 
 
 @pytest.mark.parametrize("short_opts", [True, False])
@@ -159,7 +243,7 @@ def test_cli_start(mocker: MockerFixture, config: Path, plist: Path, should_fail
 @pytest.mark.parametrize("should_fail", [True, False])
 def test_cli_stop(mocker: MockerFixture, config: Path, plist: Path, should_fail: bool, disable: bool, short_opts: bool):
     mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
-    mock_run = mocker.patch("service.cli.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
     output = f"{plist.stem} stopped{' and disabled' if disable else ''}\n"
 
     if should_fail:
@@ -178,3 +262,678 @@ def test_cli_stop(mocker: MockerFixture, config: Path, plist: Path, should_fail:
 
     assert result.exit_code == int(should_fail)
     assert result.output == output
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+@pytest.mark.parametrize("failed", [0, 1, 3])
+def test_cli_multiple_services(mocker: MockerFixture, tmp_path: Path, config: Path, failed: int, jobs: int):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    plists = [tmp_path / f"xserv{i}.plist" for i in range(3)]
+    failing = [str(plist.absolute()) for plist in plists[:failed]]
+
+    for plist in plists:
+        plist.touch()
+
+    def run(cmd: list[str], **kwargs) -> subprocess.CompletedProcess:  # pylint: disable=unused-argument
+        if cmd[-1] in failing:
+            raise subprocess.CalledProcessError(1, cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    mock_run = mocker.patch("service.launchctl.subprocess.run", side_effect=run)
+    runner = CliRunner()
+    result = runner.invoke(cli, ["-c", str(config), "-j", str(jobs), "start", *[str(p.absolute()) for p in plists]])
+    lines = result.output.splitlines()
+
+    assert result.exit_code == int(bool(failed))
+    assert mock_run.call_count == len(plists)
+    assert sorted(line for line in lines if "started" in line) == [f"{p.stem} started" for p in plists[failed:]]
+    assert sorted(line for line in lines if "Failed" in line) == [
+        f"Error: Failed to start {p.stem}" for p in plists[:failed]
+    ]
+
+    if failed:
+        assert lines[-1] == f"Error: {failed} of {len(plists)} services failed"
+
+
+def test_cli_service_not_found(mocker: MockerFixture, config: Path, plist: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    runner = CliRunner()
+    result = runner.invoke(cli, ["-c", str(config), "start", "/missing/xserv.plist", str(plist.absolute())])
+
+    assert result.exit_code == 1
+    assert result.output == (
+        f'Error: Service "/missing/xserv.plist" not found\n{plist.stem} started\nError: 1 of 2 services failed\n'
+    )
+
+
+@pytest.mark.parametrize("no_cache", [True, False])
+def test_cli_index(mocker: MockerFixture, tmp_path: Path, config: Path, no_cache: bool):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    tmp_path.joinpath("com.bar.foo.xserv.plist").touch()
+    args = ["-c", str(config), "start", "xserv"]
+
+    if no_cache:
+        args.append("--no-cache")
+
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 0
+    assert result.output == "com.bar.foo.xserv started\n"
+    assert get_index_file().exists() is not no_cache
+
+
+def test_cli_index_rebuild(mocker: MockerFixture, tmp_path: Path, config: Path):
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    tmp_path.joinpath("com.bar.foo.xserv.plist").touch()
+    tmp_path.joinpath("com.bar.foo.yserv.plist").touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "index", "rebuild"])
+
+    assert result.exit_code == 0
+    assert result.output == "Indexed 2 services in 1 directories\n"
+    assert ServiceIndex.load(get_index_file()).candidates([tmp_path], ["com.bar.foo.yserv.plist"])
+
+
+def test_cli_session_executor(mocker: MockerFixture, config: Path, plist: Path, launchctl: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    spy = mocker.spy(SessionExecutor, "run")
+    result = CliRunner().invoke(cli, ["-c", str(config), "--executor", "session", "restart", str(plist.absolute())])
+
+    assert result.exit_code == 0
+    assert result.output == f"{plist.stem} restarted (kickstart)\n"
+    assert [call.args[1] for call in spy.call_args_list] == ["kickstart"]
+    assert isinstance(get_executor(), SubprocessExecutor)
+    assert launchctl.exists()
+
+
+@pytest.fixture(name="loaded")
+def loaded_fixture() -> t.Iterator[FakeExecutor]:
+    executor = FakeExecutor(
+        outputs={"list": b"PID\tStatus\tLabel\n123\t0\tcom.bar.foo.xserv\n-\t78\tcom.bar.foo.yserv\n"}
+    )
+    previous = set_executor(executor)
+    yield executor
+    set_executor(previous)
+
+
+@pytest.mark.parametrize("as_json", [True, False])
+def test_cli_list(mocker: MockerFixture, tmp_path: Path, config: Path, loaded: FakeExecutor, as_json: bool):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+
+    for name in ["xserv", "yserv", "zserv"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "list", *(["--json"] if as_json else [])])
+
+    assert result.exit_code == 0
+    assert loaded.commands == [["launchctl", "list"]]
+
+    if as_json:
+        data = json.loads(result.output)
+        assert [(item["name"], item["state"], item["pid"]) for item in data] == [
+            ("com.bar.foo.xserv", "running", 123),
+            ("com.bar.foo.yserv", "loaded", None),
+            ("com.bar.foo.zserv", "unloaded", None),
+        ]
+    else:
+        assert result.output == (
+            "NAME               STATE     PID  STATUS\n"
+            "com.bar.foo.xserv  running   123  0\n"
+            "com.bar.foo.yserv  loaded    -    78\n"
+            "com.bar.foo.zserv  unloaded  -    -\n"
+        )
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        (["--label", "com.bar.*"], ["com.bar.foo.xserv", "com.bar.foo.yserv"]),
+        (["--label", "*.zserv"], ["com.bar.foo.zserv"]),
+        (["--program", "/bin/y*"], ["com.bar.foo.yserv"]),
+        (["--label", "com.bar.*", "--program", "/bin/z*"], []),
+    ],
+)
+@pytest.mark.usefixtures("loaded")
+def test_cli_list_filter(mocker: MockerFixture, tmp_path: Path, config: Path, args: list[str], expected: list[str]):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+
+    for name, label in [("xserv", "com.bar.foo.xserv"), ("yserv", "com.bar.foo.yserv"), ("zserv", "org.zserv")]:
+        data = {"Label": label, "ProgramArguments": [f"/bin/{name}"]}
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").write_bytes(plistlib.dumps(data))
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "list", "--json", *args])
+
+    assert result.exit_code == 0
+    assert [item["name"] for item in json.loads(result.output)] == expected
+
+
+@pytest.mark.usefixtures("loaded")
+def test_cli_status(mocker: MockerFixture, tmp_path: Path, config: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    plist = tmp_path / "com.bar.foo.yserv.plist"
+    plist.touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "status", str(plist), str(tmp_path / "missing.plist")])
+
+    assert result.exit_code == 1
+    assert result.output == (
+        f'Error: Service "{tmp_path / "missing.plist"}" not found\n'
+        "NAME               STATE   PID  STATUS\n"
+        "com.bar.foo.yserv  loaded  -    78\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "args,output",
+    [
+        (["worker.*"], "com.bar.foo.worker.a started\ncom.bar.foo.worker.b started\n"),
+        (["com.bar.foo.worker.a*"], "com.bar.foo.worker.a started\n"),
+        (["--match", "web$", "com.bar.foo.worker.a"], "com.bar.foo.worker.a started\ncom.bar.foo.web started\n"),
+        (["-m", "worker", "com.bar.foo.worker.a"], "com.bar.foo.worker.a started\ncom.bar.foo.worker.b started\n"),
+        (["db.*", "web"], 'Error: No services match "db.*"\ncom.bar.foo.web started\nError: 1 of 2 services failed\n'),
+        (["--match", "^x"], 'Error: No services match "^x"\n'),
+    ],
+)
+def test_cli_select(mocker: MockerFixture, tmp_path: Path, config: Path, args: list[str], output: str):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    mocker.patch("service.selector.get_paths", return_value=[tmp_path])
+    mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+
+    for name in ["worker.a", "worker.b", "web"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "--jobs", "1", "start", *args])
+
+    assert result.exit_code == int("Error" in output)
+    assert result.output == output
+
+
+@pytest.mark.parametrize(
+    "args,message",
+    [([], "Missing argument 'NAMES...' or option '--match'."), (["--match", "(x"], 'Invalid regular expression "(x"')],
+)
+def test_cli_select_usage(config: Path, args: list[str], message: str):
+    result = CliRunner().invoke(cli, ["-c", str(config), "start", *args])
+
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+@pytest.mark.parametrize("command", ["start", "stop"])
+def test_cli_dependencies(mocker: MockerFixture, tmp_path: Path, command: str):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    config = tmp_path / "config.toml"
+    config.write_text(
+        'reverse-domains = ["com.bar.foo"]\n[dependencies]\nworker = ["proxy"]\nproxy = ["db", "missing"]\n',
+        encoding="utf8",
+    )
+
+    for name in ["db", "proxy", "worker"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    executor = FakeExecutor()
+    previous = set_executor(executor)
+
+    try:
+        result = CliRunner().invoke(cli, ["-c", str(config), command, "worker", "db", "proxy"])
+    finally:
+        set_executor(previous)
+
+    order = [Path(cmd[-1]).stem for cmd in executor.commands]
+
+    assert result.exit_code == 0
+    assert order == [f"com.bar.foo.{name}" for name in (["db", "proxy", "worker"][:: 1 if command == "start" else -1])]
+
+
+@pytest.fixture(name="users")
+def users_fixture(mocker: MockerFixture, tmp_path: Path) -> Path:
+    mocker.patch("service.cli.os.geteuid", return_value=0)
+    mocker.patch("service.service.Service.validate")
+    entries = [
+        pwd.struct_passwd((name, "*", uid, 20, "", str(tmp_path / name), ""))
+        for name, uid in [("foo", 501), ("bar", 502)]
+    ]
+    mocker.patch("service.users.pwd.getpwall", return_value=entries)
+    mocker.patch("service.users.launchctl.domain_exists", return_value=True)
+    mocker.patch("service.users.pwd.getpwuid", side_effect={entry.pw_uid: entry for entry in entries}.__getitem__)
+    config = tmp_path / "config.toml"
+    config.write_text('reverse-domains = ["com.bar.foo"]\n', encoding="utf8")
+
+    for name in ["foo", "bar"]:
+        agents = tmp_path / name / "Library/LaunchAgents"
+        agents.mkdir(parents=True)
+        agents.joinpath("com.bar.foo.xserv.plist").touch()
+
+    tmp_path.joinpath("bar/Library/LaunchAgents/com.bar.foo.worker.plist").touch()
+
+    return config
+
+
+@pytest.mark.parametrize(
+    "args,services,failures",
+    [
+        (["--all-users"], ["gui/501/com.bar.foo.xserv", "gui/502/com.bar.foo.worker", "gui/502/com.bar.foo.xserv"], 1),
+        (["--uid", "502"], ["gui/502/com.bar.foo.worker", "gui/502/com.bar.foo.xserv"], 0),
+    ],
+)
+def test_cli_users(caplog: pytest.LogCaptureFixture, users: Path, args: list[str], services: list[str], failures: int):
+    executor = FakeExecutor()
+    previous = set_executor(executor)
+
+    try:
+        result = CliRunner().invoke(cli, ["-c", str(users), "restart", *args, "xserv", "worker"])
+    finally:
+        set_executor(previous)
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "service"]
+    reported = [message for message in messages if message.endswith("restarted (kickstart)")]
+    groups = [user for user, _ in itertools.groupby(message.split(":")[0] for message in reported)]
+
+    assert result.exit_code == int(bool(failures))
+    assert sorted(cmd[-1] for cmd in executor.commands if cmd[1] == "kickstart") == services
+    assert len(reported) == len(services)
+    assert len(groups) == len(set(groups))
+    assert ('foo: Service "worker" not found' in messages) is bool(failures)
+
+
+def test_cli_users_usage(mocker: MockerFixture, users: Path):
+    result = CliRunner().invoke(cli, ["-c", str(users), "restart", "--all-users", "--wait", "5", "xserv"])
+
+    assert result.exit_code == 2
+    assert "--wait cannot be used with --all-users or --uid" in result.output
+
+    mocker.patch("service.cli.os.geteuid", return_value=501)
+    result = CliRunner().invoke(cli, ["-c", str(users), "stop", "--uid", "501", "--uid", "502", "xserv"])
+
+    assert result.exit_code == 2
+    assert "requires root privileges" in result.output
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_cli_hosts(mocker: MockerFixture, tmp_path: Path, config: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mock_connect = mocker.patch("service.daemon.Client.connect")
+    plist = tmp_path / "xserv.plist"
+    plist.touch()
+    args = ["-c", str(config), "--hosts", "local://h1, local://h2", "--output", "jsonl", "restart", str(plist)]
+
+    result = CliRunner().invoke(cli, args)
+    records = [json.loads(line) for line in result.output.splitlines() if line.startswith("{")]
+
+    assert result.exit_code == 0
+    assert sorted((record["host"], record["service"], record["ok"]) for record in records) == [
+        ("h1", "xserv", True),
+        ("h2", "xserv", True),
+    ]
+    mock_connect.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "args,message",
+    [
+        (["--hosts", "telnet://h1", "restart", "xserv"], 'Unknown transport "telnet"'),
+        (["--hosts", "h1", "status", "xserv"], "--hosts cannot be used with status"),
+        (["--hosts", "h1", "restart", "--all-users", "xserv"], "--all-users and --uid cannot be used with --hosts"),
+    ],
+)
+def test_cli_hosts_usage(mocker: MockerFixture, config: Path, args: list[str], message: str):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    result = CliRunner().invoke(cli, ["-c", str(config), *args])
+
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+def test_cli_hosts_gui_domain(monkeypatch: pytest.MonkeyPatch, config: Path):
+    monkeypatch.delenv("SUDO_USER", raising=False)
+    result = CliRunner().invoke(cli, ["-c", str(config), "--hosts", "h1", "restart", "xserv"])
+
+    assert result.exit_code == 2
+    assert "--hosts can only change services in the system domain" in result.output
+
+
+@pytest.fixture(name="daemon")
+def daemon_fixture(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> t.Iterator[FakeExecutor]:
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    mocker.patch("service.selector.get_paths", return_value=[tmp_path])
+    tmp_path.joinpath("com.bar.foo.xserv.plist").touch()
+    executor = FakeExecutor(outputs={"list": b"PID\tStatus\tLabel\n123\t0\tcom.bar.foo.xserv\n"})
+    previous = set_executor(executor)
+    server = Server(tmp_path / "s.sock", Config(["com.bar.foo"]), jobs=1)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    monkeypatch.setenv("SERVICE_SOCKET", str(server.file))
+    server.wait(5)
+    yield executor
+    server.shutdown()
+    thread.join(5)
+    set_executor(previous)
+
+
+@pytest.mark.parametrize(
+    "args,output,exit_code",
+    [
+        (["restart", "--strategy", "reload", "xserv"], "com.bar.foo.xserv restarted (reload)\n", 0),
+        (["stop", "xserv", "missing"], 'Error: Service "missing" not found\ncom.bar.foo.xserv stopped\n', 1),
+        (["status", "--json", "xserv"], '"pid": 123', 0),
+    ],
+)
+def test_cli_daemon(mocker: MockerFixture, daemon: FakeExecutor, args: list[str], output: str, exit_code: int):
+    spy = mocker.spy(Server, "_handle")
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == exit_code
+    assert output in result.output
+    assert daemon.commands
+    spy.assert_called_once()
+
+
+def test_cli_daemon_request(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path, daemon: FakeExecutor
+):
+    spy = mocker.spy(Server, "_handle")
+    monkeypatch.chdir(tmp_path.parent)
+    args = ["--jobs", "2", "--no-cache", "stop", f"{tmp_path.name}/com.bar.foo.xserv.plist", "x*"]
+    result = CliRunner().invoke(cli, args)
+    request = spy.call_args.args[1]
+
+    assert result.exit_code == 0
+    assert request["names"] == [str(tmp_path / "com.bar.foo.xserv.plist"), "x*"]
+    assert (request["jobs"], request["no_cache"]) == (2, True)
+    assert [command[1] for command in daemon.commands] == ["bootout"]
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--no-daemon"],
+        ["--rate", "100"],
+        ["--in-flight", "2"],
+        ["--domain-limit", "system=2"],
+        ["--executor", "subprocess"],
+    ],
+)
+def test_cli_no_daemon(mocker: MockerFixture, daemon: FakeExecutor, args: list[str]):
+    spy = mocker.spy(Server, "_handle")
+    result = CliRunner().invoke(cli, [*args, "stop", "com.bar.foo.xserv"])
+
+    assert result.exit_code == 0
+    assert result.output == "com.bar.foo.xserv stopped\n"
+    assert [command[1] for command in daemon.commands] == ["bootout"]
+    spy.assert_not_called()
+
+
+@pytest.mark.usefixtures("daemon")
+@pytest.mark.parametrize("no_daemon", [True, False])
+def test_cli_output_jsonl(mocker: MockerFixture, no_daemon: bool):
+    spy = mocker.spy(Server, "_handle")
+    args = [
+        "--output",
+        "jsonl",
+        *(["--no-daemon"] if no_daemon else []),
+        "restart",
+        "com.bar.foo.xserv",
+        "com.bar.foo.missing",
+    ]
+    result = CliRunner().invoke(cli, args)
+    records = [json.loads(line) for line in result.output.splitlines() if line.startswith("{")]
+
+    assert result.exit_code == 1
+    assert [{key: value for key, value in record.items() if key != "duration"} for record in records] == [
+        {
+            "service": "com.bar.foo.xserv",
+            "domain": "system",
+            "operation": "restart",
+            "ok": True,
+            "returncode": 0,
+            "error": None,
+        }
+    ]
+    assert records[0]["duration"] >= 0
+    assert "com.bar.foo.xserv restarted" not in result.output
+    assert 'Error: Service "com.bar.foo.missing" not found' in result.output
+    spy.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "args,output",
+    [
+        (["start", "xserv", "--wait"], "com.bar.foo.xserv started\n"),
+        (["start", "--wait", "0", "yserv"], "Error: Timed out waiting for com.bar.foo.yserv to start\n"),
+        (["stop", "--wait=0", "xserv"], "Error: Timed out waiting for com.bar.foo.xserv to stop\n"),
+        (["stop", "yserv", "--wait"], "com.bar.foo.yserv stopped\n"),
+    ],
+)
+def test_cli_wait(
+    mocker: MockerFixture, tmp_path: Path, config: Path, loaded: FakeExecutor, args: list[str], output: str
+):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+
+    for name in ["xserv", "yserv"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), *args])
+
+    assert result.exit_code == int("Error" in output)
+    assert result.output == output
+    assert [command[1] for command in loaded.commands].count("list") == 1
+
+
+@pytest.mark.parametrize(
+    "args,output,subcommands",
+    [
+        (
+            ["--dry-run", "stop:xserv", "start:xserv", "start:yserv"],
+            "launchctl kickstart -k system/com.bar.foo.xserv\n# com.bar.foo.yserv unchanged (already started)\n"
+            "# 3 steps, 1 launchctl calls\n",
+            ["list"],
+        ),
+        (
+            ["stop:xserv", "start:xserv", "restart:yserv", "stop:zserv", "start:missing"],
+            'Error: Service "missing" not found\n',
+            ["list", "kickstart", "kickstart"],
+        ),
+        (["-f", "-", "--dry-run"], "launchctl bootout system", ["list"]),
+    ],
+)
+def test_cli_run(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    config: Path,
+    loaded: FakeExecutor,
+    args: list[str],
+    output: str,
+    subcommands: list[str],
+):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+
+    for name in ["xserv", "yserv", "zserv"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "run", *args], input="# stop\nstop xserv\n\n")
+
+    assert result.exit_code == int("Error" in output)
+    assert output in result.output
+    assert [command[1] for command in loaded.commands] == subcommands
+
+
+def test_cli_run_invalid(config: Path):
+    result = CliRunner().invoke(cli, ["-c", str(config), "run", "reload:xserv"])
+
+    assert result.exit_code == 2
+    assert 'Unknown command "reload"' in result.output
+
+
+@pytest.mark.parametrize(
+    "dry_run,output,subcommands",
+    [
+        (
+            True,
+            "launchctl bootout system {path}/com.bar.foo.yserv.plist\n"
+            "launchctl disable system/com.bar.foo.yserv\n"
+            "launchctl enable system/com.bar.foo.zserv\n"
+            "launchctl bootstrap system {path}/com.bar.foo.zserv.plist\n",
+            ["list", "print-disabled"],
+        ),
+        (
+            False,
+            "2 of 3 services differ from the desired state\n",
+            ["list", "print-disabled", "bootout", "disable", "enable", "bootstrap"],
+        ),
+    ],
+)
+def test_cli_apply(
+    mocker: MockerFixture, tmp_path: Path, config: Path, dry_run: bool, output: str, subcommands: list[str]
+):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    mocker.patch("service.selector.get_paths", return_value=[tmp_path])
+    mock_save = mocker.patch("service.metadata.save")
+    executor = FakeExecutor(
+        outputs={
+            "list": b"PID\tStatus\tLabel\n123\t0\tcom.bar.foo.xserv\n-\t78\tcom.bar.foo.yserv\n",
+            "print-disabled": b'disabled services = {\n\t"com.bar.foo.zserv" => disabled\n}\n',
+        }
+    )
+
+    for name in ["xserv", "yserv", "zserv"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+
+    file = tmp_path / "services.toml"
+    file.write_text(
+        '["*serv"]\nloaded = true\nenabled = true\n\n[yserv]\nloaded = false\nenabled = false\n', encoding="utf8"
+    )
+    previous = set_executor(executor)
+
+    try:
+        result = CliRunner().invoke(cli, ["-c", str(config), "apply", str(file), *(["--dry-run"] if dry_run else [])])
+    finally:
+        set_executor(previous)
+
+    assert result.exit_code == 0
+    assert output.format(path=tmp_path) in result.output
+    assert [command[1] for command in executor.commands] == subcommands
+    mock_save.assert_called_once_with()
+
+
+def test_cli_apply_invalid(tmp_path: Path, config: Path):
+    file = tmp_path / "services.toml"
+    file.write_text("[xserv]\n", encoding="utf8")
+    result = CliRunner().invoke(cli, ["-c", str(config), "apply", str(file)])
+
+    assert result.exit_code == 1
+    assert 'Invalid desired state for "xserv"' in result.output
+
+
+@pytest.mark.parametrize(
+    "data,args,expected",
+    [
+        ("", [], None),
+        ("[limits]\nrate = 2\n", [], Limits(rate=2.0)),
+        ("[limits]\nrate = 2\nin-flight = 4\n", ["--rate", "0.5"], Limits(rate=0.5, in_flight=4)),
+        (
+            "[limits]\nin-flight = 4\n[limits.domains]\ngui = 1\nsystem = 3\n",
+            ["--in-flight", "0", "--domain-limit", "system=2, gui/501=0"],
+            Limits(domains={"gui": 1, "system": 2, "gui/501": 0}),
+        ),
+    ],
+)
+def test_cli_limits(
+    mocker: MockerFixture, tmp_path: Path, plist: Path, data: str, args: list[str], expected: t.Optional[Limits]
+):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mock_run = mocker.patch("service.launchctl.subprocess.run")
+    spy = mocker.patch("service.launchctl.set_limiter", wraps=set_limiter)
+    default = get_limiter()
+    config = tmp_path / "config.toml"
+    config.write_text(data, encoding="utf8")
+
+    result = CliRunner().invoke(cli, ["-c", str(config), *args, "start", str(plist.absolute())])
+
+    assert result.exit_code == 0
+    assert mock_run.call_count == 1
+    assert get_limiter() is default
+
+    if expected is None:
+        spy.assert_not_called()
+    else:
+        limiter = spy.call_args_list[0].args[0]
+        assert limiter.limits == expected
+        assert tmp_path.joinpath("cache", "service", "limits").is_dir()
+
+
+@pytest.mark.parametrize("value", ["system", "=2", "system=two", "gui=1,system=-1"])
+def test_cli_limits_usage(value: str):
+    result = CliRunner().invoke(cli, ["--domain-limit", value, "start", "xserv"])
+
+    assert result.exit_code == 2
+    assert "is not a limit written as DOMAIN=N" in result.output
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_cli_history(mocker: MockerFixture, tmp_path: Path, journal_dir: Path, plist: Path, enabled: bool):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.journal.os.getenv", return_value="foo")  # record changes for the sudo user
+    mock_run = mocker.patch("service.launchctl.subprocess.run", return_value=subprocess.CompletedProcess([], 0))
+    config = tmp_path / "config.toml"
+    config.write_text(f"[journal]\nenabled = {str(enabled).lower()}\n", encoding="utf8")
+
+    assert CliRunner().invoke(cli, ["-c", str(config), "start", str(plist.absolute())]).exit_code == 0
+    assert CliRunner().invoke(cli, ["-c", str(config), "stop", str(plist.absolute())]).exit_code == 0
+    assert mock_run.call_count == 2
+    assert get_journal() is None
+    assert journal_dir.joinpath("00000001.jsonl").exists() is enabled
+
+    result = CliRunner().invoke(cli, ["history", plist.stem])
+    lines = result.output.splitlines()
+
+    assert result.exit_code == 0
+    assert [line.split()[2:6] for line in lines] == (
+        [["foo", "bootstrap", f"system/{plist.stem}", "ok"], ["foo", "bootout", f"system/{plist.stem}", "ok"]]
+        if enabled
+        else []
+    )
+
+    result = CliRunner().invoke(cli, ["--output", "jsonl", "history", "--since", "1h"])
+
+    assert result.exit_code == 0
+    assert [json.loads(line)["operation"] for line in result.output.splitlines()] == (
+        ["bootstrap", "bootout"] if enabled else []
+    )
+    assert not CliRunner().invoke(cli, ["history", "other"]).output
+    assert not CliRunner().invoke(cli, ["history", "--since", "2099-01-01"]).output
+
+
+def test_cli_history_usage():
+    result = CliRunner().invoke(cli, ["history", "--since", "yesterday"])
+
+    assert result.exit_code == 2
+    assert 'Invalid time "yesterday"' in result.output
+
+
+def test_cli_retry(mocker: MockerFixture, tmp_path: Path, plist: Path):
+    mocker.patch("service.cli.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.launchctl.time.sleep")
+    mock_run = mocker.patch(
+        "service.launchctl.subprocess.run",
+        side_effect=[subprocess.CalledProcessError(5, []), subprocess.CompletedProcess([], 0)],
+    )
+    config = tmp_path / "config.toml"
+    config.write_text("[retry]\nattempts = 3\n[retry.codes]\nbootstrap = [5]\n", encoding="utf8")
+
+    result = CliRunner().invoke(cli, ["-c", str(config), "start", str(plist.absolute())])
+
+    assert result.exit_code == 0
+    assert result.output == f"{plist.stem} started\n"
+    assert mock_run.call_count == 2
+    assert get_retry_policy() == RetryPolicy()
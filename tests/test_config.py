@@ -0,0 +1,146 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import typing as t
+
+import pytest
+
+from service.config import (
+    Config,
+    get_dependencies,
+    get_journal_settings,
+    get_limits,
+    get_retry_policy,
+    get_reverse_domains,
+    load_config,
+)
+from service.journal import JournalSettings
+from service.limits import Limits
+from service.retry import RetryPolicy
+
+
+@pytest.mark.parametrize("data", [None, {}, {"reverse-domains": ["com.foo.bar"]}, {"reverse-domains": {}}])
+def test_get_reverse_domains(capsys: pytest.CaptureFixture, data: t.Optional[dict[str, list[str]]]):
+    reverse_domains = data.get("reverse-domains", []) if isinstance(data, dict) else []
+    output = ""
+
+    if not isinstance(reverse_domains, list):
+        reverse_domains = []
+        output = 'Warning: Invalid configuration file. "reverse-domains" must be a list.\n'
+
+    result = get_reverse_domains(data)
+
+    assert result == reverse_domains
+    assert capsys.readouterr().err == output
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (None, {}),
+        ({}, {}),
+        ({"dependencies": {"worker": ["dbproxy"]}}, {"worker": ["dbproxy"]}),
+        ({"dependencies": ["worker"]}, None),
+        ({"dependencies": {"worker": "dbproxy"}}, None),
+        ({"dependencies": {"worker": [1]}}, None),
+    ],
+)
+def test_get_dependencies(capsys: pytest.CaptureFixture, data: t.Optional[dict], expected: t.Optional[dict]):
+    output = ""
+
+    if expected is None:
+        expected = {}
+        output = 'Warning: Invalid configuration file. "dependencies" must be a table of lists of service names.\n'
+
+    assert get_dependencies(data) == expected
+    assert capsys.readouterr().err == output
+
+
+@pytest.mark.parametrize(
+    "data, expected, output",
+    [
+        (None, RetryPolicy(), ""),
+        ({}, RetryPolicy(), ""),
+        (
+            {"retry": {"attempts": 3, "delay": 0.2, "max-delay": 1, "codes": {"bootstrap": [5], "*": [35]}}},
+            RetryPolicy(3, 0.2, 1, {"bootstrap": frozenset([5]), "*": frozenset([35])}),
+            "",
+        ),
+        ({"retry": {"attempts": 2}}, RetryPolicy(attempts=2), ""),
+        ({"retry": []}, RetryPolicy(), '"retry" must be a table'),
+        ({"retry": {"attempts": 0}}, RetryPolicy(), '"retry.attempts" must be a positive integer'),
+        ({"retry": {"attempts": True}}, RetryPolicy(), '"retry.attempts" must be a positive integer'),
+        ({"retry": {"delay": -1}}, RetryPolicy(), '"retry.delay" and "retry.max-delay" must be numbers of seconds'),
+        (
+            {"retry": {"max-delay": "1"}},
+            RetryPolicy(),
+            '"retry.delay" and "retry.max-delay" must be numbers of seconds',
+        ),
+        (
+            {"retry": {"codes": {"bootstrap": 5}}},
+            RetryPolicy(),
+            '"retry.codes" must be a table of lists of return codes',
+        ),
+    ],
+)
+def test_get_retry_policy(capsys: pytest.CaptureFixture, data: t.Optional[dict], expected: RetryPolicy, output: str):
+    assert get_retry_policy(data) == expected
+    assert output in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "data,expected,output",
+    [
+        (None, Limits(), ""),
+        (
+            {"limits": {"rate": 5, "burst": 10, "in-flight": 4, "domains": {"system": 2}}},
+            Limits(5.0, 10, 4, {"system": 2}),
+            "",
+        ),
+        ({"limits": []}, Limits(), '"limits" must be a table'),
+        ({"limits": {"rate": -1}}, Limits(), '"limits.rate" must be a number of changes per second'),
+        ({"limits": {"in-flight": 1.5}}, Limits(), '"limits.burst" and "limits.in-flight" must be whole numbers'),
+        ({"limits": {"domains": {"gui": True}}}, Limits(), '"limits.domains" must be a table of whole numbers'),
+    ],
+)
+def test_get_limits(capsys: pytest.CaptureFixture, data: t.Optional[dict], expected: Limits, output: str):
+    assert get_limits(data) == expected
+    assert output in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "data,expected,output",
+    [
+        (None, JournalSettings(), ""),
+        ({"journal": {"enabled": False, "segment-size": 4096, "segments": 2}}, JournalSettings(False, 4096, 2), ""),
+        ({"journal": {"segments": 3}}, JournalSettings(segments=3), ""),
+        ({"journal": "off"}, JournalSettings(), '"journal" must be a table'),
+        ({"journal": {"enabled": 0}}, JournalSettings(), '"journal.enabled" must be true or false'),
+        (
+            {"journal": {"segment-size": 0}},
+            JournalSettings(),
+            '"journal.segment-size" and "journal.segments" must be positive',
+        ),
+    ],
+)
+def test_get_journal_settings(
+    capsys: pytest.CaptureFixture, data: t.Optional[dict], expected: JournalSettings, output: str
+):
+    assert get_journal_settings(data) == expected
+    assert output in capsys.readouterr().err
+
+
+def test_load_config():
+    config = load_config({"reverse-domains": ["com.foo.bar"], "dependencies": {"worker": ["dbproxy"]}})
+
+    assert config.reverse_domains == ["com.foo.bar"]
+    assert config.dependencies == {"worker": ["dbproxy"]}
+    assert config.retry == RetryPolicy()
+    assert config.limits == Limits()
+    assert config.journal == JournalSettings()
+
+
+def test_config_defaults():
+    config = Config()
+
+    assert not config.reverse_domains
+    assert not config.dependencies
@@ -0,0 +1,238 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import threading
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.config import Config
+from service.daemon import get_socket_file, Client, Server
+from service.executor import FakeExecutor
+from service.index import ServiceIndex
+from service.launchctl import set_executor
+from service.selector import resolve
+from service.watcher import ADDED, Change, RESCAN, Watcher
+
+
+@pytest.fixture(name="executor")
+def executor_fixture(service_dir: Path) -> t.Iterator[FakeExecutor]:  # pylint: disable=unused-argument
+    executor = FakeExecutor(outputs={"list": b"PID\tStatus\tLabel\n123\t0\tcom.acme.web\n"})
+    previous = set_executor(executor)
+    yield executor
+    set_executor(previous)
+
+
+def connect(file: Path) -> Client:
+    client = Client.connect(file)
+    assert client is not None
+    return client
+
+
+@pytest.fixture(name="server")
+def server_fixture(tmp_path: Path) -> Server:
+    return Server(tmp_path / "s.sock", Config(["com.acme"]), jobs=1, snapshot_ttl=60)
+
+
+def test_handle_ping(server: Server):
+    response = server.handle({"command": "ping"})
+
+    assert response["ok"] is True
+    assert response["version"] == 1
+
+
+def test_handle_status(executor: FakeExecutor, server: Server):
+    response = server.handle({"command": "status", "names": ["web", "missing"]})
+    server.handle({"command": "status", "names": ["worker.*"]})
+
+    assert response["ok"] is False
+    assert response["errors"] == ['Service "missing" not found']
+    assert [(state["name"], state["state"], state["pid"]) for state in response["states"]] == [
+        ("com.acme.web", "running", 123)
+    ]
+    assert [command[1] for command in executor.commands] == ["list"]
+
+
+def test_handle_operation(executor: FakeExecutor, server: Server):
+    server.handle({"command": "status", "names": ["web"]})
+    response = server.handle({"command": "start", "enable": True, "names": ["worker.*"], "match": ["^x"]})
+    server.handle({"command": "status", "names": ["web"]})
+
+    assert response["ok"] is False
+    assert response["errors"] == ['No services match "^x"']
+    assert [{key: result[key] for key in ["name", "ok", "message"]} for result in response["results"]] == [
+        {"name": "com.acme.worker.a", "ok": True, "message": "com.acme.worker.a enabled and started"},
+        {"name": "com.acme.worker.b", "ok": True, "message": "com.acme.worker.b enabled and started"},
+    ]
+    assert [(result["record"]["service"], result["record"]["operation"]) for result in response["results"]] == [
+        ("com.acme.worker.a", "start"),
+        ("com.acme.worker.b", "start"),
+    ]
+    assert [command[1] for command in executor.commands] == ["list", *["enable", "bootstrap"] * 2, "list"]
+
+
+def test_handle_request_options(mocker: MockerFixture, executor: FakeExecutor, tmp_path: Path):
+    index = ServiceIndex(tmp_path / "index.json")
+    server = Server(tmp_path / "s.sock", Config(["com.acme"]), index, jobs=1)
+    mock_run = mocker.patch("service.daemon.run", return_value=[])
+    mock_resolve = mocker.patch("service.daemon.resolve", wraps=resolve)
+    mock_save = mocker.patch("service.daemon.metadata.save")
+
+    server.handle({"command": "stop", "names": ["web"]})
+    server.handle({"command": "stop", "names": ["web"], "jobs": 4, "no_cache": True})
+
+    assert [call.args[2] for call in mock_run.call_args_list] == [1, 4]
+    assert [call.args[3] for call in mock_resolve.call_args_list] == [index, None]
+    assert mock_save.call_count == 2
+    assert not executor.commands
+
+
+@pytest.mark.parametrize(
+    "request_,error",
+    [
+        ([], "Invalid request"),
+        ({"command": "reload"}, 'Unknown command "reload"'),
+        ({"command": "start"}, "No services referenced"),
+        ({"command": "start", "names": "web"}, '"names" must be a list of strings'),
+        ({"command": "start", "match": [1]}, '"match" must be a list of strings'),
+        ({"command": "start", "match": ["(x"]}, 'Invalid regular expression "(x"'),
+        ({"command": "restart", "names": ["web"], "strategy": "x"}, 'Unknown restart strategy "x"'),
+        ({"command": "start", "names": ["web"], "wait": "1"}, '"wait" must be a number of seconds'),
+        ({"command": "start", "names": ["web"], "wait": -1}, '"wait" must be a number of seconds'),
+        ({"command": "start", "names": ["web"], "jobs": 0}, '"jobs" must be a positive integer'),
+        ({"command": "start", "names": ["web"], "jobs": "2"}, '"jobs" must be a positive integer'),
+    ],
+)
+def test_handle_invalid(server: Server, request_: object, error: str):
+    response = server.handle(request_)
+
+    assert response["ok"] is False
+    assert response["error"].startswith(error)
+
+
+def test_serve(executor: FakeExecutor, server: Server):  # pylint: disable=unused-argument
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    try:
+        assert server.wait(5)
+        assert server.file.stat().st_mode & 0o777 == 0o600
+
+        with connect(server.file) as client:
+            assert client.request({"command": "ping"})["ok"] is True
+            assert client.request({"command": "stop", "names": ["web"]})["results"][0]["message"] == (
+                "com.acme.web stopped"
+            )
+
+        with pytest.raises(RuntimeError, match="already listening"):
+            Server(server.file, Config()).serve()
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+    assert not server.file.exists()
+    assert Client.connect(server.file) is None
+
+
+def test_serve_stale_socket(server: Server):
+    server.file.write_text("", encoding="utf8")
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    try:
+        assert server.wait(5)
+
+        with connect(server.file) as client:
+            assert client.request({"command": "ping"})["ok"] is True
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+
+def test_serve_watcher(mocker: MockerFixture, tmp_path: Path):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild([tmp_path])
+    applied = threading.Event()
+    watcher = mocker.MagicMock(spec=Watcher)
+    watcher.watched = [tmp_path]
+    watcher.read.side_effect = lambda timeout: [Change(tmp_path, "com.acme.new.plist", ADDED)]
+    mock_apply = mocker.patch("service.daemon.apply", side_effect=lambda *_: applied.set())
+    spy = mocker.spy(index, "set_watched")
+    server = Server(tmp_path / "s.sock", Config(), index, watcher=watcher)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    try:
+        assert server.wait(5)
+        assert applied.wait(5)
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+    mock_apply.assert_called_with([Change(tmp_path, "com.acme.new.plist", ADDED)], index)
+    watcher.close.assert_not_called()
+    assert [call.args[0] for call in spy.call_args_list] == [[tmp_path], []]
+
+
+def test_serve_watcher_removed_directory(mocker: MockerFixture, tmp_path: Path):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild([tmp_path])
+    removed = threading.Event()
+    watcher = mocker.MagicMock(spec=Watcher)
+    watcher.watched = [tmp_path]
+
+    def read(timeout: float) -> list[Change]:  # pylint: disable=unused-argument
+        if watcher.watched:
+            watcher.watched = []
+            return [Change(tmp_path, "", RESCAN)]
+
+        removed.set()
+        return []
+
+    watcher.read.side_effect = read
+    mocker.patch("service.daemon.apply")
+    spy = mocker.spy(index, "set_watched")
+    server = Server(tmp_path / "s.sock", Config(), index, watcher=watcher)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    try:
+        assert server.wait(5)
+        assert removed.wait(5)
+        assert [call.args[0] for call in spy.call_args_list] == [[tmp_path], []]
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+
+def test_client_invalid_response(mocker: MockerFixture):
+    sock = mocker.MagicMock()
+    sock.makefile.return_value.readline.return_value = b"[]\n"
+
+    with pytest.raises(RuntimeError, match="Invalid response"):
+        Client(sock).request({"command": "ping"})
+
+
+@pytest.mark.parametrize(
+    "environ,sudo_user,expected",
+    [
+        ({"SERVICE_SOCKET": "/tmp/x.sock"}, None, "/tmp/x.sock"),
+        ({}, "user", "daemon-system.sock"),
+        ({}, None, "daemon-gui-501.sock"),
+    ],
+)
+def test_get_socket_file(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, environ: dict, sudo_user: str, expected: str
+):
+    monkeypatch.delenv("SERVICE_SOCKET", raising=False)
+    monkeypatch.delenv("SUDO_USER", raising=False)
+    mocker.patch("service.daemon.os.geteuid", return_value=501)
+
+    for key, value in environ.items():
+        monkeypatch.setenv(key, value)
+
+    if sudo_user:
+        monkeypatch.setenv("SUDO_USER", sudo_user)
+
+    assert str(get_socket_file()).endswith(expected)
@@ -0,0 +1,62 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+
+import pytest
+
+from service.desired import DesiredState, get_steps, load
+from service.plan import Step
+from service.service import Service
+
+
+def test_load(tmp_path: Path):
+    file = tmp_path / "services.toml"
+    file.write_text(
+        '[xserv]\nloaded = true\nenabled = true\n\n["com.acme.worker.*"]\nloaded = false\n', encoding="utf8"
+    )
+
+    assert load(file) == {"xserv": DesiredState(True, True), "com.acme.worker.*": DesiredState(loaded=False)}
+
+
+@pytest.mark.parametrize(
+    "content,error",
+    [
+        (None, "Cannot read"),
+        ("[xserv\n", "Invalid desired state file"),
+        ("xserv = true\n", 'Invalid desired state for "xserv". Set'),
+        ("[xserv]\n", 'Invalid desired state for "xserv". Set'),
+        ("[xserv]\nrunning = true\n", 'Invalid desired state for "xserv". Set'),
+        ('[xserv]\nloaded = "yes"\n', '"loaded" and "enabled" must be true or false'),
+    ],
+)
+def test_load_invalid(tmp_path: Path, content: str, error: str):
+    file = tmp_path / "services.toml"
+
+    if content is not None:
+        file.write_text(content, encoding="utf8")
+
+    with pytest.raises(ValueError, match=error):
+        load(file)
+
+
+def test_desired_state_update():
+    assert DesiredState(True, False).update(DesiredState(enabled=True)) == DesiredState(True, True)
+    assert DesiredState(True).update(DesiredState(loaded=False)) == DesiredState(False)
+
+
+def test_get_steps():
+    services = [Service(Path(f"/Library/LaunchDaemons/{name}.plist")) for name in ["a", "b", "c", "d"]]
+    targets = [
+        (services[0], DesiredState(True, True)),
+        (services[1], DesiredState(False, False)),
+        (services[2], DesiredState(loaded=True)),
+        (services[3], DesiredState()),
+    ]
+
+    assert get_steps(targets) == [
+        Step("enable", services[0]),
+        Step("start", services[0]),
+        Step("stop", services[1]),
+        Step("disable", services[1]),
+        Step("start", services[2]),
+    ]
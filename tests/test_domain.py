@@ -0,0 +1,30 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.domain import DomainContext, get_context
+
+
+@pytest.mark.parametrize(
+    "context,is_system,key,target",
+    [
+        (DomainContext(), True, "system", "system"),
+        (DomainContext(501, Path("/Users/foo")), False, "gui-501", "gui/501"),
+    ],
+)
+def test_domain_context(context: DomainContext, is_system: bool, key: str, target: str):
+    assert context.is_system is is_system
+    assert context.key == key
+    assert context.target == target
+
+
+@pytest.mark.parametrize("sudo_user,expected", [("foo", DomainContext()), ("", DomainContext(501, Path("/Users/me")))])
+def test_get_context(mocker: MockerFixture, sudo_user: str, expected: DomainContext):
+    mocker.patch("service.domain.os.getenv", return_value=sudo_user)
+    mocker.patch("service.domain.os.geteuid", return_value=501)
+    mocker.patch("service.domain.Path.home", return_value=Path("/Users/me"))
+
+    assert get_context() == expected
@@ -0,0 +1,194 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,protected-access
+
+from pathlib import Path
+import subprocess
+import threading
+import time
+
+import pytest
+
+from service.executor import Executor, FakeExecutor, SessionExecutor, SubprocessExecutor
+from service.transport import LocalTransport
+
+
+def test_executor():
+    with pytest.raises(TypeError):
+        Executor()  # type: ignore  # pylint: disable=abstract-class-instantiated
+
+    with SubprocessExecutor() as executor:
+        assert executor.program == "launchctl"
+        assert executor.host is None
+
+
+@pytest.mark.parametrize("returncode", [0, 37])
+@pytest.mark.parametrize("cls", [SubprocessExecutor, SessionExecutor])
+def test_run(monkeypatch: pytest.MonkeyPatch, launchctl: Path, cls: type[Executor], returncode: int):
+    monkeypatch.setenv("LAUNCHCTL_RETURNCODE", str(returncode))
+
+    with cls() as executor:
+        if returncode:
+            with pytest.raises(subprocess.CalledProcessError) as exc_info:
+                executor.run("bootstrap", "gui/500", "/path with spaces/x'serv.plist")
+
+            assert exc_info.value.returncode == returncode
+            assert exc_info.value.stderr == b"error\n"
+        else:
+            result = executor.run("bootstrap", "gui/500", "/path with spaces/x'serv.plist")
+
+            assert result.args == [launchctl.name, "bootstrap", "gui/500", "/path with spaces/x'serv.plist"]
+            assert result.stdout == b"bootstrap gui/500 /path with spaces/x'serv.plist\n"
+            assert result.stderr == b"error\n"
+
+
+def test_run_program(launchctl: Path):
+    with SessionExecutor(program=str(launchctl)) as executor:
+        assert executor.run("list").stdout == b"list\n"
+
+
+@pytest.mark.parametrize(
+    "args,stdout",
+    [
+        (["%s\\n", "h\u00e9llo w\u00f6rld"], "h\u00e9llo w\u00f6rld\n".encode()),
+        (["%s\\n\\n\\n", "x"], b"x\n"),
+        (["%s", "-"], b"-\n"),
+        (["%s", ""], b""),
+    ],
+)
+def test_session_output(args: list[str], stdout: bytes):
+    with SessionExecutor(program="printf") as executor:
+        result = executor.run(*args)
+
+    assert result.stdout == stdout
+    assert result.stderr == b""
+
+
+def test_session_reuses_helpers(launchctl: Path):  # pylint: disable=unused-argument
+    with SessionExecutor(size=2) as executor:
+        for _ in range(5):
+            executor.run("list")
+
+        assert len(executor._sessions) == 1
+
+
+def test_session_pool_is_bounded(launchctl: Path):  # pylint: disable=unused-argument
+    with SessionExecutor(size=2) as executor:
+        threads = [threading.Thread(target=executor.run, args=("list",)) for _ in range(6)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert 1 <= len(executor._sessions) <= 2
+
+    assert not executor._sessions
+
+
+def test_session_close_wakes_waiters(
+    monkeypatch: pytest.MonkeyPatch, launchctl: Path
+):  # pylint: disable=unused-argument
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "0.3")
+    executor = SessionExecutor(size=1)
+    errors: list[BaseException] = []
+
+    def run() -> None:
+        try:
+            executor.run("list")
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+
+    for thread in threads:
+        thread.start()
+
+    time.sleep(0.1)
+    executor.close()
+
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert sum("The launchctl session pool was closed" in str(error) for error in errors) == 2
+    assert executor.run("list").stdout == b"list\n"
+    executor.close()
+
+
+def test_session_timeout(monkeypatch: pytest.MonkeyPatch, launchctl: Path):  # pylint: disable=unused-argument
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "2")
+    executor = SessionExecutor(size=2, transport=LocalTransport("h1"), timeout=0.2)
+    errors: list[BaseException] = []
+
+    def run() -> None:
+        try:
+            executor.run("list")
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join(5)
+
+    assert time.perf_counter() - start < 1.5
+    assert [str(error) for error in errors] == ['launchctl on "h1" did not respond within 0.2s'] * 3
+    assert not executor._sessions
+
+    with pytest.raises(RuntimeError, match="did not respond"):
+        executor.run("list")
+
+
+def test_session_replaces_stopped_helper(launchctl: Path):  # pylint: disable=unused-argument
+    with SessionExecutor() as executor:
+        executor.run("list")
+        executor._sessions[0]._process.kill()
+        executor._sessions[0]._process.wait()
+
+        with pytest.raises(RuntimeError, match="The launchctl session stopped unexpectedly"):
+            executor.run("list")
+
+        assert not executor._sessions
+        assert executor.run("list").stdout == b"list\n"
+
+
+def test_session_missing_program(tmp_path: Path):
+    with SessionExecutor(program=str(tmp_path / "missing")) as executor:
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            executor.run("list")
+
+        assert exc_info.value.returncode == 127
+
+
+def test_session_invalid_arguments():
+    with SessionExecutor() as executor:
+        with pytest.raises(ValueError, match="Command arguments cannot contain newlines"):
+            executor.run("bootstrap", "gui/500", "x\nserv.plist")
+
+        assert not executor._sessions
+
+
+def test_session_host():
+    assert SessionExecutor().host is None
+    assert SessionExecutor(transport=LocalTransport("h1")).host == "h1"
+
+
+def test_session_invalid_size():
+    with pytest.raises(ValueError, match="The session pool size must be at least 1"):
+        SessionExecutor(size=0)
+
+
+def test_fake_executor():
+    executor = FakeExecutor(returncodes={"bootout": 113}, outputs={"list": b"output"})
+
+    assert executor.run("list").stdout == b"output"
+
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        executor.run("bootout", "system", "/xserv.plist")
+
+    assert exc_info.value.returncode == 113
+    assert executor.commands == [["launchctl", "list"], ["launchctl", "bootout", "system", "/xserv.plist"]]
@@ -0,0 +1,74 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.hosts import run
+from service.operations import Operation
+from service.service import Service
+from service.transport import LocalTransport
+
+
+class UnreachableTransport(LocalTransport):
+    """A transport for a host that cannot be reached."""
+
+    def open(self) -> None:
+        raise RuntimeError(f'Cannot connect to "{self.host}"')
+
+
+@pytest.fixture(name="services")
+def services_fixture(mocker: MockerFixture) -> list[Service]:
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    return [Service(Path(f"/Library/LaunchDaemons/xserv{i}.plist")) for i in range(3)]
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_run(services: list[Service]):
+    results = list(run([LocalTransport("h1"), LocalTransport("h2")], services, Operation("stop")))
+
+    assert sorted((host, result.service.name) for host, result in results) == [
+        (host, service.name) for host in ["h1", "h2"] for service in services
+    ]
+    assert all(result.ok for _, result in results)
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_run_unreachable(services: list[Service]):
+    results = list(run([UnreachableTransport("h1"), LocalTransport("h2")], services, Operation("start")))
+    failed = [(host, str(result.error)) for host, result in results if not result.ok]
+
+    assert failed == [("h1", 'Cannot connect to "h1"')] * len(services)
+    assert sum(result.ok for host, result in results if host == "h2") == len(services)
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_run_is_parallel(monkeypatch: pytest.MonkeyPatch, services: list[Service]):
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "0.2")
+    transports = [LocalTransport(f"h{i}") for i in range(3)]
+    start = time.monotonic()
+
+    results = list(run(transports, services[:2], Operation("start"), jobs=1))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 6
+    assert 0.4 <= elapsed < 1.0  # the hosts run in parallel, the services on each host one at a time
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_run_timeout(monkeypatch: pytest.MonkeyPatch, services: list[Service]):
+    monkeypatch.setenv("LAUNCHCTL_DELAY", "2")
+    monkeypatch.setattr("service.hosts.COMMAND_TIMEOUT", 0.2)
+    start = time.monotonic()
+
+    results = list(run([LocalTransport("h1")], services, Operation("stop"), jobs=1))
+
+    assert time.monotonic() - start < 1.5
+    assert [str(result.error) for _, result in results] == ['launchctl on "h1" did not respond within 0.2s'] * 3
+
+
+def test_run_invalid_jobs(services: list[Service]):
+    with pytest.raises(ValueError, match="The number of jobs must be at least 1"):
+        list(run([LocalTransport()], services, Operation("start"), jobs=0))
@@ -0,0 +1,175 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.index import get_index_file, INDEX_VERSION, ServiceIndex
+from service.launchctl import DOMAIN_GUI, DOMAIN_SYS
+
+
+@pytest.fixture(name="directories")
+def directories_fixture(tmp_path: Path) -> list[Path]:
+    directories = [tmp_path / "LaunchAgents", tmp_path / "LaunchDaemons"]
+
+    for directory in directories:
+        directory.mkdir()
+        directory.joinpath("com.foo.bar.xserv.plist").touch()
+
+    directories[1].joinpath("org.foo.yserv.plist").touch()
+    directories[1].joinpath("README").touch()
+
+    return directories
+
+
+def test_candidates(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    names = ["org.foo.yserv.plist", "com.foo.bar.xserv.plist", "com.foo.bar.zserv.plist"]
+
+    assert index.candidates(directories, names) == [
+        directories[0] / "com.foo.bar.xserv.plist",
+        directories[1] / "org.foo.yserv.plist",
+        directories[1] / "com.foo.bar.xserv.plist",
+    ]
+
+
+def test_files(mocker: MockerFixture, tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    mock_scan = mocker.spy(index, "scan")
+
+    assert index.files(directories[1]) == {"com.foo.bar.xserv.plist", "org.foo.yserv.plist"}
+    assert index.files(directories[1]) == {"com.foo.bar.xserv.plist", "org.foo.yserv.plist"}
+    assert mock_scan.call_count == 1
+
+
+def test_candidates_missing_directory(tmp_path: Path):
+    index = ServiceIndex(tmp_path / "index.json")
+    assert not index.candidates([tmp_path / "missing"], ["com.foo.bar.xserv.plist"])
+
+
+def test_save_and_load(tmp_path: Path, directories: list[Path]):
+    file = tmp_path / "cache" / "index.json"
+    index = ServiceIndex(file)
+    index.rebuild(directories)
+    index.save()
+
+    data = json.loads(file.read_text(encoding="utf8"))
+    loaded = ServiceIndex.load(file)
+
+    assert data["version"] == INDEX_VERSION
+    assert data["directories"][str(directories[1])]["files"] == ["com.foo.bar.xserv.plist", "org.foo.yserv.plist"]
+    assert loaded.file == file
+    assert not loaded.refresh(directories)
+    assert loaded.candidates(directories, ["org.foo.yserv.plist"]) == [directories[1] / "org.foo.yserv.plist"]
+
+
+def test_save_unchanged(tmp_path: Path):
+    file = tmp_path / "index.json"
+    ServiceIndex(file).save()
+    assert not file.exists()
+
+
+def test_save_failure(tmp_path: Path, directories: list[Path]):
+    file = tmp_path / "index.json"
+    file.mkdir()
+    index = ServiceIndex(file)
+    index.rebuild(directories)
+    index.save()
+
+    assert file.is_dir()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.parametrize("content", ["", "{", '{"version": 0, "directories": {}}', "[]"])
+def test_load_unusable(tmp_path: Path, directories: list[Path], content: str):
+    file = tmp_path / "index.json"
+    file.write_text(content, encoding="utf8")
+    index = ServiceIndex.load(file)
+
+    assert index.refresh(directories)
+
+
+def test_refresh(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild(directories)
+    new_file = directories[0] / "org.foo.yserv.plist"
+    new_file.touch()
+    os.utime(directories[0], ns=(0, 0))
+
+    assert not index.candidates(directories[:1], [new_file.name])
+    assert index.refresh(directories)
+    assert index.candidates(directories[:1], [new_file.name]) == [new_file]
+    assert not index.refresh(directories)
+
+
+def test_refresh_watched(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild(directories)
+    index.set_watched(directories[:1])
+    key = index.key(directories[0])
+
+    for directory in directories:
+        directory.joinpath("org.foo.yserv.plist").touch()
+        os.utime(directory, ns=(0, 0))
+
+    assert index.refresh(directories)
+    assert index.key(directories[0]) == key
+    assert index.candidates(directories, ["org.foo.yserv.plist"]) == [directories[1] / "org.foo.yserv.plist"]
+
+    index.set_watched([])
+
+    assert index.refresh(directories)
+    assert index.key(directories[0]) != key
+    assert len(index.candidates(directories, ["org.foo.yserv.plist"])) == 2
+    assert index.key(tmp_path / "missing") is None
+
+
+def test_candidates_removed_directory(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild(directories)
+    directories[0].joinpath("com.foo.bar.xserv.plist").unlink()
+    directories[0].rmdir()
+
+    assert index.refresh(directories)
+    assert index.candidates(directories, ["com.foo.bar.xserv.plist"]) == [directories[1] / "com.foo.bar.xserv.plist"]
+
+
+def test_rebuild(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    assert index.rebuild(directories) == 3
+
+
+def test_update(mocker: MockerFixture, tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild(directories)
+    directories[1].joinpath("org.foo.zserv.plist").touch()
+    directories[1].joinpath("org.foo.yserv.plist").unlink()
+    mock_scan = mocker.spy(index, "scan")
+
+    index.update(directories[1], added=["org.foo.zserv.plist", "notes.txt"], removed=["org.foo.yserv.plist"])
+
+    assert index.files(directories[1]) == {"com.foo.bar.xserv.plist", "org.foo.zserv.plist"}
+    assert index.candidates(directories, ["org.foo.yserv.plist", "org.foo.zserv.plist"]) == [
+        directories[1] / "org.foo.zserv.plist"
+    ]
+    assert not index.refresh(directories)
+    mock_scan.assert_not_called()
+
+
+def test_update_unindexed(tmp_path: Path, directories: list[Path]):
+    index = ServiceIndex(tmp_path / "index.json")
+    index.update(directories[1], added=["org.foo.zserv.plist"])
+
+    assert index.files(directories[1]) == {"com.foo.bar.xserv.plist", "org.foo.yserv.plist"}
+
+
+@pytest.mark.parametrize("domain", [DOMAIN_SYS, DOMAIN_GUI])
+def test_get_index_file(mocker: MockerFixture, cache_dir: Path, domain: str):
+    mocker.patch("service.index.os.getenv", return_value="x" if domain == DOMAIN_SYS else "")
+    mocker.patch("service.index.os.geteuid", return_value=500)
+    name = "index-system.json" if domain == DOMAIN_SYS else "index-gui-500.json"
+
+    assert get_index_file() == cache_dir / "service" / name
@@ -0,0 +1,236 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from datetime import datetime
+import json
+from pathlib import Path
+import threading
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.domain import DomainContext
+from service.journal import Entry, get_journal_dir, Journal, JournalSettings, parse_time, read, SYSTEM_JOURNAL_DIR
+
+
+def record(journal: Journal, service: str, start: float, returncode: t.Optional[int] = 0) -> None:
+    journal.record(service, "system", "bootstrap", returncode, start, 0.01)
+
+
+def test_entry():
+    entry = Entry(1.0000001, "foo", "com.bar.foo.xserv", "gui/501", "kickstart", 5, 0.25)
+
+    assert not entry.ok
+    assert entry.to_dict() == {
+        "time": 1.0,
+        "user": "foo",
+        "service": "com.bar.foo.xserv",
+        "domain": "gui/501",
+        "operation": "kickstart",
+        "returncode": 5,
+        "duration": 0.25,
+    }
+    assert Entry.from_dict(entry.to_dict()) == Entry(1.0, "foo", "com.bar.foo.xserv", "gui/501", "kickstart", 5, 0.25)
+    assert Entry.from_dict({**entry.to_dict(), "host": "h1"}).host == "h1"
+
+    with pytest.raises(KeyError):
+        Entry.from_dict({"time": 1.0})
+
+
+def test_journal(tmp_path: Path):
+    journal = Journal(tmp_path, user="foo")
+
+    for index in range(3):
+        record(journal, f"com.bar.foo.{index}serv", 10.0 + index, index or None)
+
+    journal.close()
+    lines = tmp_path.joinpath("00000001.jsonl").read_text(encoding="utf8").splitlines()
+
+    assert [json.loads(line)["service"] for line in lines] == [
+        "com.bar.foo.0serv",
+        "com.bar.foo.1serv",
+        "com.bar.foo.2serv",
+    ]
+    assert [entry.ok for entry in read(tmp_path)] == [False, False, False]
+    assert [entry.returncode for entry in read(tmp_path)] == [None, 1, 2]
+    assert {entry.user for entry in read(tmp_path)} == {"foo"}
+
+
+def test_journal_user(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setenv("SUDO_USER", "bar")
+
+    assert Journal(tmp_path).user == "bar"
+
+
+def test_journal_user_unknown(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.delenv("SUDO_USER", raising=False)
+    mocker.patch("getpass.getuser", side_effect=KeyError)
+    mocker.patch("service.journal.os.getuid", return_value=501)
+
+    assert Journal(tmp_path).user == "501"
+
+
+def test_journal_batches(mocker: MockerFixture, tmp_path: Path):
+    journal = Journal(tmp_path, user="foo")
+    spy = mocker.spy(journal, "_append")
+    threads = [
+        threading.Thread(target=lambda n=n: [record(journal, f"{n}serv", float(i)) for i in range(50)])
+        for n in range(4)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    journal.close()
+
+    assert len(list(read(tmp_path))) == 200
+    assert sum(len(call.args[0]) for call in spy.call_args_list) == 200
+    assert spy.call_count <= 200
+
+
+def test_journal_close(tmp_path: Path):
+    journal = Journal(tmp_path, user="foo")
+    journal.close()
+
+    assert not tmp_path.joinpath("00000001.jsonl").exists()
+
+    record(journal, "xserv", 1.0)
+    journal.close()
+    record(journal, "yserv", 2.0)
+    journal.close()
+
+    assert [entry.service for entry in read(tmp_path)] == ["xserv", "yserv"]
+
+
+def test_journal_record_closed(mocker: MockerFixture, tmp_path: Path):
+    journal = Journal(tmp_path, user="foo")
+    journal.close()
+    spy = mocker.spy(threading.Thread, "start")
+    record(journal, "xserv", 1.0)
+
+    assert [entry.service for entry in read(tmp_path)] == ["xserv"]
+    assert not spy.called
+
+
+def test_journal_rotation(tmp_path: Path):
+    journal = Journal(tmp_path, JournalSettings(segment_size=1, segments=3), user="foo")
+
+    for index in range(5):
+        record(journal, f"com.bar.foo.{index}serv", float(index))
+        journal.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir() if path.name != "lock") == [
+        "00000003.idx",
+        "00000003.jsonl",
+        "00000004.idx",
+        "00000004.jsonl",
+        "00000005.jsonl",
+    ]
+    assert json.loads(tmp_path.joinpath("00000004.idx").read_text(encoding="utf8")) == {
+        "start": 3.0,
+        "end": 3.0,
+        "count": 1,
+        "services": ["com.bar.foo.3serv"],
+    }
+    assert [entry.time for entry in read(tmp_path)] == [2.0, 3.0, 4.0]
+
+
+def test_journal_write_error(caplog: pytest.LogCaptureFixture, tmp_path: Path):
+    file = tmp_path / "file"
+    file.touch()
+    journal = Journal(file / "journal", user="foo")
+    record(journal, "xserv", 1.0)
+    journal.close()
+
+    assert "Failed to write 1 changes to the journal" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "context,euid,expected",
+    [
+        (DomainContext(), 501, SYSTEM_JOURNAL_DIR),
+        (DomainContext(501, Path("/Users/foo")), 0, SYSTEM_JOURNAL_DIR),
+        (DomainContext(501, Path("/Users/foo")), 501, Path("/Users/foo/Library/Logs/service/journal")),
+    ],
+)
+def test_get_journal_dir(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, context: DomainContext, euid: int, expected: Path
+):
+    monkeypatch.delenv("SERVICE_JOURNAL")
+    mocker.patch("service.journal.os.geteuid", return_value=euid)
+
+    assert get_journal_dir(context) == expected
+
+
+def test_get_journal_dir_env(journal_dir: Path):
+    assert get_journal_dir(DomainContext()) == journal_dir
+
+
+@pytest.mark.parametrize(
+    "name,since,expected",
+    [
+        (None, None, ([0.0, 1.0, 2.0, 3.0, 4.0, 5.0], [1, 2, 3])),
+        ("xserv", None, ([0.0, 2.0, 4.0], [1, 2, 3])),
+        ("com.bar.foo.yserv", None, ([1.0, 3.0, 5.0], [1, 2, 3])),
+        ("zserv", None, ([], [3])),
+        (None, 3.0, ([3.0, 4.0, 5.0], [2, 3])),
+        ("yserv", 4.0, ([5.0], [3])),
+    ],
+)
+def test_read(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    name: t.Optional[str],
+    since: t.Optional[float],
+    expected: tuple[list[float], list[int]],
+):
+    journal = Journal(tmp_path, JournalSettings(segment_size=150), user="foo")
+
+    for index in range(6):
+        record(journal, f"com.bar.foo.{'xy'[index % 2]}serv", float(index))
+
+        if index % 2:
+            journal.close()
+
+    journal.close()
+    spy = mocker.spy(Path, "open")
+
+    times, segments = expected
+
+    assert [entry.time for entry in read(tmp_path, name, since)] == times
+    assert sorted(int(call.args[0].stem) for call in spy.call_args_list if call.args[0].suffix == ".jsonl") == segments
+
+
+def test_read_invalid(tmp_path: Path):
+    tmp_path.joinpath("00000001.jsonl").write_text(
+        '{"time":1.0,"user":"foo","service":"xserv","domain":"system","operation":"bootout","returncode":0,'
+        '"duration":0.1}\n{"time":2.0,"user":\n[]\n',
+        encoding="utf8",
+    )
+
+    assert [entry.time for entry in read(tmp_path)] == [1.0]
+    assert not list(read(tmp_path / "missing"))
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("90s", 910.0),
+        ("30m", -800.0),
+        ("1.5h", 1000.0 - 5400),
+        ("2d", 1000.0 - 172800),
+        ("2026-10-17 09:30", datetime(2026, 10, 17, 9, 30).timestamp()),
+        ("2026-10-17", datetime(2026, 10, 17).timestamp()),
+    ],
+)
+def test_parse_time(value: str, expected: float):
+    assert parse_time(value, now=1000.0) == expected
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "5w", "-1h"])
+def test_parse_time_invalid(value: str):
+    with pytest.raises(ValueError, match="Invalid time"):
+        parse_time(value)
@@ -2,6 +2,7 @@
 
 from contextlib import nullcontext as does_not_raise
 from pathlib import Path
+import plistlib
 import subprocess
 
 import pytest
@@ -11,15 +12,37 @@ from service.launchctl import (
     _execute,
     boot,
     change_state,
+    domain_exists,
     DOMAIN_GUI,
     DOMAIN_SYS,
     ERROR_GUI_ALREADY_STARTED,
     ERROR_GUI_ALREADY_STOPPED,
+    ERROR_NOT_LOADED,
+    ERROR_NOT_RUNNING,
     ERROR_SIP,
     ERROR_SYS_ALREADY_STARTED,
     ERROR_SYS_ALREADY_STOPPED,
+    get_executor,
+    get_journal,
+    get_limiter,
+    is_already_booted,
+    restart,
+    RESTART_STRATEGIES,
+    set_executor,
+    set_journal,
+    set_limiter,
+    set_retry_policy,
+    use_executor,
 )
+from service import batch
+from service.domain import DomainContext
+from service.executor import FakeExecutor, SubprocessExecutor
+from service.journal import Journal, read
+from service.limits import Limiter, Limits
+from service.metadata import Metadata
+from service.retry import RetryPolicy
 from service.service import Service
+from service import timing
 
 
 def test__execute(mocker: MockerFixture):
@@ -34,6 +57,38 @@ def test__execute(mocker: MockerFixture):
     )
 
 
+@pytest.mark.parametrize("return_code", [0, 5])
+def test__execute_timing(return_code: int):
+    previous = set_executor(FakeExecutor(returncodes={"bootstrap": return_code}))
+    recorder = timing.enable()
+
+    try:
+        with pytest.raises(subprocess.CalledProcessError) if return_code else does_not_raise():
+            _execute("bootstrap", DOMAIN_GUI, "/foo")
+    finally:
+        timing.disable()
+        set_executor(previous)
+
+    assert [(span.name, span.attributes) for span in recorder.spans] == [
+        ("launchctl", {"subcommand": "bootstrap", "returncode": return_code})
+    ]
+
+
+def test_set_executor():
+    executor = FakeExecutor()
+    previous = set_executor(executor)
+
+    try:
+        assert isinstance(previous, SubprocessExecutor)
+        assert get_executor() is executor
+
+        _execute("list")
+
+        assert executor.commands == [["launchctl", "list"]]
+    finally:
+        set_executor(previous)
+
+
 @pytest.mark.parametrize(
     "return_code",
     [
@@ -94,3 +149,229 @@ def test_change_state(mocker: MockerFixture, domain: str, subcmd: str, should_fa
         mock_run.assert_not_called()
     else:
         mock_run.assert_called_once_with(["launchctl", subcmd, service.id], check=True, capture_output=True)
+
+
+@pytest.mark.parametrize(
+    "subcmd,return_code,run,expected",
+    [
+        ("bootstrap", ERROR_SYS_ALREADY_STARTED, True, True),
+        ("bootstrap", ERROR_GUI_ALREADY_STARTED, True, True),
+        ("bootout", ERROR_SYS_ALREADY_STOPPED, False, True),
+        ("bootstrap", ERROR_SIP, True, False),
+        ("bootout", ERROR_SYS_ALREADY_STARTED, True, False),
+        ("enable", ERROR_GUI_ALREADY_STARTED, True, False),
+    ],
+)
+def test_is_already_booted(subcmd: str, return_code: int, run: bool, expected: bool):
+    error = RuntimeError("xserv")
+    error.__cause__ = subprocess.CalledProcessError(return_code, ["launchctl", subcmd])
+
+    assert is_already_booted(error, run) is expected
+    assert not is_already_booted(RuntimeError("xserv"), run)
+
+
+@pytest.mark.parametrize(
+    "return_code, msg",
+    [
+        (ERROR_SYS_ALREADY_STARTED, "xserv is already started"),
+        (ERROR_SIP, "Failed to start xserv due to SIP"),
+        (1, "Failed to start xserv"),
+    ],
+)
+def test_boot_with_executor(return_code: int, msg: str):
+    executor = FakeExecutor(returncodes={"bootstrap": return_code})
+    previous = set_executor(executor)
+
+    try:
+        with pytest.raises(RuntimeError, match=msg):
+            boot(Service(Path("xserv.plist")), run=True)
+    finally:
+        set_executor(previous)
+
+
+@pytest.mark.parametrize(
+    "strategy,keep_alive,returncodes,expected",
+    [
+        ("kickstart", False, {}, (["kickstart"], "kickstart")),
+        ("kickstart", False, {"kickstart": ERROR_NOT_LOADED}, (["kickstart", "bootstrap"], "reload")),
+        ("kickstart", False, {"kickstart": 1}, (["kickstart"], "Failed to restart xserv")),
+        ("kickstart", False, {"kickstart": ERROR_SIP}, (["kickstart"], "Failed to restart xserv due to SIP")),
+        ("reload", False, {}, (["bootout", "bootstrap"], "reload")),
+        ("reload", False, {"bootout": ERROR_SYS_ALREADY_STOPPED}, (["bootout"], "xserv is already stopped")),
+        ("signal", True, {}, (["kill"], "signal")),
+        ("signal", False, {}, (["kickstart"], "kickstart")),
+        ("signal", True, {"kill": ERROR_NOT_RUNNING}, (["kill", "kickstart"], "kickstart")),
+        (
+            "signal",
+            True,
+            {"kill": ERROR_NOT_LOADED, "kickstart": ERROR_NOT_LOADED},
+            (["kill", "kickstart", "bootstrap"], "reload"),
+        ),
+        ("signal", True, {"kill": 1}, (["kill"], "Failed to restart xserv")),
+    ],
+)
+def test_restart(
+    mocker: MockerFixture, strategy: str, keep_alive: bool, returncodes: dict[str, int], expected: tuple[list[str], str]
+):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch.object(
+        Service, "metadata", new_callable=mocker.PropertyMock, return_value=Metadata(keep_alive=keep_alive)
+    )
+    executor = FakeExecutor(returncodes=returncodes)
+    previous = set_executor(executor)
+    service = Service(Path("xserv.plist"))
+    subcommands, expected_result = expected
+
+    try:
+        if expected_result in RESTART_STRATEGIES:
+            assert restart(service, strategy) == expected_result
+        else:
+            with pytest.raises(RuntimeError, match=f"^{expected_result}$"):
+                restart(service, strategy)
+    finally:
+        set_executor(previous)
+
+    assert [command[1] for command in executor.commands] == subcommands
+
+    if strategy == "signal" and subcommands[0] == "kill":
+        assert executor.commands[0][2:] == ["TERM", service.id]
+
+
+def test_use_executor():
+    executor = FakeExecutor()
+    default = get_executor()
+
+    with use_executor(executor):
+        assert get_executor() is executor
+        boot(Service(Path("xserv.plist")), run=True)
+        assert [result.ok for result in batch.run([Service(Path("yserv.plist"))], boot)] == [True]
+
+    assert get_executor() is default
+    assert [cmd[1:2] + [Path(cmd[-1]).stem] for cmd in executor.commands] == [
+        ["bootstrap", "xserv"],
+        ["bootout", "yserv"],
+    ]
+
+
+def test_set_limiter(mocker: MockerFixture, tmp_path: Path):
+    executor = FakeExecutor()
+    limiter = Limiter(Limits(in_flight=1), tmp_path)
+    spy = mocker.spy(limiter, "acquire")
+    previous = set_limiter(limiter)
+
+    try:
+        assert get_limiter() is limiter
+
+        with use_executor(executor):
+            boot(Service(Path("xserv.plist"), DomainContext()), run=True)
+            restart(Service(Path("yserv.plist"), DomainContext(501, Path("/Users/me"))))
+            _execute("list")
+    finally:
+        set_limiter(previous)
+
+    assert get_limiter() is previous
+    assert [call.args for call in spy.call_args_list] == [(DOMAIN_SYS, None), (f"{DOMAIN_GUI}/501", None)]
+    assert len(executor.commands) == 3
+
+
+def test_set_journal(tmp_path: Path):
+    executor = FakeExecutor({"bootout": ERROR_NOT_LOADED})
+    journal = Journal(tmp_path, user="foo")
+    previous = set_journal(journal)
+
+    try:
+        assert get_journal() is journal
+
+        with use_executor(executor):
+            boot(Service(Path("xserv.plist"), DomainContext()), run=True)
+            change_state(Service(Path("xserv.plist"), DomainContext()), enable=True)
+            _execute("list")
+
+            with pytest.raises(RuntimeError):
+                boot(Service(Path("yserv.plist"), DomainContext()))
+    finally:
+        set_journal(previous)
+        journal.close()
+
+    assert get_journal() is previous
+    assert [(entry.service, entry.domain, entry.operation, entry.returncode) for entry in read(tmp_path)] == [
+        ("xserv", DOMAIN_SYS, "bootstrap", 0),
+        ("xserv", DOMAIN_SYS, "enable", 0),
+        ("yserv", DOMAIN_SYS, "bootout", ERROR_NOT_LOADED),
+    ]
+
+
+@pytest.mark.parametrize("return_code", [0, 113])
+def test_domain_exists(return_code: int):
+    executor = FakeExecutor({"print": return_code})
+    previous = set_executor(executor)
+
+    try:
+        assert domain_exists("gui/501") is (return_code == 0)
+    finally:
+        set_executor(previous)
+
+    assert executor.commands == [["launchctl", "print", "gui/501"]]
+
+
+def test_restart_conditional_keep_alive(mocker: MockerFixture, tmp_path: Path):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    file = tmp_path / "xserv.plist"
+    file.write_bytes(plistlib.dumps({"Label": "xserv", "KeepAlive": {"SuccessfulExit": False}}))
+    executor = FakeExecutor()
+
+    with use_executor(executor):
+        assert restart(Service(file), "signal") == "kickstart"
+
+    assert [command[1] for command in executor.commands] == ["kickstart"]
+
+
+def test_restart_unknown_strategy():
+    with pytest.raises(ValueError, match='Unknown restart strategy "stop"'):
+        restart(Service(Path("xserv.plist")), "stop")
+
+
+@pytest.mark.parametrize(
+    "returncodes,attempts,should_fail",
+    [([5, 5, 0], 3, False), ([5, 5, 5, 5], 4, True), ([1, 0], 1, True), ([35, 5, 0], 3, False)],
+)
+def test__execute_retry(mocker: MockerFixture, returncodes: list[int], attempts: int, should_fail: bool):
+    mock_sleep = mocker.patch("service.launchctl.time.sleep")
+    executor = FakeExecutor()
+    mock_run = mocker.patch.object(
+        executor,
+        "run",
+        side_effect=[
+            subprocess.CalledProcessError(code, []) if code else subprocess.CompletedProcess([], 0)
+            for code in returncodes
+        ],
+    )
+    previous = set_executor(executor)
+    previous_policy = set_retry_policy(
+        RetryPolicy(attempts=4, delay=0.1, codes={"bootstrap": frozenset([5]), "*": frozenset([35])})
+    )
+
+    try:
+        with pytest.raises(subprocess.CalledProcessError) if should_fail else does_not_raise():
+            _execute("bootstrap", DOMAIN_GUI, "/foo")
+    finally:
+        set_retry_policy(previous_policy)
+        set_executor(previous)
+
+    assert mock_run.call_count == attempts
+    assert mock_sleep.call_count == attempts - 1
+
+
+def test__execute_no_retry(mocker: MockerFixture):
+    mock_sleep = mocker.patch("service.launchctl.time.sleep")
+    executor = FakeExecutor(returncodes={"bootstrap": ERROR_GUI_ALREADY_STARTED})
+    previous = set_executor(executor)
+
+    try:
+        with pytest.raises(subprocess.CalledProcessError):
+            _execute("bootstrap", DOMAIN_GUI, "/foo")
+    finally:
+        set_executor(previous)
+
+    assert len(executor.commands) == 1
+    mock_sleep.assert_not_called()
@@ -0,0 +1,178 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import time
+import typing as t
+
+import pytest
+
+from service.limits import Limiter, Limits
+
+
+@pytest.mark.parametrize(
+    "limits,enabled",
+    [
+        (Limits(), False),
+        (Limits(burst=5), False),
+        (Limits(domains={"gui": 0}), False),
+        (Limits(rate=0.5), True),
+        (Limits(in_flight=1), True),
+        (Limits(domains={"system": 2}), True),
+    ],
+)
+def test_limits_enabled(limits: Limits, enabled: bool):
+    assert limits.enabled is enabled
+
+
+@pytest.mark.parametrize("domain,expected", [("system", 1), ("gui/501", 3), ("gui/502", 2), ("user/501", 0)])
+def test_limits_domain_limit(domain: str, expected: int):
+    assert Limits(domains={"system": 1, "gui": 2, "gui/501": 3}).domain_limit(domain) == expected
+
+
+@pytest.mark.parametrize("limiter", [Limiter(), Limiter(Limits(in_flight=1))])
+def test_limiter_disabled(limiter: Limiter):
+    with limiter.acquire("system"):
+        with limiter.acquire("system"):
+            pass
+
+
+def concurrency(limiter: Limiter, domains: list[str], hosts: t.Optional[list[str]] = None) -> int:
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def change(domain: str, host: t.Optional[str]) -> None:
+        with limiter.acquire(domain, host):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+
+            time.sleep(0.05)
+
+            with lock:
+                running[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=len(domains)) as pool:
+        list(pool.map(change, domains, hosts or [None] * len(domains)))
+
+    return peak[0]
+
+
+@pytest.mark.parametrize(
+    "limits,domains,expected",
+    [
+        (Limits(in_flight=2), ["system"] * 6, 2),
+        (Limits(domains={"system": 1}), ["system"] * 4, 1),
+        (Limits(domains={"gui": 1}), ["gui/501", "gui/501", "gui/502", "gui/502"], 2),
+        (Limits(in_flight=3, domains={"gui/501": 1}), ["gui/501"] * 3 + ["system"] * 3, 3),
+    ],
+)
+def test_limiter_concurrency(tmp_path: Path, limits: Limits, domains: list[str], expected: int):
+    assert concurrency(Limiter(limits, tmp_path), domains) == expected
+
+
+def test_limiter_domain_first(tmp_path: Path):
+    limiter = Limiter(Limits(in_flight=2, domains={"gui": 1}), tmp_path)
+    started = threading.Event()
+
+    def change(domain: str, event: t.Optional[threading.Event] = None) -> None:
+        with limiter.acquire(domain):
+            if event is not None:
+                event.set()
+
+    with limiter.acquire("gui/501"):
+        waiting = threading.Thread(target=change, args=("gui/501",))
+        waiting.start()
+        time.sleep(0.05)
+        other = threading.Thread(target=change, args=("system", started))
+        other.start()
+
+        assert started.wait(1)
+
+    waiting.join(5)
+    other.join(5)
+
+
+def test_limiter_hosts(tmp_path: Path):
+    limiter = Limiter(Limits(in_flight=1), tmp_path)
+
+    assert concurrency(limiter, ["system"] * 4, ["h1", "h1", "h2", "h2"]) == 2
+    assert {"host-h1-in-flight-0.lock", "host-h2-in-flight-0.lock"} <= {path.name for path in tmp_path.iterdir()}
+
+
+def test_limiter_shared(tmp_path: Path):
+    limits = Limits(in_flight=1)
+    started = threading.Event()
+
+    def change() -> None:
+        with Limiter(limits, tmp_path).acquire("gui/501"):
+            started.set()
+
+    with Limiter(limits, tmp_path).acquire("system"):
+        thread = threading.Thread(target=change)
+        thread.start()
+
+        assert not started.wait(0.2)
+
+    thread.join(5)
+
+    assert started.is_set()
+
+
+def test_limiter_rate(tmp_path: Path):
+    limiter = Limiter(Limits(rate=20, burst=2), tmp_path)
+    start = time.perf_counter()
+
+    for _ in range(6):
+        with limiter.acquire("system"):
+            pass
+
+    # two changes start at once and each of the other four waits for a token (0.05s)
+    assert time.perf_counter() - start >= 0.18
+    assert len(tmp_path.joinpath("bucket").read_text(encoding="utf8").split()) == 2
+
+
+def test_limiter_async(tmp_path: Path):
+    limiter = Limiter(Limits(in_flight=2, domains={"gui": 1}), tmp_path)
+    running = [0]
+    peak = [0]
+
+    async def change(domain: str) -> None:
+        async with limiter.acquire_async(domain):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+
+    async def main() -> None:
+        await asyncio.gather(*[change(domain) for domain in ["gui/501"] * 3 + ["system"] * 3])
+
+    asyncio.run(main())
+
+    assert peak[0] == 2
+
+
+def test_limiter_async_rate(tmp_path: Path):
+    limiter = Limiter(Limits(rate=20, burst=2), tmp_path)
+
+    async def main() -> None:
+        for _ in range(6):
+            async with limiter.acquire_async("system"):
+                pass
+
+    start = time.perf_counter()
+    asyncio.run(main())
+
+    assert time.perf_counter() - start >= 0.18
+
+
+def test_limiter_async_disabled():
+    async def main() -> None:
+        async with Limiter().acquire_async("system"):
+            async with Limiter().acquire_async("system"):
+                pass
+
+    asyncio.run(main())
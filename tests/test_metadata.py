@@ -0,0 +1,166 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,protected-access
+
+import json
+import os
+from pathlib import Path
+import plistlib
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service import metadata
+from service.metadata import Metadata, MetadataCache, parse, read, save
+
+
+PLIST = {
+    "Label": "com.foo.label",
+    "ProgramArguments": ["/usr/local/bin/foo", "--bar"],
+    "KeepAlive": {"SuccessfulExit": False},
+    "RunAtLoad": True,
+    "StandardOutPath": "/tmp/foo.out",
+    "StandardErrorPath": "/tmp/foo.err",
+}
+METADATA = Metadata(
+    label="com.foo.label",
+    program="/usr/local/bin/foo",
+    program_arguments=("/usr/local/bin/foo", "--bar"),
+    run_at_load=True,
+    stdout_path="/tmp/foo.out",
+    stderr_path="/tmp/foo.err",
+)
+
+
+@pytest.fixture(name="reset", autouse=True)
+def reset_fixture(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metadata, "_cache", None)
+    metadata._read.cache_clear()
+
+
+@pytest.mark.parametrize("fmt", [plistlib.PlistFormat.FMT_XML, plistlib.PlistFormat.FMT_BINARY], ids=["xml", "binary"])
+def test_parse(tmp_path: Path, fmt: plistlib.PlistFormat):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(plistlib.dumps(PLIST, fmt=fmt))
+
+    assert parse(file) == METADATA
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        ({"Label": "x", "Program": "/bin/x", "ProgramArguments": ["x", "-y"]}, Metadata("x", "/bin/x", ("x", "-y"))),
+        ({"Label": "x", "ProgramArguments": "invalid"}, Metadata("x")),
+        ({"KeepAlive": True}, Metadata(keep_alive=True)),
+        ({"KeepAlive": {"SuccessfulExit": False}}, Metadata()),
+        ({"KeepAlive": {"PathState": {"/tmp/foo": True}}}, Metadata()),
+        ({"Disabled": True}, Metadata(disabled=True)),
+        ({"Disabled": "yes"}, Metadata()),
+    ],
+)
+def test_parse_fields(tmp_path: Path, data: dict, expected: Metadata):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(plistlib.dumps(data))
+
+    assert parse(file) == expected
+
+
+@pytest.mark.parametrize("content", [b"", b"not a plist", plistlib.dumps(["x"])], ids=["empty", "invalid", "array"])
+def test_parse_invalid(tmp_path: Path, content: bytes):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(content)
+
+    assert parse(file) == Metadata()
+
+
+def test_metadata_dict():
+    assert Metadata.from_dict(METADATA.to_dict()) == METADATA
+
+
+def test_read_memoized(mocker: MockerFixture, tmp_path: Path):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(plistlib.dumps(PLIST))
+    mock_parse = mocker.patch("service.metadata.parse", wraps=parse)
+
+    assert read(file) == METADATA
+    assert read(file) == METADATA
+    assert mock_parse.call_count == 1
+
+    file.write_bytes(plistlib.dumps({**PLIST, "Label": "com.foo.changed"}))
+
+    assert read(file).label == "com.foo.changed"
+    assert mock_parse.call_count == 2
+
+
+def test_read_missing(tmp_path: Path):
+    assert read(tmp_path / "foo.plist") == Metadata()
+
+
+def test_read_persisted(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch, tmp_path: Path, cache_dir: Path):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(plistlib.dumps(PLIST))
+
+    assert read(file) == METADATA
+
+    save()
+
+    assert cache_dir.joinpath("service", "metadata.json").is_file()
+
+    monkeypatch.setattr(metadata, "_cache", None)
+    metadata._read.cache_clear()
+    mock_parse = mocker.patch("service.metadata.parse")
+
+    assert read(file) == METADATA
+    mock_parse.assert_not_called()
+
+
+def test_invalidate(mocker: MockerFixture, tmp_path: Path):
+    file = tmp_path / "foo.plist"
+    file.write_bytes(plistlib.dumps(PLIST))
+    cache = MetadataCache(tmp_path / "metadata.json")
+    stat = os.stat(file)
+    key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    mocker.patch("service.metadata._get_cache", return_value=cache)
+
+    cache.put(str(file), key, METADATA)
+    metadata.invalidate(file)
+
+    assert cache.get(str(file), key) is None
+
+
+def test_cache_key_mismatch(tmp_path: Path):
+    cache = MetadataCache(tmp_path / "metadata.json")
+    cache.put("/foo.plist", (1, 2, 3), METADATA)
+
+    assert cache.get("/foo.plist", (1, 2, 3)) == METADATA
+    assert cache.get("/foo.plist", (1, 2, 4)) is None
+    assert cache.get("/bar.plist", (1, 2, 3)) is None
+
+
+def test_cache_load_version(tmp_path: Path):
+    file = tmp_path / "metadata.json"
+    service_file = tmp_path / "foo.plist"
+    service_file.touch()
+    cache = MetadataCache(file)
+    cache.put(str(service_file), (1, 2, 3), METADATA)
+    cache.save()
+
+    assert MetadataCache.load(file).get(str(service_file), (1, 2, 3)) == METADATA
+
+    file.write_text('{"version": 0, "entries": {}}', encoding="utf8")
+
+    assert MetadataCache.load(file).get(str(service_file), (1, 2, 3)) is None
+
+
+def test_cache_save_prunes(tmp_path: Path):
+    file = tmp_path / "metadata.json"
+    kept, removed = tmp_path / "foo.plist", tmp_path / "bar.plist"
+    kept.touch()
+    removed.touch()
+    cache = MetadataCache(file)
+    cache.put(str(kept), (1, 2, 3), METADATA)
+    cache.put(str(removed), (4, 5, 6), METADATA)
+    cache.save()
+    removed.unlink()
+    cache.put(str(kept), (1, 2, 4), METADATA)
+    cache.save()
+
+    assert json.loads(file.read_text(encoding="utf8"))["entries"].keys() == {str(kept)}
@@ -0,0 +1,196 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import subprocess
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.batch import Result
+from service.executor import FakeExecutor
+from service.launchctl import set_executor
+from service.operations import Operation, run
+from service.service import Service
+
+
+@pytest.mark.parametrize(
+    "operation,subcommands,message",
+    [
+        (Operation("disable"), ["disable"], "xserv disabled"),
+        (Operation("enable"), ["enable"], "xserv enabled"),
+        (Operation("restart"), ["kickstart"], "xserv restarted (kickstart)"),
+        (Operation("restart", strategy="reload"), ["bootout", "bootstrap"], "xserv restarted (reload)"),
+        (Operation("start"), ["bootstrap"], "xserv started"),
+        (Operation("start", enable=True), ["enable", "bootstrap"], "xserv enabled and started"),
+        (Operation("stop"), ["bootout"], "xserv stopped"),
+        (Operation("stop", disable=True), ["bootout", "disable"], "xserv stopped and disabled"),
+    ],
+)
+def test_operation(mocker: MockerFixture, operation: Operation, subcommands: list[str], message: str):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    executor = FakeExecutor()
+    previous = set_executor(executor)
+
+    try:
+        service = Service(Path("/Library/LaunchDaemons/xserv.plist"))
+        result = Result(service, value=operation(service))
+    finally:
+        set_executor(previous)
+
+    assert [command[1] for command in executor.commands] == subcommands
+    assert operation.describe(result) == message
+
+
+def test_operation_describe_error():
+    result = Result(Service(Path("/Library/LaunchDaemons/xserv.plist")), RuntimeError("Failed to start xserv"))
+
+    assert Operation("start").describe(result) == "Failed to start xserv"
+
+
+def test_operation_unknown():
+    with pytest.raises(ValueError, match='Unknown command "reload"'):
+        Operation("reload")(Service(Path("/Library/LaunchDaemons/xserv.plist")))
+
+
+@pytest.mark.parametrize(
+    "command,ordered,reverse,running",
+    [
+        ("disable", False, False, None),
+        ("restart", True, False, True),
+        ("start", True, False, True),
+        ("stop", True, True, False),
+    ],
+)
+def test_operation_order(command: str, ordered: bool, reverse: bool, running: t.Optional[bool]):
+    assert Operation(command).ordered == ordered
+    assert Operation(command).reverse == reverse
+    assert Operation(command).running == running
+
+
+@pytest.mark.parametrize(
+    "operation,subcommand,returncode,expected",
+    [
+        (Operation("start"), "bootstrap", 37, True),
+        (Operation("start", enable=True), "enable", 5, False),
+        (Operation("stop"), "bootout", 113, True),
+        (Operation("stop"), "bootout", 1, False),
+        (Operation("restart", strategy="reload"), "bootout", 113, False),
+        (Operation("disable"), "disable", 5, False),
+    ],
+)
+def test_operation_satisfied(
+    mocker: MockerFixture, operation: Operation, subcommand: str, returncode: int, expected: bool
+):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    previous = set_executor(FakeExecutor(returncodes={subcommand: returncode}))
+    service = Service(Path("/Library/LaunchDaemons/xserv.plist"))
+
+    try:
+        with pytest.raises(RuntimeError) as exc_info:
+            operation(service)
+    finally:
+        set_executor(previous)
+
+    assert operation.satisfied(Result(service, exc_info.value)) is expected
+
+
+def test_operation_to_dict():
+    assert Operation("start", enable=True).to_dict() == {
+        "command": "start",
+        "enable": True,
+        "disable": False,
+        "strategy": "kickstart",
+        "wait": None,
+    }
+
+
+@pytest.fixture(name="services")
+def services_fixture(mocker: MockerFixture) -> list[Service]:
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    return [Service(Path(f"/Library/LaunchDaemons/{name}.plist")) for name in ["xserv", "yserv", "zserv"]]
+
+
+@pytest.mark.parametrize(
+    "operation,pending,expected",
+    [
+        (
+            Operation("start"),
+            [],
+            (False, {"xserv started": True, "yserv started": True, "Failed to start zserv": False}),
+        ),
+        (
+            Operation("start", wait=5),
+            ["yserv"],
+            (
+                False,
+                {"xserv started": True, "Timed out waiting for yserv to start": False, "Failed to start zserv": False},
+            ),
+        ),
+        (
+            Operation("restart", strategy="reload", wait=5),
+            [],
+            (True, {"xserv restarted (reload)": True, "yserv restarted (reload)": True, "Failed to stop zserv": False}),
+        ),
+        (
+            Operation("stop", wait=5),
+            ["xserv", "yserv"],
+            (
+                False,
+                {
+                    "Timed out waiting for xserv to stop": False,
+                    "Timed out waiting for yserv to stop": False,
+                    "Failed to stop zserv": False,
+                },
+            ),
+        ),
+    ],
+)
+def test_run(
+    mocker: MockerFixture,
+    services: list[Service],
+    operation: Operation,
+    pending: list[str],
+    expected: tuple[bool, dict[str, bool]],
+):
+    mock_snapshot = mocker.patch("service.status.snapshot", return_value={})
+    mock_wait = mocker.patch(
+        "service.status.wait", side_effect=lambda targets, *_: [s for s in targets if s.name in pending]
+    )
+
+    def change(service: Service, subcommand: str, *args: str) -> None:
+        if service.name == "zserv":
+            raise subprocess.CalledProcessError(1, ["launchctl", subcommand, *args])
+
+    mocker.patch("service.launchctl._change", side_effect=change)
+
+    results = list(run(services, operation, jobs=1))
+    previous, messages = expected
+
+    assert {operation.describe(result): result.ok for result in results} == messages
+    assert mock_snapshot.called == previous
+
+    if operation.wait is not None:
+        targets, running, timeout, snapshot = mock_wait.call_args.args
+        assert [target.name for target in targets] == ["xserv", "yserv"]
+        assert running == operation.running
+        assert timeout == operation.wait
+        assert (snapshot is not None) == previous
+    else:
+        mock_wait.assert_not_called()
+
+
+def test_run_dependencies_already_started(services: list[Service]):
+    xserv, yserv, zserv = services
+    executor = FakeExecutor(returncodes={"bootstrap": 37})
+    previous = set_executor(executor)
+
+    try:
+        results = list(run(services, Operation("start"), dependencies={yserv: [xserv], zserv: [yserv]}))
+    finally:
+        set_executor(previous)
+
+    assert [str(result.error) for result in results] == [
+        f"{name} is already started" for name in ["xserv", "yserv", "zserv"]
+    ]
+    assert len(executor.commands) == 3
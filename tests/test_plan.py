@@ -0,0 +1,147 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.batch import Result
+from service.executor import FakeExecutor
+from service.launchctl import set_executor
+from service.plan import Action, compile_plan, parse_step, run, Step
+from service.service import Service
+
+
+@pytest.fixture(name="services")
+def services_fixture(mocker: MockerFixture) -> list[Service]:
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    return [Service(Path(f"/Library/LaunchDaemons/com.foo.{name}.plist")) for name in ["xserv", "yserv", "zserv"]]
+
+
+@pytest.mark.parametrize(
+    "commands,expected",
+    [
+        (["start"], ("start",)),
+        (["start", "start"], ("start",)),
+        (["stop", "start"], ("restart",)),
+        (["start", "restart"], ("restart",)),
+        (["restart", "stop"], ("stop",)),
+        (["stop", "enable", "start", "restart"], ("enable", "restart")),
+        (["enable", "start"], ("enable", "start")),
+        (["stop", "disable"], ("stop", "disable")),
+        (["disable", "stop", "enable", "disable"], ("stop", "disable")),
+        (["enable", "disable", "enable"], ("enable",)),
+    ],
+)
+def test_compile_plan(services: list[Service], commands: list[str], expected: tuple[str, ...]):
+    plan = compile_plan([Step(command, Service(services[0].path)) for command in commands])
+
+    assert plan.steps == len(commands)
+    assert [action.commands for action in plan.actions] == [expected]
+
+
+@pytest.mark.parametrize(
+    "commands,loaded,enabled,expected",
+    [
+        (["start"], ["com.foo.xserv"], None, ((), "already started")),
+        (["stop"], [], None, ((), "already stopped")),
+        (["stop", "start"], [], None, (("restart",), None)),
+        (["restart"], [], None, (("restart",), None)),
+        (["enable", "start"], ["com.foo.xserv"], {"com.foo.xserv": True}, ((), "already enabled, already started")),
+        (["enable", "start"], [], {"com.foo.xserv": False}, (("enable", "start"), None)),
+        (["disable"], None, {"com.foo.xserv": False}, ((), "already disabled")),
+        (["disable"], None, {}, (("disable",), None)),
+    ],
+)
+def test_compile_plan_state(
+    services: list[Service],
+    commands: list[str],
+    loaded: t.Optional[list[str]],
+    enabled: t.Optional[dict[str, bool]],
+    expected: tuple[tuple[str, ...], t.Optional[str]],
+):
+    plan = compile_plan([Step(command, services[0]) for command in commands], loaded=loaded, enabled=enabled)
+
+    assert plan.actions == [Action(services[0], expected[0], "kickstart", expected[1])]
+
+
+def test_compile_plan_unknown_command(services: list[Service]):
+    with pytest.raises(ValueError, match='Unknown command "reload"'):
+        compile_plan([Step("reload", services[0])])
+
+
+def test_plan_format(services: list[Service]):
+    steps = [
+        Step("stop", services[0]),
+        Step("enable", services[0]),
+        Step("start", services[0]),
+        Step("start", services[1]),
+        Step("stop", services[2]),
+    ]
+    plan = compile_plan(steps, strategy="reload", loaded=["com.foo.yserv"])
+
+    assert plan.calls == 3
+    assert list(plan.format()) == [
+        "launchctl enable system/com.foo.xserv",
+        "launchctl bootout system /Library/LaunchDaemons/com.foo.xserv.plist",
+        "launchctl bootstrap system /Library/LaunchDaemons/com.foo.xserv.plist",
+        "# com.foo.yserv unchanged (already started)",
+        "# com.foo.zserv unchanged (already stopped)",
+        "# 5 steps, 3 launchctl calls",
+    ]
+
+
+@pytest.mark.parametrize(
+    "commands,value,reason,expected",
+    [
+        (("enable", "restart"), "kickstart", None, "xserv enabled and restarted (kickstart)"),
+        (("stop", "disable"), None, None, "xserv stopped and disabled"),
+        (("restart",), "kickstart", "already enabled", "xserv restarted (kickstart) (already enabled)"),
+        ((), None, "already started", "xserv unchanged (already started)"),
+    ],
+)
+def test_action_describe(commands: tuple[str, ...], value: t.Optional[str], reason: t.Optional[str], expected: str):
+    action = Action(Service(Path("/Library/LaunchDaemons/xserv.plist")), commands, reason=reason)
+
+    assert action.describe(Result(action.service, value=value)) == expected
+    assert action.describe(Result(action.service, RuntimeError("Failed to start xserv"))) == "Failed to start xserv"
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("start:xserv", ("start", "xserv")),
+        ("stop  com.foo.xserv ", ("stop", "com.foo.xserv")),
+        ("restart: /Library/LaunchDaemons/x y.plist", ("restart", "/Library/LaunchDaemons/x y.plist")),
+    ],
+)
+def test_parse_step(text: str, expected: tuple[str, str]):
+    assert parse_step(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text,error", [("start", 'Invalid step "start"'), ("reload:xserv", 'Unknown command "reload" in step')]
+)
+def test_parse_step_invalid(text: str, error: str):
+    with pytest.raises(ValueError, match=error):
+        parse_step(text)
+
+
+def test_run(services: list[Service]):
+    executor = FakeExecutor(returncodes={"enable": 1})
+    previous = set_executor(executor)
+    steps = [
+        Step("start", services[0]),
+        Step("stop", services[1]),
+        Step("enable", services[2]),
+        Step("start", services[2]),
+    ]
+
+    try:
+        results = [(action.commands, result.ok) for action, result in run(compile_plan(steps), jobs=1)]
+    finally:
+        set_executor(previous)
+
+    assert results == [(("stop",), True), (("start",), True), (("enable", "start"), False)]
+    assert [command[1] for command in executor.commands] == ["bootout", "bootstrap", "enable"]
@@ -0,0 +1,61 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.index import ServiceIndex
+from service.resolver import get_resolver, Resolver
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("com.acme.worker.a", [("com.acme", "worker.a")]),
+        ("com.acme.sub.worker", [("com.acme", "sub.worker"), ("com.acme.sub", "worker")]),
+        ("com.acme", []),
+        ("org.acme.worker", []),
+        ("org.other.web", [("org.other", "web")]),
+    ],
+)
+def test_short_names(name: str, expected: list[tuple[str, str]]):
+    resolver = Resolver(["com.acme", "com.acme.sub", "org.other"])
+
+    assert list(resolver.short_names(name)) == expected
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_resolve(mocker: MockerFixture, tmp_path: Path, use_index: bool):
+    directories = [tmp_path / "LaunchAgents", tmp_path / "LaunchDaemons", tmp_path / "missing"]
+
+    for directory in directories[:2]:
+        directory.mkdir()
+        directory.joinpath("com.acme.web.plist").touch()
+        directory.joinpath("com.acme.web.txt").touch()
+
+    directories[0].joinpath("com.acme.sub.worker.plist").touch()
+    directories[1].joinpath("org.other.db.plist").touch()
+    resolver = Resolver(["com.acme", "com.acme.sub", "org.other"])
+    index = ServiceIndex(tmp_path / "index.json") if use_index else None
+    scandir = mocker.spy(os, "scandir")
+
+    assert resolver.resolve("web", directories, index) == [d / "com.acme.web.plist" for d in directories[:2]]
+    assert resolver.resolve("worker", directories, index) == [directories[0] / "com.acme.sub.worker.plist"]
+    assert resolver.resolve("sub.worker", directories, index) == [directories[0] / "com.acme.sub.worker.plist"]
+    assert resolver.resolve("db", directories, index) == [directories[1] / "org.other.db.plist"]
+    assert not resolver.resolve("other", directories, index)
+    assert scandir.call_count == 2
+
+    directories[1].joinpath("org.other.web.plist").touch()
+
+    with pytest.raises(ValueError, match='Service "web" is ambiguous: com.acme.web, org.other.web'):
+        resolver.resolve("web", directories, index)
+
+    assert scandir.call_count == 3
+
+
+def test_get_resolver():
+    assert get_resolver(("com.acme",)) is get_resolver(("com.acme",))
+    assert get_resolver(("com.acme",)) is not get_resolver(("org.other",))
@@ -0,0 +1,34 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import pytest
+
+from service.retry import RetryPolicy
+
+
+def test_delays():
+    delays = list(RetryPolicy(attempts=6, delay=0.1, max_delay=0.5).delays())
+
+    assert len(delays) == 5
+
+    for delay, high in zip(delays, [0.1, 0.2, 0.4, 0.5, 0.5]):
+        assert high / 2 <= delay <= high
+
+
+def test_delays_default():
+    assert not list(RetryPolicy().delays())
+
+
+@pytest.mark.parametrize(
+    "subcommand,returncode,expected",
+    [
+        ("bootstrap", 5, True),
+        ("bootstrap", 35, True),
+        ("bootstrap", 1, False),
+        ("bootout", 5, False),
+        ("kill", 35, True),
+    ],
+)
+def test_is_transient(subcommand: str, returncode: int, expected: bool):
+    policy = RetryPolicy(codes={"bootstrap": frozenset([5]), "*": frozenset([35])})
+
+    assert policy.is_transient(subcommand, returncode) == expected
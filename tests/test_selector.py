@@ -0,0 +1,113 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.config import Config
+from service.index import ServiceIndex
+from service.selector import is_pattern, resolve, resolve_dependencies, select, Selector
+from service.service import Service
+
+
+@pytest.mark.parametrize(
+    "name,expected", [("com.foo.*", True), ("com.foo.x?", True), ("com.foo.[ab]", True), ("com.foo.bar", False)]
+)
+def test_is_pattern(name: str, expected: bool):
+    assert is_pattern(name) == expected
+
+
+@pytest.mark.parametrize(
+    "patterns,expressions,name,expected",
+    [
+        (["com.acme.worker.*"], [], "com.acme.worker.a", True),
+        (["com.acme.worker.*"], [], "com.acme.web", False),
+        (["worker.*"], [], "com.acme.worker.a", True),
+        (["worker.*"], [], "org.acme.worker.a", False),
+        (["worker.*"], [], "com.acme.sub.worker.a", True),
+        (["a"], [], "com.acme.a", True),
+        (["*.a"], [], "com.acme.a", True),
+        ([], ["worker"], "com.acme.worker.a", True),
+        ([], ["^worker"], "com.acme.worker.a", False),
+        ([], ["^web$", r"\.a$"], "com.acme.worker.a", True),
+        (["web"], ["x"], "com.acme.worker.a", False),
+        ([], [], "com.acme.worker.a", False),
+    ],
+)
+def test_selector(patterns: list[str], expressions: list[str], name: str, expected: bool):
+    selector = Selector(patterns, expressions, ["com.acme", "com.acme.sub", "org.other"])
+
+    assert selector.matches(name) == expected
+
+
+def test_selector_invalid():
+    with pytest.raises(ValueError, match=r'Invalid regular expression "\(foo"'):
+        Selector(expressions=["bar", "(foo"])
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_select(mocker: MockerFixture, tmp_path: Path, use_index: bool):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    directories = [tmp_path / "LaunchAgents", tmp_path / "LaunchDaemons", tmp_path / "missing"]
+    mocker.patch("service.selector.get_paths", return_value=directories)
+
+    for directory in directories[:2]:
+        directory.mkdir()
+
+    for name in ["com.acme.worker.b", "com.acme.worker.a", "com.acme.web", "invalid.worker.c"]:
+        directories[0].joinpath(f"{name}.plist").touch()
+
+    directories[1].joinpath("com.acme.worker.d.plist").touch()
+    directories[1].joinpath("com.acme.worker.e.txt").touch()
+
+    def validate(service) -> None:
+        if service.name.startswith("invalid"):
+            raise RuntimeError("invalid")
+
+    mocker.patch("service.selector.Service.validate", autospec=True, side_effect=validate)
+    mock_is_file = mocker.patch("service.service.Path.is_file")
+    index = ServiceIndex(tmp_path / "index.json") if use_index else None
+
+    services = select(Selector(["*.worker.*"]), index)
+
+    assert [service.name for service in services] == ["com.acme.worker.a", "com.acme.worker.b", "com.acme.worker.d"]
+    mock_is_file.assert_not_called()
+
+
+def test_resolve_dependencies(mocker: MockerFixture, tmp_path: Path):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    services = []
+
+    for name in ["db", "proxy", "worker"]:
+        tmp_path.joinpath(f"com.bar.foo.{name}.plist").touch()
+        services.append(Service(tmp_path / f"com.bar.foo.{name}.plist"))
+
+    config = Config(["com.bar.foo"], {"worker": ["proxy", "missing"], "other": ["db"], "proxy": ["db"]})
+
+    assert resolve_dependencies(services, config, None) == {services[2]: [services[1]], services[1]: [services[0]]}
+
+
+def test_resolve(service_dir: Path):
+    services, errors = resolve(
+        ["com.acme.worker.b", "missing", "worker.*", "db.*"],
+        ["web$", "^x"],
+        ["com.acme"],
+        ServiceIndex(service_dir / "i"),
+    )
+    assert [service.name for service in services] == ["com.acme.worker.b", "com.acme.web", "com.acme.worker.a"]
+    assert errors == ['Service "missing" not found', 'No services match "db.*"', 'No services match "^x"']
+
+
+@pytest.mark.usefixtures("service_dir")
+def test_resolve_unique():
+    services, errors = resolve(["web", "com.acme.worker.b", "com.acme.web", "worker.*"], (), ["com.acme"])
+
+    assert [service.name for service in services] == ["com.acme.web", "com.acme.worker.b", "com.acme.worker.a"]
+    assert not errors
+
+
+def test_resolve_invalid_expression():
+    with pytest.raises(ValueError, match="Invalid regular expression"):
+        resolve(["foo"], ["(x"])
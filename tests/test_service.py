@@ -1,13 +1,17 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring
 
 from contextlib import nullcontext as does_not_raise
+import os
 from pathlib import Path
+import plistlib
 
 import pytest
 from pytest_mock import MockerFixture
 
+from service.domain import DomainContext
+from service.index import ServiceIndex
 from service.launchctl import DOMAIN_GUI, DOMAIN_SYS
-from service.service import Service, get_paths, locate
+from service.service import discover, Service, get_paths, locate
 
 
 @pytest.mark.parametrize("domain", [DOMAIN_SYS, DOMAIN_GUI])
@@ -19,11 +23,40 @@ def test_service(mocker: MockerFixture, domain: str):
 
     assert service.domain == f"{domain}{'/500' if domain == DOMAIN_GUI else ''}"
     assert service.file == str(path.absolute())
-    assert service.id == (f"{DOMAIN_SYS}/{path.stem}" if domain == DOMAIN_SYS else "")
+    assert service.id == f"{service.domain}/{path.stem}"
     assert service.name == path.stem
     assert service.path == path
 
 
+def test_service_context(mocker: MockerFixture):
+    mock_getenv = mocker.patch("service.domain.os.getenv", return_value="")
+    service = Service(Path("/Users/foo/Library/LaunchAgents/xserv.plist"), DomainContext(501, Path("/Users/foo")))
+
+    assert service.domain == "gui/501"
+    assert service.context == DomainContext(501, Path("/Users/foo"))
+    service.validate()
+    mock_getenv.assert_not_called()
+
+    with pytest.raises(AttributeError):
+        service.extra = True  # type: ignore  # pylint: disable=assigning-non-slot
+
+
+def test_service_label(mocker: MockerFixture, tmp_path: Path):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    path = tmp_path / "xserv.plist"
+    path.write_bytes(plistlib.dumps({"Label": "com.foo.xserv", "ProgramArguments": ["/bin/xserv"]}))
+    service = Service(path)
+
+    assert service.label == "com.foo.xserv"
+    assert service.id == f"{DOMAIN_SYS}/com.foo.xserv"
+    assert service.metadata.program == "/bin/xserv"
+    assert service.name == "xserv"
+
+
+def test_service_label_missing(plist: Path):
+    assert Service(plist).label == plist.stem
+
+
 @pytest.mark.parametrize(
     "base_path", ["/Library/LaunchAgents", "/System/Library/LaunchAgents", "/Users/foo/Library/LaunchAgents"]
 )
@@ -45,6 +78,30 @@ def test_service_validate(mocker: MockerFixture, domain: str, base_path: str):
         service.validate()
 
 
+def test_discover(mocker: MockerFixture, tmp_path: Path):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    directories = [tmp_path / "LaunchAgents", tmp_path / "LaunchDaemons", tmp_path / "missing"]
+    mocker.patch("service.service.get_paths", return_value=directories)
+
+    def validate(service: Service) -> None:
+        if service.name == "invalid":
+            raise RuntimeError("invalid")
+
+    mocker.patch.object(Service, "validate", autospec=True, side_effect=validate)
+
+    for directory, name in zip(directories[:2], ["xserv", "yserv"]):
+        directory.mkdir()
+        directory.joinpath(f"com.foo.{name}.plist").touch()
+        directory.joinpath("README").touch()
+
+    directories[0].joinpath("invalid.plist").touch()
+
+    assert [service.path for service in discover()] == [
+        directories[0] / "com.foo.xserv.plist",
+        directories[1] / "com.foo.yserv.plist",
+    ]
+
+
 @pytest.mark.parametrize(
     "name",
     [
@@ -69,6 +126,12 @@ def test_locate(mocker: MockerFixture, exists: bool, reverse_domains: list[str],
     mocker.patch("service.service.Path.is_file", return_value=exists)
     name_has_path = len(name.split("/")) > 1
     name_has_reverse_domain = len(name.split(".")) > 2
+    mock_get_resolver = mocker.patch("service.service.get_resolver")
+    mock_get_resolver.return_value.resolve.side_effect = lambda short_name, *_: [
+        Path(f"~/Library/LaunchAgents/{reverse_domain}.{short_name}.plist").expanduser()
+        for reverse_domain in reverse_domains
+        if exists
+    ]
 
     context = does_not_raise()
 
@@ -92,6 +155,101 @@ def test_locate(mocker: MockerFixture, exists: bool, reverse_domains: list[str],
 
         assert result.path == Path(resolved_name).expanduser().absolute()
 
+    if reverse_domains and not name_has_path and not name_has_reverse_domain:
+        mock_get_resolver.assert_called_once_with(tuple(reverse_domains))
+    else:
+        mock_get_resolver.assert_not_called()
+
+
+@pytest.mark.parametrize("index", [True, False])
+def test_locate_resolver(mocker: MockerFixture, tmp_path: Path, index: bool):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    reverse_domains = [f"com.foo{i}" for i in range(300)]
+
+    for name in ["com.foo7.xserv", "com.foo7.yserv", "com.foo9.yserv"]:
+        tmp_path.joinpath(f"{name}.plist").touch()
+
+    is_file = mocker.spy(Path, "is_file")
+    service_index = ServiceIndex(tmp_path / "index.json") if index else None
+
+    assert locate("xserv", reverse_domains, service_index).path == tmp_path / "com.foo7.xserv.plist"
+    assert is_file.call_count == 1
+
+    with pytest.raises(ValueError, match='Service "yserv" is ambiguous: com.foo7.yserv, com.foo9.yserv'):
+        locate("yserv", reverse_domains, service_index)
+
+    with pytest.raises(ValueError, match='Service "zserv" not found'):
+        locate("zserv", reverse_domains, service_index)
+
+    tmp_path.joinpath("com.foo299.zserv.plist").touch()
+
+    assert locate("zserv", reverse_domains, service_index).path == tmp_path / "com.foo299.zserv.plist"
+
+
+@pytest.mark.parametrize("stale", [True, False])
+def test_locate_with_index(mocker: MockerFixture, tmp_path: Path, stale: bool):
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild([tmp_path])
+    file = tmp_path / "com.foo.bar.xserv.plist"
+    file.touch()
+
+    refresh = mocker.spy(index, "refresh")
+
+    if not stale:
+        index.rebuild([tmp_path])
+
+    is_file = mocker.spy(Path, "is_file")
+    result = locate("xserv", ["org.foo.bar", "com.foo.bar"], index)
+
+    assert result.path == file
+    assert is_file.call_count == 1
+
+    if stale:
+        refresh.assert_called_once_with([tmp_path])
+
+
+def test_locate_with_index_shadowed(mocker: MockerFixture, tmp_path: Path):
+    directories = [tmp_path / "LaunchAgents", tmp_path / "LaunchDaemons"]
+
+    for directory in directories:
+        directory.mkdir()
+
+    directories[1].joinpath("com.foo.bar.xserv.plist").touch()
+    mocker.patch("service.service.os.getenv", return_value="x")  # use system domain
+    mocker.patch("service.service.get_paths", return_value=directories)
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild(directories)
+    directories[0].joinpath("com.foo.bar.xserv.plist").touch()
+    os.utime(directories[0], ns=(0, 0))
+
+    assert locate("com.foo.bar.xserv", [], index).path == directories[0] / "com.foo.bar.xserv.plist"
+
+
+def test_locate_context(mocker: MockerFixture, tmp_path: Path):
+    mock_get_paths = mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    tmp_path.joinpath("com.foo.bar.xserv.plist").touch()
+    context = DomainContext()
+
+    assert locate("com.foo.bar.xserv", [], context=context).context is context
+    mock_get_paths.assert_called_once_with(context)
+
+
+def test_locate_with_index_not_found(mocker: MockerFixture, tmp_path: Path):
+    mocker.patch("service.service.get_paths", return_value=[tmp_path])
+    index = ServiceIndex(tmp_path / "index.json")
+
+    with pytest.raises(ValueError, match='Service "xserv" not found'):
+        locate("xserv", ["com.foo.bar"], index)
+
+
+def test_get_paths_context(tmp_path: Path):
+    tmp_path.joinpath("Library", "LaunchAgents").mkdir(parents=True)
+
+    assert get_paths(DomainContext(501, tmp_path)) == [tmp_path / "Library" / "LaunchAgents"]
+
 
 @pytest.mark.parametrize("exists", [True, False])
 @pytest.mark.parametrize("domain", [DOMAIN_SYS, DOMAIN_GUI])
@@ -0,0 +1,74 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import os
+from pathlib import Path
+import re
+import subprocess
+import sys
+import typing as t
+
+import pytest
+
+
+# Import time budgets in microseconds, as reported by `python -X importtime`.
+STARTUP_BUDGET = 250_000
+PACKAGE_BUDGET = 20_000
+
+# Modules that are only needed once a command runs.
+DEFERRED_MODULES = [
+    "concurrent.futures",
+    "plistlib",
+    "service.index",
+    "service.launchctl",
+    "service.service",
+    "subprocess",
+]
+
+
+def import_times(*args: str, env: t.Optional[dict[str, str]] = None) -> dict[str, int]:
+    """Run the program and get the self import time of each imported module."""
+    code = "import sys; from service.cli import cli; cli(sys.argv[1:], prog_name='service')"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args], capture_output=True, check=False, env=env, text=True
+    )
+    times = {}
+
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)$", line)
+
+        if match:
+            times[match.group(2)] = int(match.group(1))
+
+    return times
+
+
+def package_time(times: dict[str, int]) -> int:
+    """Get the self import time of the package modules."""
+    return sum(time for name, time in times.items() if name.split(".")[0] == "service")
+
+
+@pytest.mark.parametrize("args", [["--help"], ["start", "--help"]], ids=["help", "command-help"])
+def test_startup(args: list[str]):
+    times = import_times(*args)
+
+    assert "service.cli" in times
+    assert not [name for name in DEFERRED_MODULES if name in times]
+    assert package_time(times) < PACKAGE_BUDGET
+    assert sum(times.values()) < STARTUP_BUDGET
+
+
+@pytest.mark.skipif(sys.platform != "darwin", reason="macOS only")
+def test_startup_command(tmp_path: Path):
+    tmp_path.joinpath("Library", "LaunchAgents").mkdir(parents=True)
+    env = {
+        **os.environ,
+        "HOME": str(tmp_path),
+        "SERVICE_JOURNAL": str(tmp_path / "journal"),
+        "XDG_CACHE_HOME": str(tmp_path / "cache"),
+    }
+    env.pop("SUDO_USER", None)
+    times = import_times("--no-daemon", "start", "--match", "^nomatch$", env=env)
+
+    assert "service.selector" in times
+    assert package_time(times) < PACKAGE_BUDGET
+    assert sum(times.values()) < STARTUP_BUDGET
@@ -0,0 +1,205 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import plistlib
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.executor import FakeExecutor
+from service.launchctl import set_executor
+from service.service import Service
+from service.status import enabled_states, parse_disabled, parse_list, query, ServiceState, snapshot, Status, wait
+
+
+LIST_OUTPUT = (
+    "PID\tStatus\tLabel\n123\t0\tcom.foo.xserv\n-\t78\tcom.foo.yserv\n-\t-9\tcom.foo.zserv\nbad line\nx\t0\tbad\n"
+)
+
+DISABLED_OUTPUT = (
+    'disabled services = {\n\t"com.foo.xserv" => enabled\n\t"com.foo.yserv" => disabled\n'
+    '\t"com.foo.zserv" => true\n\t"com.foo.aserv" => false\n\t"com.foo.bserv" => unknown\n}\n'
+)
+
+
+@pytest.fixture(name="executor")
+def executor_fixture() -> t.Iterator[FakeExecutor]:
+    executor = FakeExecutor(outputs={"list": LIST_OUTPUT.encode()})
+    previous = set_executor(executor)
+    yield executor
+    set_executor(previous)
+
+
+def test_parse_list():
+    assert list(parse_list(LIST_OUTPUT.splitlines(keepends=True))) == [
+        Status("com.foo.xserv", 123, 0),
+        Status("com.foo.yserv", None, 78),
+        Status("com.foo.zserv", None, -9),
+    ]
+
+
+def test_parse_disabled():
+    assert list(parse_disabled(DISABLED_OUTPUT.splitlines(keepends=True))) == [
+        ("com.foo.xserv", True),
+        ("com.foo.yserv", False),
+        ("com.foo.zserv", False),
+        ("com.foo.aserv", True),
+    ]
+
+
+def test_enabled_states():
+    executor = FakeExecutor(outputs={"print-disabled": DISABLED_OUTPUT.encode()})
+    previous = set_executor(executor)
+
+    try:
+        assert enabled_states() == {
+            "com.foo.xserv": True,
+            "com.foo.yserv": False,
+            "com.foo.zserv": False,
+            "com.foo.aserv": True,
+        }
+    finally:
+        set_executor(previous)
+
+    assert executor.commands == [["launchctl", "print-disabled", "system"]]
+
+
+def test_enabled_states_failure():
+    previous = set_executor(FakeExecutor(returncodes={"print-disabled": 1}))
+
+    try:
+        with pytest.raises(RuntimeError, match='Failed to list disabled services in the "system" domain'):
+            enabled_states()
+    finally:
+        set_executor(previous)
+
+
+def test_snapshot(executor: FakeExecutor):
+    result = snapshot()
+
+    assert list(result) == ["com.foo.xserv", "com.foo.yserv", "com.foo.zserv"]
+    assert executor.commands == [["launchctl", "list"]]
+
+
+def test_snapshot_failure():
+    previous = set_executor(FakeExecutor(returncodes={"list": 1}))
+
+    try:
+        with pytest.raises(RuntimeError, match="Failed to list loaded services"):
+            snapshot()
+    finally:
+        set_executor(previous)
+
+
+@pytest.mark.usefixtures("executor")
+def test_query():
+    services = [Service(Path(f"/Library/LaunchAgents/com.foo.{name}.plist")) for name in ["xserv", "yserv", "aserv"]]
+    states = query(services)
+
+    assert [state.state for state in states] == ["running", "loaded", "unloaded"]
+    assert [state.status for state in states] == [
+        Status("com.foo.xserv", 123, 0),
+        Status("com.foo.yserv", None, 78),
+        None,
+    ]
+
+
+def test_query_label(tmp_path: Path, executor: FakeExecutor):
+    file = tmp_path / "xserv.plist"
+    file.write_bytes(plistlib.dumps({"Label": "com.foo.xserv"}))
+    service = Service(file)
+
+    assert query([service]) == [ServiceState(service, Status("com.foo.xserv", 123, 0))]
+    assert executor.commands == [["launchctl", "list"]]
+
+
+def test_query_with_snapshot(executor: FakeExecutor):
+    service = Service(Path("com.foo.xserv.plist"))
+
+    assert query([service], {}) == [ServiceState(service, None)]
+    assert not executor.commands
+
+
+def test_service_state_to_dict(mocker: MockerFixture):
+    mocker.patch("service.service.os.getenv", return_value="x")
+    service = Service(Path("/Library/LaunchAgents/com.foo.xserv.plist"))
+
+    assert ServiceState(service, Status("com.foo.xserv", 123, 0)).to_dict() == {
+        "name": "com.foo.xserv",
+        "label": "com.foo.xserv",
+        "path": "/Library/LaunchAgents/com.foo.xserv.plist",
+        "domain": "system",
+        "state": "running",
+        "pid": 123,
+        "last_exit_status": 0,
+    }
+    assert ServiceState(service, None).to_dict()["pid"] is None
+
+
+@pytest.fixture(name="clock")
+def clock_fixture(mocker: MockerFixture) -> list[float]:
+    sleeps: list[float] = []
+    now = [0.0]
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    mocker.patch("service.status.time.monotonic", side_effect=lambda: now[0])
+    mocker.patch("service.status.time.sleep", side_effect=sleep)
+
+    return sleeps
+
+
+@pytest.mark.parametrize(
+    "running,snapshots,expected",
+    [
+        (True, ([{}, {"com.foo.xserv": Status("com.foo.xserv", 1, None)}], None), ([], 2)),
+        (True, ([{"com.foo.xserv": Status("com.foo.xserv", None, 0)}] * 100, None), (["com.foo.xserv"], None)),
+        (
+            True,
+            (
+                [
+                    {"com.foo.xserv": Status("com.foo.xserv", 1, None)},
+                    {"com.foo.xserv": Status("com.foo.xserv", 2, None)},
+                ],
+                {"com.foo.xserv": Status("com.foo.xserv", 1, None)},
+            ),
+            ([], 2),
+        ),
+        (False, ([{"com.foo.xserv": Status("com.foo.xserv", 1, None)}, {}], None), ([], 2)),
+        (False, ([{"com.foo.xserv": Status("com.foo.xserv", None, 0)}], None), ([], 1)),
+    ],
+)
+def test_wait(
+    mocker: MockerFixture,
+    clock: list[float],
+    running: bool,
+    snapshots: tuple[list[dict[str, Status]], t.Optional[dict[str, Status]]],
+    expected: tuple[list[str], t.Optional[int]],
+):
+    snapshots_list, previous = snapshots
+    pending, polls = expected
+    mock_snapshot = mocker.patch("service.status.snapshot", side_effect=snapshots_list)
+    services = [Service(Path("com.foo.xserv.plist"))]
+
+    result = wait(services, running, 10, previous, initial_delay=0.1, max_delay=1)
+
+    assert [service.name for service in result] == pending
+    assert len(clock) == mock_snapshot.call_count - 1
+    assert all(0.05 <= delay <= 1 for delay in clock[:-1])
+
+    if polls is not None:
+        assert mock_snapshot.call_count == polls
+    else:
+        assert sum(clock) == pytest.approx(10)
+        assert 10 < mock_snapshot.call_count < 30
+
+
+def test_wait_batches_polls(mocker: MockerFixture, clock: list[float]):  # pylint: disable=unused-argument
+    loaded = {f"com.foo.{i}": Status(f"com.foo.{i}", i + 1, None) for i in range(50)}
+    mock_snapshot = mocker.patch("service.status.snapshot", side_effect=[{}, loaded])
+
+    assert not wait([Service(Path(f"com.foo.{i}.plist")) for i in range(50)], True, 10)
+    assert mock_snapshot.call_count == 2
@@ -0,0 +1,107 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import json
+from pathlib import Path
+import typing as t
+
+import pytest
+
+from service import timing
+from service.timing import Recorder, span, timed, write_jsonl, write_prometheus
+
+
+@pytest.fixture(name="recorder")
+def recorder_fixture() -> t.Iterator[Recorder]:
+    recorder = timing.enable()
+    yield recorder
+    timing.disable()
+
+
+def test_disabled():
+    @timed("foo")
+    def work() -> int:
+        return 1
+
+    assert timing.get_recorder() is None
+    assert span("foo") is span("bar")
+
+    with span("foo") as item:
+        item.set(x=1)
+
+    assert work() == 1
+
+
+def test_enable_disable():
+    recorder = timing.enable()
+
+    assert timing.get_recorder() is recorder
+    assert timing.disable() is recorder
+    assert timing.get_recorder() is None
+
+
+def test_span(recorder: Recorder):
+    with span("foo", x=1) as item:
+        item.set(y=2)
+
+    with pytest.raises(ValueError):
+        with span("bar"):
+            raise ValueError("bar")
+
+    assert [(item.name, item.attributes) for item in recorder.spans] == [("foo", {"x": 1, "y": 2}), ("bar", {})]
+    assert all(item.duration >= 0 for item in recorder.spans)
+
+
+def test_timed(recorder: Recorder):
+    @timed("foo")
+    def work(value: int) -> int:
+        return value
+
+    assert work(1) == 1
+    assert work.__name__ == "work"
+    assert [item.name for item in recorder.spans] == ["foo"]
+
+
+def test_summary():
+    recorder = Recorder()
+    recorder.record("foo", 0.0, 1.0, {})
+    recorder.record("bar", 0.0, 2.0, {"x": 1})
+    recorder.record("foo", 0.0, 3.0, {})
+
+    assert recorder.summary() == {"foo": (2, 4.0, 3.0), "bar x=1": (1, 2.0, 2.0)}
+
+
+def test_write_jsonl(tmp_path: Path):
+    file = tmp_path / "profile" / "spans.jsonl"
+    recorder = Recorder()
+    recorder.record("foo", 1.0, 2.0, {"x": 1})
+
+    write_jsonl(recorder, file, command="start")
+    write_jsonl(recorder, file, command="stop")
+    write_jsonl(Recorder(), file)
+
+    assert [json.loads(line) for line in file.read_text(encoding="utf8").splitlines()] == [
+        {"command": "start", "name": "foo", "start": 1.0, "duration": 2.0, "x": 1},
+        {"command": "stop", "name": "foo", "start": 1.0, "duration": 2.0, "x": 1},
+    ]
+
+
+def test_write_prometheus(tmp_path: Path):
+    file = tmp_path / "service.prom"
+    recorder = Recorder()
+    recorder.record("launchctl", 0.0, 0.5, {"subcommand": "bootstrap", "returncode": 0})
+    recorder.record("locate", 0.0, 0.25, {})
+    recorder.record("locate", 0.0, 0.25, {"name": 'a"b'})
+
+    write_prometheus(recorder, file)
+    write_prometheus(recorder, file)
+
+    assert file.read_text(encoding="utf8") == (
+        "# HELP service_span_seconds Time spent in service operations.\n"
+        "# TYPE service_span_seconds summary\n"
+        'service_span_seconds_count{span="launchctl",returncode="0",subcommand="bootstrap"} 2.0\n'
+        'service_span_seconds_count{span="locate",name="a\\"b"} 2.0\n'
+        'service_span_seconds_count{span="locate"} 2.0\n'
+        'service_span_seconds_sum{span="launchctl",returncode="0",subcommand="bootstrap"} 1.0\n'
+        'service_span_seconds_sum{span="locate",name="a\\"b"} 0.5\n'
+        'service_span_seconds_sum{span="locate"} 0.5\n'
+    )
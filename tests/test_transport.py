@@ -0,0 +1,99 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,protected-access
+
+from pathlib import Path
+
+import pytest
+
+from service.executor import SessionExecutor
+from service.transport import get_transport, LocalTransport, SSHTransport, Transport
+
+
+@pytest.fixture(name="ssh")
+def ssh_fixture(tmp_path: Path) -> Path:
+    """A stand-in ssh program that runs the remote command locally and logs its arguments."""
+    file = tmp_path / "ssh"
+    file.write_text(
+        "#!/bin/sh\n"
+        f'echo "$@" >>"{tmp_path}/ssh.args"\n'
+        "for last; do :; done\n"
+        'case " $* " in\n'
+        '  *" -N "*) [ -z "$SSH_FAIL" ] || { echo "Connection refused" >&2; exit 255; }; exit 0 ;;\n'
+        '  *" -O "*) exit 0 ;;\n'
+        "esac\n"
+        'exec /bin/sh -c "$last"\n',
+        encoding="utf8",
+    )
+    file.chmod(0o755)
+    return file
+
+
+@pytest.mark.parametrize(
+    "spec,cls,host",
+    [("h1", SSHTransport, "h1"), ("ssh://admin@h1", SSHTransport, "admin@h1"), ("local://h2", LocalTransport, "h2")],
+)
+def test_get_transport(spec: str, cls: type[Transport], host: str):
+    transport = get_transport(spec)
+
+    assert isinstance(transport, cls)
+    assert transport.host == host
+
+
+@pytest.mark.parametrize(
+    "spec,error",
+    [("telnet://h1", 'Unknown transport "telnet" for host "telnet://h1"'), ("ssh://", 'Invalid host "ssh://"')],
+)
+def test_get_transport_invalid(spec: str, error: str):
+    with pytest.raises(ValueError, match=error):
+        get_transport(spec)
+
+
+def test_local_transport():
+    with LocalTransport() as transport:
+        assert transport.host == "localhost"
+        assert transport.command(["launchctl", "list"]) == ["launchctl", "list"]
+
+
+def test_transport():
+    with pytest.raises(TypeError):
+        Transport("h1")  # type: ignore  # pylint: disable=abstract-class-instantiated
+
+
+@pytest.mark.usefixtures("launchctl")
+def test_ssh_transport(tmp_path: Path, ssh: Path):
+    transport = SSHTransport("h1", program=str(ssh))
+
+    with pytest.raises(RuntimeError, match='The SSH connection to "h1" is not open'):
+        transport.command(["launchctl", "list"])
+
+    with transport:
+        control = transport._dir
+
+        with SessionExecutor(size=2, transport=transport) as executor:
+            assert executor.run("print", "gui/501").stdout == b"print gui/501\n"
+            assert executor.run("list").stdout == b"list\n"
+
+    calls = [line for line in tmp_path.joinpath("ssh.args").read_text(encoding="utf8").splitlines() if line[0] == "-"]
+
+    assert control is not None and not control.exists()
+    assert "ControlMaster=yes" in calls[0] and calls[0].endswith("-N -f h1")
+    assert "ServerAliveInterval=15" in calls[0] and "ServerAliveCountMax=3" in calls[0]
+    assert len(calls) == 3
+    assert calls[1].startswith("-T") and "ControlMaster=no" in calls[1] and f"ControlPath={control}/master" in calls[1]
+    assert calls[2].endswith("-O exit h1")
+
+
+def test_ssh_transport_sessions():
+    assert SSHTransport("h1").max_sessions == 10
+    assert LocalTransport().max_sessions is None
+    assert SessionExecutor(size=12, transport=SSHTransport("h1"))._size == 10
+    assert SessionExecutor(size=12, transport=LocalTransport())._size == 12
+
+
+def test_ssh_transport_unreachable(monkeypatch: pytest.MonkeyPatch, ssh: Path):
+    monkeypatch.setenv("SSH_FAIL", "1")
+    transport = SSHTransport("h1", program=str(ssh))
+
+    with pytest.raises(RuntimeError, match='Cannot connect to "h1": Connection refused'):
+        transport.open()
+
+    assert transport._dir is None
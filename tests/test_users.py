@@ -0,0 +1,45 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+from pathlib import Path
+import pwd
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.domain import DomainContext
+from service.users import get_users, User
+
+
+def entry(name: str, uid: int) -> pwd.struct_passwd:
+    return pwd.struct_passwd((name, "*", uid, 20, "", f"/Users/{name}", "/bin/zsh"))
+
+
+def test_user():
+    assert User("foo", 501, Path("/Users/foo")).context == DomainContext(501, Path("/Users/foo"))
+
+
+def test_get_users(mocker: MockerFixture):
+    entries = {502: entry("bar", 502), 501: entry("foo", 501)}
+    mocker.patch("service.users.pwd.getpwuid", side_effect=entries.__getitem__)
+    mock_exists = mocker.patch("service.users.launchctl.domain_exists")
+
+    assert get_users([502, 501, 502]) == [User("foo", 501, Path("/Users/foo")), User("bar", 502, Path("/Users/bar"))]
+    mock_exists.assert_not_called()
+
+
+def test_get_users_unknown(mocker: MockerFixture):
+    mocker.patch("service.users.pwd.getpwuid", side_effect=KeyError)
+
+    with pytest.raises(ValueError, match="Unknown user ID 600"):
+        get_users([600])
+
+
+def test_get_users_logged_in(mocker: MockerFixture):
+    mocker.patch(
+        "service.users.pwd.getpwall",
+        return_value=[entry("root", 0), entry("baz", 503), entry("foo", 501), entry("bar", 502)],
+    )
+    mock_exists = mocker.patch("service.users.launchctl.domain_exists", side_effect=lambda domain: domain != "gui/502")
+
+    assert [user.name for user in get_users(jobs=2)] == ["foo", "baz"]
+    assert sorted(call.args[0] for call in mock_exists.call_args_list) == ["gui/501", "gui/502", "gui/503"]
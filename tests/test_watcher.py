@@ -0,0 +1,174 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring
+
+import os
+from pathlib import Path
+import select
+import sys
+import typing as t
+
+import pytest
+from pytest_mock import MockerFixture
+
+from service.index import ServiceIndex
+from service.watcher import (
+    ADDED,
+    apply,
+    Change,
+    get_watcher,
+    InotifyWatcher,
+    KqueueWatcher,
+    MODIFIED,
+    PollingWatcher,
+    RESCAN,
+    REMOVED,
+    Watcher,
+)
+
+
+BACKENDS: list[t.Any] = [
+    pytest.param(InotifyWatcher, marks=pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")),
+    pytest.param(
+        lambda directories: KqueueWatcher(directories, rescan_interval=0.05),
+        marks=pytest.mark.skipif(not hasattr(select, "kqueue"), reason="kqueue only"),
+    ),
+    pytest.param(lambda directories: PollingWatcher(directories, interval=0.01)),
+]
+
+
+@pytest.fixture(name="directory")
+def directory_fixture(tmp_path: Path) -> Path:
+    directory = tmp_path / "LaunchAgents"
+    directory.mkdir()
+    directory.joinpath("com.foo.xserv.plist").write_text("x", encoding="utf8")
+    directory.joinpath("com.foo.yserv.plist").touch()
+
+    return directory
+
+
+def read_all(watcher: Watcher) -> set[Change]:
+    changes = set()
+
+    while True:
+        batch = watcher.read(0.2)
+
+        if not batch:
+            return changes
+
+        changes.update(batch)
+
+
+def test_watcher(directory: Path):
+    with pytest.raises(TypeError):
+        Watcher([directory])  # type: ignore  # pylint: disable=abstract-class-instantiated
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_read(directory: Path, backend: t.Callable[[list[Path]], Watcher]):
+    with backend([directory]) as watcher:
+        assert not watcher.read(0)
+
+        directory.joinpath("com.foo.zserv.plist").touch()
+        directory.joinpath("com.foo.yserv.plist").unlink()
+        directory.joinpath("com.foo.xserv.plist").write_text("xx", encoding="utf8")
+        directory.joinpath("README").touch()
+
+        assert read_all(watcher) == {
+            Change(directory, "com.foo.zserv.plist", ADDED),
+            Change(directory, "com.foo.yserv.plist", REMOVED),
+            Change(directory, "com.foo.xserv.plist", MODIFIED),
+        }
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_inotify_removed_directory(directory: Path):
+    with InotifyWatcher([directory]) as watcher:
+        for file in directory.iterdir():
+            file.unlink()
+
+        directory.rmdir()
+
+        assert Change(directory, "", RESCAN) in read_all(watcher)
+        assert not watcher.watched
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_read_recreated_directory(directory: Path, backend: t.Callable[[list[Path]], Watcher]):
+    with backend([directory]) as watcher:
+        for file in directory.iterdir():
+            file.unlink()
+
+        directory.rmdir()
+        read_all(watcher)
+        directory.mkdir()
+        read_all(watcher)
+
+        assert watcher.watched == [directory]
+
+        directory.joinpath("com.foo.zserv.plist").touch()
+
+        assert Change(directory, "com.foo.zserv.plist", ADDED) in read_all(watcher)
+
+
+def test_polling_timeout(directory: Path):
+    with PollingWatcher([directory], interval=60) as watcher:
+        directory.joinpath("com.foo.zserv.plist").touch()
+
+        assert not watcher.read(0.01)
+
+
+def test_apply(mocker: MockerFixture, tmp_path: Path, directory: Path):
+    mock_invalidate = mocker.patch("service.watcher.metadata.invalidate")
+    index = ServiceIndex(tmp_path / "index.json")
+    index.rebuild([directory])
+    directory.joinpath("com.foo.zserv.plist").touch()
+    directory.joinpath("com.foo.yserv.plist").unlink()
+    mock_scan = mocker.spy(index, "scan")
+
+    apply(
+        [
+            Change(directory, "com.foo.zserv.plist", ADDED),
+            Change(directory, "com.foo.yserv.plist", REMOVED),
+            Change(directory, "com.foo.xserv.plist", MODIFIED),
+        ],
+        index,
+    )
+
+    assert index.files(directory) == {"com.foo.xserv.plist", "com.foo.zserv.plist"}
+    assert [call.args[0].name for call in mock_invalidate.call_args_list] == [
+        "com.foo.zserv.plist",
+        "com.foo.yserv.plist",
+        "com.foo.xserv.plist",
+    ]
+    mock_scan.assert_not_called()
+
+
+def test_apply_rescan(mocker: MockerFixture, tmp_path: Path, directory: Path):
+    mock_invalidate = mocker.patch("service.watcher.metadata.invalidate")
+    index = ServiceIndex(tmp_path / "index.json")
+    mock_scan = mocker.patch.object(index, "scan")
+
+    apply([Change(directory, "", RESCAN)], index)
+    apply([Change(directory, "", RESCAN)])
+
+    mock_scan.assert_called_once_with(directory)
+    mock_invalidate.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "platform,failures,expected",
+    [
+        ("linux", [], InotifyWatcher),
+        ("linux", [InotifyWatcher], KqueueWatcher),
+        ("linux", [InotifyWatcher, KqueueWatcher], PollingWatcher),
+        ("darwin", [], KqueueWatcher),
+        ("darwin", [KqueueWatcher], PollingWatcher),
+    ],
+)
+def test_get_watcher(mocker: MockerFixture, tmp_path: Path, platform: str, failures: list[type], expected: type):
+    mocker.patch("service.watcher.sys.platform", platform)
+
+    for backend in [InotifyWatcher, KqueueWatcher]:
+        side_effect = OSError(os.strerror(38)) if backend in failures else None
+        mocker.patch.object(backend, "__init__", return_value=None, side_effect=side_effect)
+
+    assert isinstance(get_watcher([tmp_path]), expected)